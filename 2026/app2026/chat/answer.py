@@ -2,13 +2,13 @@ from __future__ import annotations
 
 from typing import Any
 
-from app.rag.knowledge_base import generate_llm_answer
+from app.rag.knowledge_base import generate_llm_answer_async
 
 
-def answer(message: str, session, brand: Any) -> str:
+async def answer(message: str, session, brand: Any) -> str:
     history = getattr(session, "history", None)
     try:
-        return generate_llm_answer(message, history=history or [])
+        return await generate_llm_answer_async(message, history=list(history or []))
     except Exception as e:
         print(f"[answer.py] LLM napaka: {type(e).__name__}: {e}")
         return (
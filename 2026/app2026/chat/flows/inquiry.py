@@ -5,11 +5,11 @@ import re
 from typing import Any, Optional
 
 from app.services.email_service import send_custom_message
-from app.services.reservation_service import ReservationService
+from app.services.reservation_service import get_reservation_service
 
 
 INQUIRY_RECIPIENT = os.getenv("INQUIRY_RECIPIENT", "info@kovacnik.com")
-_reservation_service = ReservationService()
+_reservation_service = get_reservation_service()
 
 
 def _blank_inquiry_state() -> dict[str, Optional[str]]:
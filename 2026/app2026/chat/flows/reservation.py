@@ -7,7 +7,8 @@ from typing import Any, Optional
 
 from app.services.email_service import send_admin_notification, send_guest_confirmation
 from app2026.chat.flows.booking_flow import handle_reservation_flow as legacy_handle_reservation_flow
-from app.services.reservation_service import ReservationService
+from app.services.reservation_service import get_reservation_service
+from app.services.unit_of_work import current_unit_of_work
 
 
 RESERVATION_PENDING_MESSAGE = """
@@ -62,7 +63,7 @@ def _blank_reservation_state() -> dict[str, Optional[str | int]]:
     }
 
 
-_reservation_service = ReservationService()
+_reservation_service = get_reservation_service()
 
 
 def _send_reservation_emails_async(payload: dict) -> None:
@@ -73,7 +74,15 @@ def _send_reservation_emails_async(payload: dict) -> None:
         except Exception as exc:
             print(f"[EMAIL] Async send failed: {exc}")
 
-    threading.Thread(target=_worker, daemon=True).start()
+    def _send() -> None:
+        threading.Thread(target=_worker, daemon=True).start()
+
+    # rezervacija je potrjena šele ob koncu poteze (unit_of_work)
+    uow = current_unit_of_work()
+    if uow is None:
+        _send()
+    else:
+        uow.on_commit(_send)
 
 
 def start(session: Any, message: str, brand: Any) -> str:
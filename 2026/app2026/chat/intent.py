@@ -4,7 +4,7 @@ import json
 import os
 from typing import Any
 
-from app.core.llm_client import get_llm_client
+from app.core.llm_client import get_async_llm_client, llm_slot, response_text
 
 from app2026.chat.flows import info as info_flow
 
@@ -12,7 +12,7 @@ from app2026.chat.flows import info as info_flow
 INTENT_LLM_ENABLED = os.getenv("V2_INTENT_LLM", "true").strip().lower() in {"1", "true", "yes", "on"}
 
 
-def detect_intent(message: str, brand: Any) -> str:
+async def detect_intent(message: str, brand: Any) -> str:
     lowered = (message or "").lower()
 
     if any(tok in lowered for tok in ["živjo", "zdravo", "hej", "hello", "dober dan", "pozdravljeni"]):
@@ -35,10 +35,10 @@ def detect_intent(message: str, brand: Any) -> str:
     if not INTENT_LLM_ENABLED:
         return "fallback"
 
-    return _detect_intent_llm(message)
+    return await _detect_intent_llm(message)
 
 
-def _detect_intent_llm(message: str) -> str:
+async def _detect_intent_llm(message: str) -> str:
     prompt = (
         "Odgovori SAMO z enim od: greeting, help, info, reservation, inquiry, fallback.\n"
         "Uporabi samo to sporočilo uporabnika.\n"
@@ -46,21 +46,14 @@ def _detect_intent_llm(message: str) -> str:
         "Odgovor:"
     )
     try:
-        client = get_llm_client()
-        response = client.responses.create(
-            model="gpt-5-mini",
-            input=[{"role": "user", "content": prompt}],
-            max_output_tokens=512,
-        )
-        answer = getattr(response, "output_text", None)
-        if not answer:
-            outputs = []
-            for block in getattr(response, "output", []) or []:
-                for content in getattr(block, "content", []) or []:
-                    text = getattr(content, "text", None)
-                    if text:
-                        outputs.append(text)
-            answer = "\n".join(outputs).strip()
+        client = get_async_llm_client()
+        async with llm_slot():
+            response = await client.responses.create(
+                model="gpt-5-mini",
+                input=[{"role": "user", "content": prompt}],
+                max_output_tokens=512,
+            )
+        answer = response_text(response)
         if not answer:
             return "fallback"
         intent = answer.strip().split()[0].lower()
@@ -1,8 +1,12 @@
+import asyncio
+
 from fastapi import APIRouter
 from pydantic import BaseModel
 import re
 
 from app.core.config import Settings
+from app.services.session.turns import chat_turns, idempotency_key
+from app.services.unit_of_work import run_in_unit_of_work
 from app2026.brand.registry import get_brand
 from app2026.chat.flows import info as info_flow
 from app2026.chat.flows import inquiry as inquiry_flow
@@ -10,8 +14,8 @@ from app2026.chat.flows import reservation as reservation_flow
 from app2026.chat.flows.booking_flow import get_booking_continuation
 from app2026.chat import answer as answer_mod
 from app2026.chat import intent as intent_mod
-from app2026.chat.state import get_session
-from app2026.chat_v3 import router as v3_router
+from app2026.chat.state import get_session, save_session
+from app2026.chat_v3.shadow import shadow_evaluator
 
 
 TERMINAL_STEPS = {
@@ -36,6 +40,8 @@ router = APIRouter(prefix="/v2/chat", tags=["chat-v2"])
 class ChatRequest(BaseModel):
     message: str
     session_id: str | None = None
+    # id sporočila od odjemalca (ponovljen zahtevek z istim id-jem dobi isti odgovor)
+    message_id: str | None = None
 
 
 class ChatResponse(BaseModel):
@@ -44,20 +50,25 @@ class ChatResponse(BaseModel):
 
 
 @router.post("", response_model=ChatResponse)
-def chat_endpoint(payload: ChatRequest) -> ChatResponse:
-    session = get_session(payload.session_id)
+async def chat_endpoint(payload: ChatRequest) -> ChatResponse:
+    # poteze iste seje ena za drugo; podvojen zahtevek počaka na isti odgovor
+    key = idempotency_key("v2", payload.session_id, payload.message, payload.message_id)
+    return await chat_turns.run(payload.session_id, key, lambda: _chat_turn(payload))
+
+
+async def _chat_turn(payload: ChatRequest) -> ChatResponse:
+    session = await asyncio.to_thread(get_session, payload.session_id)
     session.touch()
+    # history je deque(maxlen=20), starejša sporočila odpadejo sama
     session.history.append({"role": "user", "content": payload.message})
-    if len(session.history) > 20:
-        session.history = session.history[-20:]
 
     brand = get_brand()
-    reply = _decision_pipeline(payload.message, session, brand)
+    reply = await _decision_pipeline(payload.message, session, brand)
     _run_shadow_intent_logging(payload.message, session, brand, reply)
 
     session.history.append({"role": "assistant", "content": reply})
-    if len(session.history) > 20:
-        session.history = session.history[-20:]
+    # skupna hramba sej (več workerjev); v pomnilniškem načinu ne naredi nič
+    await asyncio.to_thread(save_session, session)
 
     return ChatResponse(reply=reply, session_id=session.session_id)
 
@@ -68,14 +79,16 @@ def _run_shadow_intent_logging(message: str, session, brand, v2_reply: str) -> N
         return
 
     try:
-        record = v3_router.build_shadow_record_sync(message, session, brand, v2_reply)
-        v3_router.log_shadow_record(record)
+        # v ozadju na kopiji seje; odgovor ne čaka na v3
+        shadow_evaluator.submit(message, session, brand, v2_reply)
     except Exception:
         # Shadow metrics must never break chat responses.
         return
 
 
-def _decision_pipeline(message: str, session, brand) -> str:
+async def _decision_pipeline(message: str, session, brand) -> str:
+    # LLM klici so asinhroni; rezervacijski in povpraševalni tok delata z bazo sinhrono, zato tečeta v niti,
+    # vsak v svoji enoti dela (povezava ni zasedena med LLM klici)
     reservation_state = session.data.get("reservation")
     if isinstance(reservation_state, dict):
         current_step = reservation_state.get("step")
@@ -109,14 +122,14 @@ def _decision_pipeline(message: str, session, brand) -> str:
                 reservation_state["terminal_interrupt_count"] = 0
                 reservation_state["awaiting_cancel_confirmation"] = False
             session.active_flow = "reservation"
-            return reservation_flow.handle(session, message, brand)
+            return await asyncio.to_thread(run_in_unit_of_work, reservation_flow.handle, session, message, brand)
 
         if current_step == "awaiting_phone" and re.fullmatch(r"[\d\s+()./-]{6,}", stripped):
             if isinstance(reservation_state, dict):
                 reservation_state["terminal_interrupt_count"] = 0
                 reservation_state["awaiting_cancel_confirmation"] = False
             session.active_flow = "reservation"
-            return reservation_flow.handle(session, message, brand)
+            return await asyncio.to_thread(run_in_unit_of_work, reservation_flow.handle, session, message, brand)
 
         lowered_stripped = stripped.lower()
         dinner_negative = {"ne", "no", "nocem", "nočem", "brez"}
@@ -129,7 +142,7 @@ def _decision_pipeline(message: str, session, brand) -> str:
                 reservation_state["terminal_interrupt_count"] = 0
                 reservation_state["awaiting_cancel_confirmation"] = False
             session.active_flow = "reservation"
-            return reservation_flow.handle(session, message, brand)
+            return await asyncio.to_thread(run_in_unit_of_work, reservation_flow.handle, session, message, brand)
 
         if current_step == "awaiting_confirmation" and (
             reservation_flow.is_affirmative(lowered_stripped)
@@ -139,9 +152,9 @@ def _decision_pipeline(message: str, session, brand) -> str:
                 reservation_state["terminal_interrupt_count"] = 0
                 reservation_state["awaiting_cancel_confirmation"] = False
             session.active_flow = "reservation"
-            return reservation_flow.handle(session, message, brand)
+            return await asyncio.to_thread(run_in_unit_of_work, reservation_flow.handle, session, message, brand)
 
-        intent = intent_mod.detect_intent(message, brand)
+        intent = await intent_mod.detect_intent(message, brand)
         question_like = (
             "?" in text
             or text.startswith(("kaj", "kje", "kako", "ali", "imate", "je ", "pa "))
@@ -174,7 +187,7 @@ def _decision_pipeline(message: str, session, brand) -> str:
             else:
                 side_reply = "Pozdravljeni."
             if side_reply.strip() == "Za to nimam podatka.":
-                side_reply = answer_mod.answer(message, session, brand)
+                side_reply = await answer_mod.answer(message, session, brand)
 
             if interrupt_count >= MAX_TERMINAL_INTERRUPTS:
                 reservation_state["awaiting_cancel_confirmation"] = True
@@ -193,14 +206,14 @@ def _decision_pipeline(message: str, session, brand) -> str:
             reservation_state["terminal_interrupt_count"] = 0
             reservation_state["awaiting_cancel_confirmation"] = False
         session.active_flow = "reservation"
-        return reservation_flow.handle(session, message, brand)
+        return await asyncio.to_thread(run_in_unit_of_work, reservation_flow.handle, session, message, brand)
 
     # 1) Active flow takes priority
     if session.active_flow:
         if session.active_flow == "reservation":
-            return reservation_flow.handle(session, message, brand)
+            return await asyncio.to_thread(run_in_unit_of_work, reservation_flow.handle, session, message, brand)
         if session.active_flow == "inquiry":
-            inquiry_reply = inquiry_flow.handle(session, message)
+            inquiry_reply = await asyncio.to_thread(run_in_unit_of_work, inquiry_flow.handle, session, message)
             if inquiry_reply:
                 return inquiry_reply
         flow_reply = _handle_active_flow(message, session, brand)
@@ -208,13 +221,13 @@ def _decision_pipeline(message: str, session, brand) -> str:
             return flow_reply
 
     # 2) Intent detection
-    intent = intent_mod.detect_intent(message, brand)
+    intent = await intent_mod.detect_intent(message, brand)
 
     # 3) Route to handlers
     if intent == "reservation":
-        return reservation_flow.start(session, message, brand)
+        return await asyncio.to_thread(run_in_unit_of_work, reservation_flow.start, session, message, brand)
     if intent == "inquiry":
-        return inquiry_flow.start(session, message)
+        return await asyncio.to_thread(run_in_unit_of_work, inquiry_flow.start, session, message)
     if intent == "greeting":
         return "Pozdravljeni! Kako vam lahko pomagam?"
     if intent == "help":
@@ -224,11 +237,11 @@ def _decision_pipeline(message: str, session, brand) -> str:
     if intent == "info":
         info_reply = _handle_info(message, brand, session)
         if info_reply.strip().lower() == "za to nimam podatka.":
-            return answer_mod.answer(message, session, brand)
+            return await answer_mod.answer(message, session, brand)
         return info_reply
 
     # 4) Fallback (LLM)
-    return answer_mod.answer(message, session, brand)
+    return await answer_mod.answer(message, session, brand)
 
 
 def _handle_active_flow(message: str, session, brand) -> str | None:
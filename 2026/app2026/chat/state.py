@@ -1,21 +1,48 @@
 from __future__ import annotations
 
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import deque
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
+from itertools import islice
 from typing import Any
 import uuid
 
-SESSION_TIMEOUT_MINUTES = 30
+from app.services.session.backend import SQLSessionBackend, SessionVersionConflict, session_backend_from_env
+from app.services.session.store import SESSION_IDLE_TTL_MINUTES, SessionStore, approx_json_size
 
+SESSION_TIMEOUT_MINUTES = SESSION_IDLE_TTL_MINUTES
+# zadnjih N sporočil (uporabnik + asistent) za kontekst LLM-a
+HISTORY_MAX_MESSAGES = 20
+# verzija zapisa seje (skupna hramba); ob spremembi polj dodaj pretvorbo v session_from_dict
+SESSION_FORMAT_VERSION = 1
+# posnetek sej ob zaustavitvi (samo pomnilniška hramba; skupna hramba preživi sama)
+SESSION_SNAPSHOT_PATH = os.getenv(
+    "SESSION_SNAPSHOT_PATH",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..", "data", "chat_sessions.snapshot.gz")),
+)
+SESSION_RESTORE_MAX = int(os.getenv("SESSION_RESTORE_MAX", "2000"))
+SESSION_RESTORE_BUDGET_MS = float(os.getenv("SESSION_RESTORE_BUDGET_MS", "500"))
+# z več workerji ima vsak svoje seje (brez skupne hrambe); en posnetek bi jih pomešal
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1") or 1)
+_SNAPSHOT_FORMAT = 1
 
-@dataclass
+
+@dataclass(slots=True)
 class SessionState:
     session_id: str
     active_flow: str | None = None
     step: str | None = None
     data: dict[str, Any] = field(default_factory=dict)
-    history: list[dict[str, str]] = field(default_factory=list)
+    history: deque[dict[str, str]] = field(default_factory=lambda: deque(maxlen=HISTORY_MAX_MESSAGES))
     last_activity: datetime | None = None
+    # verzija v skupni hrambi (0 = še ni zapisana); ni del zapisa
+    version: int = 0
 
     def touch(self) -> None:
         self.last_activity = datetime.now(timezone.utc)
@@ -29,19 +56,247 @@ class SessionState:
             last = last.replace(tzinfo=timezone.utc)
         return (now - last) > timedelta(minutes=SESSION_TIMEOUT_MINUTES)
 
+    def recent_history(self, count: int) -> list[dict[str, str]]:
+        """Zadnjih `count` sporočil kot seznam (deque ne podpira rezin)."""
+        skip = max(0, len(self.history) - count)
+        return list(islice(self.history, skip, None))
+
+
+def session_to_dict(session: SessionState) -> dict[str, Any]:
+    return {
+        "v": SESSION_FORMAT_VERSION,
+        "session_id": session.session_id,
+        "active_flow": session.active_flow,
+        "step": session.step,
+        "data": session.data,
+        "history": list(session.history),
+        "last_activity": session.last_activity.isoformat() if session.last_activity else None,
+    }
+
+
+def session_from_dict(raw: dict[str, Any]) -> SessionState:
+    if raw.get("v") != SESSION_FORMAT_VERSION:
+        raise ValueError(f"Neznana verzija zapisa seje: {raw.get('v')!r}")
+    last_activity = raw.get("last_activity")
+    return SessionState(
+        session_id=raw["session_id"],
+        active_flow=raw.get("active_flow"),
+        step=raw.get("step"),
+        data=raw.get("data") or {},
+        history=deque(raw.get("history") or [], maxlen=HISTORY_MAX_MESSAGES),
+        last_activity=datetime.fromisoformat(last_activity) if last_activity else None,
+    )
+
+
+def _session_size(session: SessionState) -> int:
+    history = sum(len(item.get("content", "")) + 40 for item in session.history)
+    return 200 + history + approx_json_size(session.data)
+
+
+def _new_session_store(name: str) -> SessionStore[SessionState]:
+    return SessionStore(
+        name,
+        factory=lambda session_id: SessionState(session_id=session_id),
+        size_of=_session_size,
+        is_expired=SessionState.is_expired,
+    )
+
+
+class SessionRepository:
+    """Seje procesa; s skupno hrambo je lokalna shramba le predpomnilnik.
+
+    get() ob vsakem klicu preveri verzijo v bazi (ena poizvedba) in sejo na
+    novo prebere le, če jo je vmes zapisal drug worker. save() zapiše sejo na
+    koncu poteze; ob konfliktu verzij obvelja prejšnji zapis, lokalna kopija
+    pa se zavrže.
+    """
+
+    def __init__(
+        self,
+        store: SessionStore[SessionState],
+        backend: SQLSessionBackend | None = None,
+        namespace: str = "chat_v2",
+    ) -> None:
+        self.store = store
+        self.backend = backend
+        self.namespace = namespace
+        if backend is not None:
+            store.on_sweep = lambda: backend.purge(time.time() - store.idle_ttl)
+
+    def get(self, session_id: str | None) -> SessionState:
+        if not session_id:
+            session_id = str(uuid.uuid4())[:8]
+        if self.backend is None:
+            return self.store.get_or_create(session_id)
+        cached = self.store.get(session_id)
+        known = cached.version if cached is not None else 0
+        version, blob = self.backend.load(self.namespace, session_id, known)
+        if blob is not None:
+            session = session_from_dict(json.loads(blob))
+            if session.is_expired():
+                session = SessionState(session_id=session_id)
+        elif cached is not None and version == known:
+            return cached
+        else:
+            # seje ni v bazi (ali je bila izbrisana)
+            session = SessionState(session_id=session_id)
+        session.version = version
+        self.store.put(session_id, session)
+        return session
+
+    def save(self, session: SessionState) -> bool:
+        """Zapiše sejo v skupno hrambo; False ob konfliktu verzij."""
+        if self.backend is None:
+            return True
+        try:
+            self._write(session)
+        except SessionVersionConflict:
+            self.store.pop(session.session_id)
+            print(f"[SESSION] Konflikt verzij za sejo {session.session_id}; obvelja zapis drugega workerja.")
+            self._abort_reservation(session.session_id)
+            return False
+        return True
 
-_SESSIONS: dict[str, SessionState] = {}
+    def _write(self, session: SessionState) -> None:
+        blob = json.dumps(session_to_dict(session), default=str, ensure_ascii=False)
+        session.version = self.backend.save(self.namespace, session.session_id, blob, session.version)
+
+    def _abort_reservation(self, session_id: str) -> None:
+        """Po konfliktu prekine rezervacijo v zapisani seji.
+
+        Zavržena poteza je rezervacijo morda že vpisala; zapisana seja pa še
+        čaka na potrditev in bi naslednji "da" rezerviral še enkrat.
+        """
+        current = self.get(session_id)
+        if current.active_flow != "reservation" and not current.data.get("reservation"):
+            return
+        if current.active_flow == "reservation":
+            current.active_flow = None
+            current.step = None
+        current.data.pop("reservation", None)
+        try:
+            self._write(current)
+        except SessionVersionConflict:
+            # vmes je zapisal še kdo; naslednje branje vzame njegovo stanje
+            self.store.pop(session_id)
+
+    def reset(self, session_id: str) -> None:
+        self.store.pop(session_id)
+        if self.backend is not None:
+            self.backend.delete(self.namespace, session_id)
+
+
+_SESSIONS: SessionStore[SessionState] = _new_session_store("chat_v2")
+_REPOSITORY: SessionRepository | None = None
+_REPOSITORY_LOCK = threading.Lock()
+
+
+def _repository() -> SessionRepository:
+    # hramba se izbere ob prvi uporabi (SESSION_BACKEND=database potrebuje ReservationService)
+    global _REPOSITORY
+    if _REPOSITORY is None:
+        with _REPOSITORY_LOCK:
+            if _REPOSITORY is None:
+                _REPOSITORY = SessionRepository(_SESSIONS, session_backend_from_env())
+    return _REPOSITORY
 
 
 def get_session(session_id: str | None) -> SessionState:
-    if not session_id:
-        session_id = str(uuid.uuid4())[:8]
-    if session_id in _SESSIONS and _SESSIONS[session_id].is_expired():
-        _SESSIONS[session_id] = SessionState(session_id=session_id)
-    if session_id not in _SESSIONS:
-        _SESSIONS[session_id] = SessionState(session_id=session_id)
-    return _SESSIONS[session_id]
+    return _repository().get(session_id)
+
+
+def save_session(session: SessionState) -> bool:
+    return _repository().save(session)
 
 
 def reset_session(session_id: str) -> None:
-    _SESSIONS.pop(session_id, None)
+    _repository().reset(session_id)
+
+
+def snapshot_sessions(path: str = SESSION_SNAPSHOT_PATH) -> dict[str, Any]:
+    """Zapiše žive seje v stisnjeno datoteko (JSON vrstice, najnovejša prva).
+
+    Prva vrstica je glava z verzijama posnetka in zapisa seje. Zapis gre v
+    začasno datoteko procesa in se zamenja atomično. Posnetek je namenjen enemu
+    workerju: z WEB_CONCURRENCY > 1 brez skupne hrambe se preskoči.
+    """
+    start = time.perf_counter()
+    if _repository().backend is not None:
+        return {"written": 0, "skipped": "shared backend"}
+    if WEB_CONCURRENCY > 1:
+        return {"written": 0, "skipped": "multiple workers"}
+    sessions = [session for _, session in reversed(_SESSIONS.items()) if not session.is_expired()]
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f"{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8") as handle:
+            header = {
+                "format": _SNAPSHOT_FORMAT,
+                "session_format": SESSION_FORMAT_VERSION,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "count": len(sessions),
+            }
+            handle.write(json.dumps(header) + "\n")
+            for session in sessions:
+                line = json.dumps(session_to_dict(session), default=str, ensure_ascii=False, separators=(",", ":"))
+                handle.write(line + "\n")
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return {
+        "written": len(sessions),
+        "bytes": os.path.getsize(path),
+        "ms": round((time.perf_counter() - start) * 1000, 2),
+    }
+
+
+def restore_sessions(
+    path: str = SESSION_SNAPSHOT_PATH,
+    max_sessions: int = SESSION_RESTORE_MAX,
+    budget_ms: float = SESSION_RESTORE_BUDGET_MS,
+) -> dict[str, Any]:
+    """Naloži posnetek ob zagonu in ga izbriše.
+
+    Cena je omejena: največ max_sessions sej in budget_ms časa (najnovejše
+    seje so na začetku datoteke, zato se ob prekoračitvi izgubijo najstarejše).
+    Potekle seje in seje z neznano verzijo zapisa se preskočijo. Z več
+    workerji posnetka ne obnovimo (en worker bi prevzel seje vseh).
+    """
+    start = time.perf_counter()
+    stats: dict[str, Any] = {"restored": 0, "expired": 0, "unknown_version": 0, "truncated": False}
+    if not os.path.exists(path) or _repository().backend is not None or WEB_CONCURRENCY > 1:
+        return {**stats, "ms": 0.0}
+    restored: list[SessionState] = []
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as handle:
+            header = json.loads(handle.readline() or "{}")
+            if header.get("format") != _SNAPSHOT_FORMAT:
+                stats["unknown_version"] = header.get("count", 0)
+            else:
+                for line in handle:
+                    if len(restored) >= max_sessions or (time.perf_counter() - start) * 1000 > budget_ms:
+                        stats["truncated"] = True
+                        break
+                    try:
+                        session = session_from_dict(json.loads(line))
+                    except (ValueError, KeyError):
+                        stats["unknown_version"] += 1
+                        continue
+                    if session.is_expired():
+                        stats["expired"] += 1
+                        continue
+                    restored.append(session)
+    except (OSError, EOFError, ValueError) as exc:
+        print(f"[SESSION] Posnetka sej ni mogoče prebrati ({exc}); začenjam brez sej.")
+    # najstarejša prva, da LRU vrstni red ostane enak
+    for session in reversed(restored):
+        _SESSIONS.put(session.session_id, session)
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass  # posnetek je medtem porabil drug proces
+    stats["restored"] = len(restored)
+    stats["ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return stats
@@ -6,6 +6,7 @@ _settings = Settings()
 
 INTENT_CONFIDENCE_MIN = float(_settings.intent_confidence_min)
 V3_INTENT_MODEL = _settings.v3_intent_model
+V3_INTERPRET_TIMEOUT_SECONDS = float(_settings.v3_interpret_timeout_seconds)
 V3_SHADOW_MODE = bool(_settings.v3_shadow_mode)
 
 INTENT_CONFIDENCE_OVERRIDES: dict[str, float] = {
@@ -165,7 +165,7 @@ def check(message: str, session: Any) -> dict[str, Any] | None:
     # Only runs when there is NO active booking flow.
     history = getattr(session, "history", []) or []
     recent = " ".join(
-        (item.get("content", "") for item in history[-3:] if isinstance(item, dict))
+        (item.get("content", "") for item in list(history)[-3:] if isinstance(item, dict))
     ).lower()
     if any(k in recent for k in ("4-hodni", "5-hodni", "6-hodni", "7-hodni", "degustacijski meniji")):
         if lowered in {"4", "5", "6", "7"}:
@@ -1,7 +1,9 @@
 from __future__ import annotations
 
+import asyncio
 from typing import Any
 
+from app.services.unit_of_work import run_in_unit_of_work
 from app2026.chat.flows import reservation as reservation_flow
 from app2026.chat_v3.schemas import InterpretResult
 
@@ -39,12 +41,17 @@ def _prefill_state_from_entities(session: Any, intent: str, entities: dict) -> N
         state["time"] = entities["time"]
 
 
+async def _flow(fn: Any, session: Any, message: str, brand: Any) -> str:
+    # tok dela z bazo sinhrono: v niti in v svoji enoti dela (ena povezava za ta klic)
+    return await asyncio.to_thread(run_in_unit_of_work, fn, session, message, brand)
+
+
 async def execute(result: InterpretResult, message: str, session: Any, brand: Any) -> dict[str, str]:
     if result.intent in {"BOOKING_ROOM", "BOOKING_TABLE"}:
         _prefill_state_from_entities(session, result.intent, result.entities or {})
-        return {"reply": reservation_flow.start(session, message, brand)}
+        return {"reply": await _flow(reservation_flow.start, session, message, brand)}
     if result.intent == "CONTINUE_FLOW":
-        return {"reply": reservation_flow.handle(session, message, brand)}
+        return {"reply": await _flow(reservation_flow.handle, session, message, brand)}
     if result.intent == "CANCEL":
         state = session.data.get("reservation")
         if isinstance(state, dict):
@@ -53,5 +60,5 @@ async def execute(result: InterpretResult, message: str, session: Any, brand: An
         session.step = None
         return {"reply": "Rezervacijo sem preklical. Kako vam lahko še pomagam?"}
     if result.intent == "CONFIRM":
-        return {"reply": reservation_flow.handle(session, "da", brand)}
-    return {"reply": reservation_flow.handle(session, message, brand)}
+        return {"reply": await _flow(reservation_flow.handle, session, "da", brand)}
+    return {"reply": await _flow(reservation_flow.handle, session, message, brand)}
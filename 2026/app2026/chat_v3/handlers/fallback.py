@@ -209,4 +209,4 @@ async def execute(result: InterpretResult, message: str, session, brand) -> dict
     # Clarification from LLM — only after all deterministic traps have been checked
     if result.needs_clarification and result.clarification_question:
         return {"reply": result.clarification_question}
-    return {"reply": answer_mod.answer(message, session, brand)}
+    return {"reply": await answer_mod.answer(message, session, brand)}
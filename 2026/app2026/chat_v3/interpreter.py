@@ -1,10 +1,11 @@
 from __future__ import annotations
 
+import asyncio
 import json
 from pathlib import Path
 from typing import Any
 
-from app.core.llm_client import get_llm_client
+from app.core.llm_client import get_async_llm_client, get_llm_client, llm_slot
 from app2026.chat_v3 import config as v3_config
 from app2026.chat_v3.schemas import InterpretResult
 
@@ -80,32 +81,76 @@ def _apply_disambiguation(message: str, result: InterpretResult) -> InterpretRes
     )
 
 
-def interpret(message: str, history: list[dict[str, str]] | None, session: dict[str, Any] | None) -> InterpretResult:
-    context = (history or [])[-5:]
+def _request_input(message: str, history: Any, session: dict[str, Any] | None) -> list[dict[str, str]]:
+    context = list(history or [])[-5:]
     state_snapshot = session or {}
     user_payload = {"message": message, "history": context, "state": state_snapshot}
+    return [
+        {"role": "system", "content": _system_prompt()},
+        {"role": "user", "content": json.dumps(user_payload, ensure_ascii=False)},
+    ]
+
+
+def _result_from_response(message: str, response: Any) -> InterpretResult:
+    raw = _extract_text_from_response(response)
+    if not raw:
+        print(f"[interpreter.py] Prazen odgovor od LLM (model: {v3_config.V3_INTENT_MODEL})")
+        print(f"[interpreter.py] Response type: {type(response)}, attrs: {dir(response)[:10]}")
+        print(f"[interpreter.py] Response repr: {repr(response)[:500]}")
+        return _fallback_unclear()
+    print(f"[interpreter.py] Raw LLM response: {raw[:200]}")
+    parsed = _strict_from_raw(raw)
+    print(f"[interpreter.py] Parsed intent: {parsed.intent}, confidence: {parsed.confidence}")
+    return _apply_disambiguation(message, parsed)
+
 
+def interpret(message: str, history: list[dict[str, str]] | None, session: dict[str, Any] | None) -> InterpretResult:
     try:
         client = get_llm_client()
         response = client.responses.create(
             model=v3_config.V3_INTENT_MODEL,
-            input=[
-                {"role": "system", "content": _system_prompt()},
-                {"role": "user", "content": json.dumps(user_payload, ensure_ascii=False)},
-            ],
+            input=_request_input(message, history, session),
             max_output_tokens=1024,
             text={"format": {"type": "json_object"}},
         )
-        raw = _extract_text_from_response(response)
-        if not raw:
-            print(f"[interpreter.py] Prazen odgovor od LLM (model: {v3_config.V3_INTENT_MODEL})")
-            print(f"[interpreter.py] Response type: {type(response)}, attrs: {dir(response)[:10]}")
-            print(f"[interpreter.py] Response repr: {repr(response)[:500]}")
-            return _fallback_unclear()
-        print(f"[interpreter.py] Raw LLM response: {raw[:200]}")
-        parsed = _strict_from_raw(raw)
-        print(f"[interpreter.py] Parsed intent: {parsed.intent}, confidence: {parsed.confidence}")
-        return _apply_disambiguation(message, parsed)
+        return _result_from_response(message, response)
+    except Exception as e:
+        print(f"[interpreter.py] LLM napaka: {type(e).__name__}: {e}")
+        return _fallback_unclear()
+
+
+async def interpret_async(
+    message: str,
+    history: list[dict[str, str]] | None,
+    session: dict[str, Any] | None,
+    timeout: float | None = None,
+) -> InterpretResult:
+    """Asinhrona različica interpret() za v3 router (ne blokira event loopa).
+
+    Po `timeout` sekundah (privzeto V3_INTERPRET_TIMEOUT_SECONDS, vključno s
+    čakanjem na prosto mesto v llm_slot) se zahtevek prekine in vrne UNCLEAR.
+    Preklic klicatelja (CancelledError) prekine tudi HTTP zahtevek in se ne
+    pretvori v UNCLEAR.
+    """
+    timeout = v3_config.V3_INTERPRET_TIMEOUT_SECONDS if timeout is None else timeout
+    request = _request_input(message, history, session)
+
+    async def call() -> Any:
+        client = get_async_llm_client()
+        async with llm_slot():
+            return await client.responses.create(
+                model=v3_config.V3_INTENT_MODEL,
+                input=request,
+                max_output_tokens=1024,
+                text={"format": {"type": "json_object"}},
+            )
+
+    try:
+        response = await asyncio.wait_for(call(), timeout)
+        return _result_from_response(message, response)
+    except asyncio.TimeoutError:
+        print(f"[interpreter.py] LLM ni odgovoril v {timeout:.1f}s; vračam UNCLEAR")
+        return _fallback_unclear()
     except Exception as e:
         print(f"[interpreter.py] LLM napaka: {type(e).__name__}: {e}")
         return _fallback_unclear()
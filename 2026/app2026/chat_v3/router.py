@@ -1,9 +1,8 @@
 from __future__ import annotations
 
-import copy
+import asyncio
 import json
 import time
-import asyncio
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any
@@ -13,10 +12,11 @@ from fastapi import APIRouter
 from pydantic import BaseModel
 
 from app.core.config import Settings
+from app.services.session.turns import chat_turns, idempotency_key
 from app2026.brand.kovacnik_data import AMBIGUOUS_ENTITIES, resolve_entity
 from app2026.brand.registry import get_brand
 from app2026.chat import intent as v2_intent
-from app2026.chat.state import get_session
+from app2026.chat.state import get_session, save_session
 from app2026.chat_v3 import config as v3_config
 from app2026.chat_v3 import guards, interpreter, state_machine
 from app2026.chat_v3 import ood_policy
@@ -59,6 +59,7 @@ _ROOM_HINTS = frozenset({
 class ChatRequest(BaseModel):
     message: str
     session_id: str | None = None
+    message_id: str | None = None
 
 
 class ChatResponse(BaseModel):
@@ -313,7 +314,8 @@ async def _dispatch(result: InterpretResult, message: str, session, brand) -> di
 
 
 async def handle_message(message: str, session_id: str, brand: Any) -> dict[str, Any]:
-    session = get_session(session_id)
+    # s skupno hrambo sej je to poizvedba v bazi; ne blokira event loopa
+    session = await asyncio.to_thread(get_session, session_id)
     guard_result = guards.check(message, session)
     if guard_result:
         if guard_result["action"] in {"continue_flow", "menu_detail"}:
@@ -476,7 +478,7 @@ async def handle_message(message: str, session_id: str, brand: Any) -> dict[str,
                 )
                 return {"reply": question, "session_id": session.session_id}
 
-    history = session.history[-5:]
+    history = session.recent_history(5)
 
     # Pre-interpretation override: "soba za X oseb" is clearly a booking, not info request
     _msg_low = message.lower()
@@ -486,7 +488,7 @@ async def handle_message(message: str, session_id: str, brand: Any) -> dict[str,
         # Force BOOKING_ROOM intent - this is clearly a booking request
         result = InterpretResult(intent="BOOKING_ROOM", entities={}, confidence=0.95)
     else:
-        result = interpreter.interpret(message, history, session.data)
+        result = await interpreter.interpret_async(message, history, session.data)
 
     threshold = v3_config.get_confidence_threshold(result.intent)
     if result.confidence < threshold:
@@ -533,13 +535,12 @@ async def handle_message(message: str, session_id: str, brand: Any) -> dict[str,
 
 async def build_shadow_record(message: str, session, brand: Any, v2_reply: str) -> dict[str, Any]:
     start = time.perf_counter()
-    old_intent = v2_intent.detect_intent(message, brand)
-    result = interpreter.interpret(message, session.history[-5:], session.data)
+    old_intent = await v2_intent.detect_intent(message, brand)
+    result = await interpreter.interpret_async(message, session.recent_history(5), session.data)
     latency_ms = round((time.perf_counter() - start) * 1000, 2)
 
-    # Predict v3 response in a deep-copied session snapshot.
-    snapshot = copy.deepcopy(session)
-    would = await _dispatch(result, message, snapshot, brand)
+    # session je že globoka kopija (chat_v3.shadow), dispatch jo lahko spremeni.
+    would = await _dispatch(result, message, session, brand)
 
     return {
         "timestamp": datetime.now(timezone.utc).isoformat(),
@@ -566,10 +567,6 @@ def log_shadow_record(record: dict[str, Any]) -> None:
         return
 
 
-def build_shadow_record_sync(message: str, session, brand: Any, v2_reply: str) -> dict[str, Any]:
-    return asyncio.run(build_shadow_record(message, session, brand, v2_reply))
-
-
 def _check_missing_booking_fields(session) -> str | None:
     """Check if the LLM collected booking data but skipped email or children.
 
@@ -592,7 +589,7 @@ def _check_missing_booking_fields(session) -> str | None:
 
     # Combine recent history to look for booking signals.
     combined = " ".join(
-        msg.get("content", "") for msg in history[-10:]
+        msg.get("content", "") for msg in list(history)[-10:]
     ).lower()
 
     # Booking signals: date + people count in conversation.
@@ -632,21 +629,29 @@ async def chat_v3_endpoint(payload: ChatRequest) -> ChatResponse:
     if not _settings.v3_enabled or _settings.chat_engine != "v3":
         print(f"[V3 CHAT] Izklopljen! v3_enabled={_settings.v3_enabled}, chat_engine={_settings.chat_engine}")
         return ChatResponse(reply="V3 endpoint je izklopljen. Uporabite /v2/chat.", session_id=payload.session_id)
+    # poteze iste seje ena za drugo; podvojen zahtevek počaka na isti odgovor
+    key = idempotency_key("v3", payload.session_id, payload.message, payload.message_id)
+    return await chat_turns.run(payload.session_id, key, lambda: _chat_v3_turn(payload))
+
+
+async def _chat_v3_turn(payload: ChatRequest) -> ChatResponse:
     brand = get_brand()
+    # enoto dela odpre booking handler okoli sinhronega toka (ne čez LLM klice interpreterja)
     result = await handle_message(payload.message, payload.session_id or "", brand)
     reply_text = str(result["reply"])
     session_id = str(result["session_id"])
 
     # After LLM responds, check if booking data was collected without email/children.
-    session = get_session(session_id)
+    session = await asyncio.to_thread(get_session, session_id)
     missing_field_question = _check_missing_booking_fields(session)
     if missing_field_question:
         reply_text = reply_text + "\n\n" + missing_field_question
+    await asyncio.to_thread(save_session, session)
 
     # Log conversation to database for daily reports
     try:
-        from app.services.reservation_service import ReservationService
-        service = ReservationService()
+        from app.services.reservation_service import get_reservation_service
+        service = get_reservation_service()
         service.log_conversation(
             session_id=session_id,
             user_message=payload.message,
@@ -654,6 +659,7 @@ async def chat_v3_endpoint(payload: ChatRequest) -> ChatResponse:
             intent=None,  # V3 doesn't expose intent directly
             needs_followup=False,
             followup_email=None,
+            defer=True,  # odgovor ne čaka na zapis v bazo
         )
     except Exception as e:
         # Don't fail the chat if logging fails
@@ -0,0 +1,129 @@
+"""Shadow ocenjevanje v3 izven poti zahtevka.
+
+v2 odgovor ne čaka na v3: submit() vzame vzorec (V3_SHADOW_SAMPLE_RATE),
+naredi globoko kopijo seje in jo odloži v omejeno vrsto. Ozadne niti (vsaka s
+svojim event loopom) zgradijo shadow zapis (v3 interpretacija + dispatch na
+kopiji) in ga zapišejo v log. Ob polni vrsti se vzorec zavrže.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import copy
+import queue
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+from app.core.config import Settings
+from app2026.chat_v3 import router as v3_router
+
+_settings = Settings()
+
+_STOP = object()
+
+
+@dataclass
+class ShadowJob:
+    message: str
+    session: Any  # globoka kopija ob oddaji
+    brand: Any
+    v2_reply: str
+
+
+class ShadowEvaluator:
+    def __init__(
+        self,
+        evaluate: Callable[[ShadowJob], Awaitable[None]],
+        workers: int = _settings.v3_shadow_workers,
+        queue_max: int = _settings.v3_shadow_queue_max,
+        sample_rate: float = _settings.v3_shadow_sample_rate,
+    ) -> None:
+        self.evaluate = evaluate
+        self.workers = max(1, workers)
+        self.sample_rate = sample_rate
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, queue_max))
+        self._threads: list[threading.Thread] = []
+        self._start_lock = threading.Lock()
+        # števce povečujejo niti zahtevkov in vse ozadne niti
+        self._stats_lock = threading.Lock()
+        self.stats = {"submitted": 0, "sampled_out": 0, "dropped": 0, "evaluated": 0, "errors": 0}
+
+    def submit(self, message: str, session: Any, brand: Any, v2_reply: str) -> bool:
+        """Odloži oceno (ne blokira); False, če je vzorec izpuščen ali vrsta polna."""
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            self._count("sampled_out")
+            return False
+        if self._queue.full():
+            # brez kopiranja, če ga itak ne bomo sprejeli
+            self._count("dropped")
+            return False
+        job = ShadowJob(message=message, session=copy.deepcopy(session), brand=brand, v2_reply=v2_reply)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            self._count("dropped")
+            return False
+        self._count("submitted")
+        self._ensure_workers()
+        return True
+
+    def metrics(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return {**stats, "queue_depth": self._queue.qsize(), "workers": len(self._threads)}
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Počaka, da se vrsta izprazni, in ustavi niti (skupaj največ timeout sekund)."""
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._threads = []
+
+    def _count(self, name: str) -> None:
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def _ensure_workers(self) -> None:
+        if self._threads:
+            return
+        with self._start_lock:
+            if not self._threads:
+                self._threads = [
+                    threading.Thread(target=self._run, name=f"v3-shadow-{i}", daemon=True)
+                    for i in range(self.workers)
+                ]
+                for thread in self._threads:
+                    thread.start()
+
+    def _run(self) -> None:
+        loop = asyncio.new_event_loop()
+        try:
+            while True:
+                job = self._queue.get()
+                if job is _STOP:
+                    return
+                try:
+                    loop.run_until_complete(self.evaluate(job))
+                    self._count("evaluated")
+                except Exception as exc:  # shadow ne sme ustaviti niti
+                    self._count("errors")
+                    print(f"[V3 SHADOW] Ocena ni uspela: {type(exc).__name__}: {exc}")
+        finally:
+            loop.close()
+
+
+_LOG_LOCK = threading.Lock()
+
+
+async def _evaluate(job: ShadowJob) -> None:
+    record = await v3_router.build_shadow_record(job.message, job.session, job.brand, job.v2_reply)
+    with _LOG_LOCK:
+        v3_router.log_shadow_record(record)
+
+
+shadow_evaluator = ShadowEvaluator(_evaluate)
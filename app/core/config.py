@@ -14,6 +14,8 @@ class Settings(BaseSettings):
     
     # OpenAI ključ
     openai_api_key: str | None = Field(default=None, alias="OPENAI_API_KEY")
+    # največ hkratnih klicev LLM na proces (asinhroni odjemalec)
+    llm_max_concurrency: int = Field(default=32, alias="LLM_MAX_CONCURRENCY")
     
     # Database URL za PostgreSQL
     database_url: str | None = Field(default=None, alias="DATABASE_URL")
@@ -26,6 +28,11 @@ class Settings(BaseSettings):
     chat_engine: str = Field(default="v2", alias="CHAT_ENGINE")
     intent_confidence_min: float = Field(default=0.85, alias="INTENT_CONFIDENCE_MIN")
     v3_shadow_mode: bool = Field(default=False, alias="V3_SHADOW_MODE")
+    # shadow ocenjevanje v ozadju: delež vzorčenih potez, niti, velikost vrste
+    v3_shadow_sample_rate: float = Field(default=1.0, alias="V3_SHADOW_SAMPLE_RATE")
+    v3_shadow_workers: int = Field(default=2, alias="V3_SHADOW_WORKERS")
+    v3_shadow_queue_max: int = Field(default=100, alias="V3_SHADOW_QUEUE_MAX")
     v3_enabled: bool = Field(default=False, alias="V3_ENABLED")
     v3_canary_percent: int = Field(default=0, alias="V3_CANARY_PERCENT")
     v3_intent_model: str = Field(default="gpt-5-mini", alias="V3_INTENT_MODEL")
+    v3_interpret_timeout_seconds: float = Field(default=8.0, alias="V3_INTERPRET_TIMEOUT_SECONDS")
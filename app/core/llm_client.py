@@ -1,14 +1,62 @@
-from openai import OpenAI
+import asyncio
+import weakref
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
+
+from openai import AsyncOpenAI, OpenAI
 
 from app.core.config import Settings
 
 _settings = Settings()
 
+# en asinhroni odjemalec (in njegov bazen povezav) ter omejitev hkratnih klicev na event loop
+_ASYNC_CLIENTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = weakref.WeakKeyDictionary()
+_LLM_SLOTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
 
-def get_llm_client() -> OpenAI:
-    """Return an initialized OpenAI client or raise if API key missing."""
+
+def _require_api_key() -> str:
     if not _settings.openai_api_key:
         raise RuntimeError(
             "OPENAI_API_KEY ni nastavljen. Dodaj ga v okolje ali .env datoteko."
         )
-    return OpenAI(api_key=_settings.openai_api_key)
+    return _settings.openai_api_key
+
+
+def get_llm_client() -> OpenAI:
+    """Return an initialized OpenAI client or raise if API key missing."""
+    return OpenAI(api_key=_require_api_key())
+
+
+def get_async_llm_client() -> AsyncOpenAI:
+    """Skupni AsyncOpenAI odjemalec za trenutni event loop (raise, če ključa ni)."""
+    api_key = _require_api_key()
+    loop = asyncio.get_running_loop()
+    client = _ASYNC_CLIENTS.get(loop)
+    if client is None:
+        client = _ASYNC_CLIENTS[loop] = AsyncOpenAI(api_key=api_key)
+    return client
+
+
+@asynccontextmanager
+async def llm_slot() -> AsyncIterator[None]:
+    """Omeji hkratne klice LLM na LLM_MAX_CONCURRENCY; ostali počakajo v vrsti."""
+    loop = asyncio.get_running_loop()
+    slots = _LLM_SLOTS.get(loop)
+    if slots is None:
+        slots = _LLM_SLOTS[loop] = asyncio.Semaphore(max(1, _settings.llm_max_concurrency))
+    async with slots:
+        yield
+
+
+def response_text(response: Any) -> str:
+    """Besedilo odgovora Responses API (output_text ali sestavljeno iz blokov)."""
+    answer = getattr(response, "output_text", None)
+    if answer:
+        return answer
+    outputs = []
+    for block in getattr(response, "output", []) or []:
+        for content in getattr(block, "content", []) or []:
+            text = getattr(content, "text", None)
+            if text:
+                outputs.append(text)
+    return "\n".join(outputs).strip()
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 import json
 import math
 import re
@@ -8,7 +9,7 @@ from typing import Dict
 from pathlib import Path
 from typing import List, Optional, Set
 
-from app.core.llm_client import get_llm_client
+from app.core.llm_client import get_async_llm_client, get_llm_client, llm_slot, response_text
 from app.rag.paths import get_knowledge_path
 
 BASE_DIR = Path(__file__).resolve().parents[2]
@@ -716,7 +717,13 @@ def _get_current_seasonal_menu_text() -> str:
     return ""
 
 
-def generate_llm_answer(question: str, top_k: int = 6, history: list[dict[str, str]] | None = None) -> str:
+_NO_CLEAR_ANSWER = "Trenutno v podatkih ne najdem jasnega odgovora. Prosimo, preverite www.kovacnik.com."
+
+
+def _llm_answer_input(
+    question: str, top_k: int, history: list[dict[str, str]] | None
+) -> tuple[Optional[str], list[dict[str, str]]]:
+    """Pripravi pogovor za LLM; vrne (takojšen odgovor, None) ali (None, pogovor)."""
     try:
         paragraphs = _gather_relevant_chunks(question, base_top_k=top_k)
         paragraphs = _filter_chunks_by_category(question, paragraphs)
@@ -727,7 +734,7 @@ def generate_llm_answer(question: str, top_k: int = 6, history: list[dict[str, s
         return (
             "Trenutno nimam konkretnega vegetarijanskega menija. "
             "Lahko pa uredimo vegetarijanski obrok po predhodnem dogovoru."
-        )
+        ), []
 
     if not paragraphs:
         context_text = (
@@ -736,7 +743,6 @@ def generate_llm_answer(question: str, top_k: int = 6, history: list[dict[str, s
     else:
         context_text = _build_context_snippet(question, paragraphs)
 
-    client = get_llm_client()
     seasonal_menu_text = _get_current_seasonal_menu_text()
     convo: list[dict[str, str]] = [
         {"role": "system", "content": SYSTEM_PROMPT + seasonal_menu_text},
@@ -744,25 +750,42 @@ def generate_llm_answer(question: str, top_k: int = 6, history: list[dict[str, s
     ]
     if history:
         # vzamemo zadnjih nekaj sporočil, da ohranimo kratko zgodovino
-        convo.extend(history[-6:])
+        convo.extend(list(history)[-6:])
     convo.append({"role": "user", "content": f"Vprašanje gosta: {question}"})
+    return None, convo
+
+
+def generate_llm_answer(question: str, top_k: int = 6, history: list[dict[str, str]] | None = None) -> str:
+    direct, convo = _llm_answer_input(question, top_k, history)
+    if direct is not None:
+        return direct
 
+    client = get_llm_client()
     response = client.responses.create(
         model="gpt-5-mini",
         input=convo,
         max_output_tokens=2048,
     )
+    return response_text(response) or _NO_CLEAR_ANSWER
 
-    answer = getattr(response, "output_text", None)
-    if not answer:
-        outputs = []
-        for block in getattr(response, "output", []) or []:
-            for content in getattr(block, "content", []) or []:
-                text = getattr(content, "text", None)
-                if text:
-                    outputs.append(text)
-        answer = "\n".join(outputs).strip()
-
-    return answer or (
-        "Trenutno v podatkih ne najdem jasnega odgovora. Prosimo, preverite www.kovacnik.com."
-    )
+
+async def generate_llm_answer_async(
+    question: str, top_k: int = 6, history: list[dict[str, str]] | None = None
+) -> str:
+    """Kot generate_llm_answer, a ne blokira event loopa.
+
+    Iskanje po bazi znanja (lahko kliče embeddings) teče v niti, klic LLM pa
+    prek skupnega AsyncOpenAI odjemalca z omejitvijo hkratnih klicev.
+    """
+    direct, convo = await asyncio.to_thread(_llm_answer_input, question, top_k, history)
+    if direct is not None:
+        return direct
+
+    client = get_async_llm_client()
+    async with llm_slot():
+        response = await client.responses.create(
+            model="gpt-5-mini",
+            input=convo,
+            max_output_tokens=2048,
+        )
+    return response_text(response) or _NO_CLEAR_ANSWER
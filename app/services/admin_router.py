@@ -1,22 +1,38 @@
+import calendar as calendar_module
 import os
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Any, Optional
 
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import HTMLResponse, Response
+from fastapi.responses import HTMLResponse, StreamingResponse
 from pydantic import BaseModel
 
+from app.services.availability_planner import ordinal_dates
+from app.services.conversation_log import conversation_log_metrics
+from app.services.session.store import session_store_metrics
+from app.services.session.turns import chat_turns
+from app.services.export_stream import EXPORT_DATASETS, EXPORT_FORMATS, export_chunks, export_headers
+from app.services.pagination import (
+    CONVERSATION_FIELDS,
+    INQUIRY_FIELDS,
+    RESERVATION_FIELDS,
+    decode_cursor,
+    next_cursor,
+    page_size,
+    parse_fields,
+)
 from app.services.email_service import (
     send_custom_message,
     send_reservation_confirmed,
     send_reservation_rejected,
 )
-from app.services.reservation_service import ROOMS, TOTAL_TABLE_CAPACITY, ReservationService
+from app.services.search_index import SEARCH_SCOPES, query_tokens
+from app.services.reservation_service import ROOMS, TOTAL_TABLE_CAPACITY, get_reservation_service
 from app.services.imap_poll_service import load_state, preview_last_messages, resync_last_messages
 
 router = APIRouter(tags=["admin"])
-service = ReservationService()
+service = get_reservation_service()
 
 ROOM_IDS = {r["id"] for r in ROOMS}
 
@@ -82,13 +98,24 @@ def _reservation_days(date_str: str, nights: Optional[int]) -> list[datetime]:
     return [start + timedelta(days=i) for i in range(nights_int)]
 
 
+def _month_bounds(year: int, month: int) -> tuple[str, str]:
+    """Prvi in zadnji dan meseca v ISO obliki."""
+    last_day = calendar_module.monthrange(year, month)[1]
+    return f"{year:04d}-{month:02d}-01", f"{year:04d}-{month:02d}-{last_day:02d}"
+
+
 def _room_conflicts(reservation_id: int, room_id: str, date_str: str, nights: Optional[int]) -> list[str]:
     """Vrne seznam datumov (dd.mm.yyyy) kjer je soba že zasedena."""
     occupied: list[str] = []
     days = _reservation_days(date_str, nights)
     if not days:
         return occupied
-    other_reservations = service.read_reservations(limit=1000, reservation_type="room")
+    other_reservations = service.read_reservations(
+        limit=1000,
+        reservation_type="room",
+        date_from=days[0].strftime("%Y-%m-%d"),
+        date_to=days[-1].strftime("%Y-%m-%d"),
+    )
     for r in other_reservations:
         if r.get("id") == reservation_id:
             continue
@@ -191,16 +218,35 @@ def admin_inquiries_page() -> HTMLResponse:
     return HTMLResponse(content=html)
 
 
+def _page_params(cursor: Optional[str], fields: Optional[str], allowed: frozenset) -> Optional[list[str]]:
+    """Preveri kurzor in fields= (napaka -> 400); vrne izbrane stolpce."""
+    try:
+        if cursor:
+            decode_cursor(cursor)
+        return parse_fields(fields, allowed)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
 @router.get("/api/admin/conversations")
-def get_conversations(limit: int = 200, needs_followup_only: bool = False):
-    """Vrne zadnje pogovore za admin pregled."""
-    _log("conversations", limit=limit, needs_followup_only=needs_followup_only)
-    conversations = service.get_conversations(limit=limit, needs_followup_only=needs_followup_only)
+def get_conversations(
+    limit: int = 200,
+    needs_followup_only: bool = False,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+):
+    """Vrne zadnje pogovore za admin pregled (stran po stran: next_cursor -> cursor)."""
+    _log("conversations", limit=limit, needs_followup_only=needs_followup_only, cursor=cursor)
+    columns = _page_params(cursor, fields, CONVERSATION_FIELDS)
+    limit = page_size(limit)
+    conversations = service.get_conversations(
+        limit=limit, needs_followup_only=needs_followup_only, cursor=cursor, fields=columns
+    )
     stats = {
         "total": len(conversations),
         "followup": len([c for c in conversations if c.get("needs_followup")]),
     }
-    return {"conversations": conversations, "stats": stats}
+    return {"conversations": conversations, "stats": stats, "next_cursor": next_cursor(conversations, limit)}
 
 
 @router.get("/api/admin/conversations/session/{session_id}")
@@ -212,10 +258,47 @@ def get_conversations_by_session(session_id: str, limit: int = 200):
 
 
 @router.get("/api/admin/inquiries")
-def get_inquiries(limit: int = 200, status: Optional[str] = None):
-    _log("inquiries", limit=limit, status=status)
-    inquiries = service.get_inquiries(limit=limit, status=status)
-    return {"inquiries": inquiries}
+def get_inquiries(
+    limit: int = 200,
+    status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+):
+    _log("inquiries", limit=limit, status=status, cursor=cursor)
+    columns = _page_params(cursor, fields, INQUIRY_FIELDS)
+    limit = page_size(limit)
+    inquiries = service.get_inquiries(limit=limit, status=status, cursor=cursor, fields=columns)
+    return {"inquiries": inquiries, "next_cursor": next_cursor(inquiries, limit)}
+
+
+@router.get("/api/admin/search")
+def admin_search(
+    q: str,
+    scope: str = "conversations",
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+):
+    """Polnotekstovno iskanje po pogovorih (scope=conversations, z arhivom) ali sporočilih (scope=messages)."""
+    _log("search", q=q, scope=scope, date_from=date_from, date_to=date_to, cursor=cursor)
+    if scope not in SEARCH_SCOPES:
+        raise HTTPException(status_code=400, detail=f"scope mora biti eden od: {', '.join(SEARCH_SCOPES)}")
+    if not query_tokens(q):
+        raise HTTPException(status_code=400, detail="Prazen iskalni niz")
+    _page_params(cursor, None, frozenset())
+    start = _parse_filter_date(date_from)
+    end = _parse_filter_date(date_to)
+    limit = page_size(limit)
+    results = service.search(
+        q,
+        scope=scope,
+        date_from=start.strftime("%Y-%m-%d") if start else None,
+        date_to=end.strftime("%Y-%m-%d") if end else None,
+        limit=limit,
+        cursor=cursor,
+    )
+    return {"query": q, "scope": scope, "results": results, "next_cursor": next_cursor(results, limit)}
 
 
 @router.get("/api/admin/usage_stats")
@@ -242,6 +325,12 @@ def get_funnel_stats(days: int = 30):
     return service.get_funnel_stats(days=days)
 
 
+@router.get("/api/admin/intent_stats")
+def get_intent_stats(days: int = 30):
+    _log("intent_stats", days=days)
+    return {"days": days, "intents": service.get_intent_stats(days=days)}
+
+
 @router.get("/api/admin/missed_questions")
 def get_missed_questions(limit: int = 5):
     _log("missed_questions", limit=limit)
@@ -257,6 +346,18 @@ def create_knowledge_feedback(payload: KnowledgeFeedbackRequest):
     return {"ok": True, "id": feedback_id}
 
 
+def _parse_filter_date(date_str: Optional[str]) -> Optional[datetime]:
+    if not date_str:
+        return None
+    date_str = date_str.replace(" ", "")
+    for fmt in ("%Y-%m-%d", "%d.%m.%Y", "%d.%m.%y"):
+        try:
+            return datetime.strptime(date_str, fmt)
+        except (ValueError, TypeError):
+            continue
+    return None
+
+
 @router.get("/api/admin/reservations")
 def get_reservations(
     limit: int = 100,
@@ -265,54 +366,33 @@ def get_reservations(
     source: Optional[str] = None,
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
 ):
     """Vrne seznam rezervacij s filtri ter osnovno statistiko."""
     _log("reservations", limit=limit, status=status, type=type, source=source, date_from=date_from, date_to=date_to)
-    reservations = service.read_reservations(limit=limit, status=status, reservation_type=type, source=source)
-
-    def _parse_date(date_str: str) -> Optional[datetime]:
-        if not date_str:
-            return None
-        date_str = date_str.replace(" ", "")
-        for fmt in ("%Y-%m-%d", "%d.%m.%Y", "%d.%m.%y"):
-            try:
-                return datetime.strptime(date_str, fmt)
-            except (ValueError, TypeError):
-                continue
-        return None
+    columns = _page_params(cursor, fields, RESERVATION_FIELDS)
+    limit = page_size(limit)
+
+    start = _parse_filter_date(date_from)
+    end = _parse_filter_date(date_to)
+    # prekrivanje z obdobjem se filtrira v SQL; rezervacije brez datuma obdržimo
+    reservations = service.read_reservations(
+        limit=limit,
+        status=status,
+        reservation_type=type,
+        source=source,
+        date_from=start.strftime("%Y-%m-%d") if start else None,
+        date_to=end.strftime("%Y-%m-%d") if end else None,
+        include_undated=True,
+        cursor=cursor,
+        fields=columns,
+    )
 
-    if date_from or date_to:
-        start = _parse_date(date_from) if date_from else None
-        end = _parse_date(date_to) if date_to else None
-        filtered = []
-        for r in reservations:
-            days = _reservation_days(r.get("date", ""), r.get("nights"))
-            if not days:
-                # če ni datuma, ga obdržimo (ne izločimo)
-                filtered.append(r)
-                continue
-            overlaps = False
-            for d in days:
-                if start and d < start:
-                    continue
-                if end and d > end:
-                    continue
-                overlaps = True
-                break
-            if overlaps:
-                filtered.append(r)
-        reservations = filtered
-
-    all_res = service.read_reservations(limit=1000)
-    today_prefix = datetime.now().strftime("%Y-%m-%d")
-    stats = {
-        "pending": len([r for r in all_res if r.get("status") == "pending"]),
-        "processing": len([r for r in all_res if r.get("status") == "processing"]),
-        "confirmed": len([r for r in all_res if r.get("status") == "confirmed"]),
-        "today": len([r for r in all_res if str(r.get("created_at", "")).startswith(today_prefix)]),
-    }
+    counts = service.reservation_stats()
+    stats = {key: counts[key] for key in ("pending", "processing", "confirmed", "today")}
 
-    return {"reservations": reservations, "stats": stats}
+    return {"reservations": reservations, "stats": stats, "next_cursor": next_cursor(reservations, limit)}
 
 
 @router.put("/api/admin/reservations/{reservation_id}")
@@ -570,6 +650,18 @@ def get_imap_status():
     return load_state()
 
 
+@router.get("/api/admin/conversation_log_stats")
+def get_conversation_log_stats():
+    """Števci odloženega beleženja pogovorov (globina vrste, čas zapisa)."""
+    return conversation_log_metrics()
+
+
+@router.get("/api/admin/session_stats")
+def get_session_stats():
+    """Žive seje klepeta in izločitve (ttl, lru, memory) po shrambah ter združeni zahtevki."""
+    return {**session_store_metrics(), "chat_turns": chat_turns.metrics()}
+
+
 @router.post("/api/admin/imap_resync")
 def imap_resync(limit: int = 50):
     """Ročno prebere zadnjih N sporočil iz IMAP."""
@@ -586,40 +678,23 @@ def imap_preview(limit: int = 10):
 def get_stats():
     """Agregirani podatki za dashboard."""
     _log("stats")
-    today_prefix = datetime.now().strftime("%Y-%m-%d")
-    week_ago = datetime.now() - timedelta(days=7)
-    month_ago = datetime.now().replace(day=1)
-    res_list = service.read_reservations(limit=1000)
+    counts = service.reservation_stats()
+    return {
+        "danes": counts["today"],
+        "ta_teden": counts["week"],
+        "ta_mesec": counts["month"],
+        "po_statusu": {status: counts[status] for status in ("pending", "processing", "confirmed", "rejected")},
+        "po_tipu": {"room": counts["room"], "table": counts["table"]},
+    }
 
-    def parse_created(r) -> Optional[datetime]:
-        try:
-            return datetime.fromisoformat(str(r.get("created_at", "")))
-        except Exception:
-            return None
 
-    counts = {
-        "danes": 0,
-        "ta_teden": 0,
-        "ta_mesec": 0,
-        "po_statusu": {"pending": 0, "processing": 0, "confirmed": 0, "rejected": 0},
-        "po_tipu": {"room": 0, "table": 0},
-    }
-    for r in res_list:
-        created = parse_created(r)
-        if created:
-            if str(r.get("created_at", "")).startswith(today_prefix):
-                counts["danes"] += 1
-            if created >= week_ago:
-                counts["ta_teden"] += 1
-            if created >= month_ago:
-                counts["ta_mesec"] += 1
-        status = r.get("status")
-        if status in counts["po_statusu"]:
-            counts["po_statusu"][status] += 1
-        rtype = r.get("reservation_type")
-        if rtype in counts["po_tipu"]:
-            counts["po_tipu"][rtype] += 1
-    return counts
+def _stream_export(dataset: str, format: str, gzip: bool, **filters: Any) -> StreamingResponse:
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format mora biti eden od: {', '.join(EXPORT_FORMATS)}")
+    _, columns = EXPORT_DATASETS[dataset]
+    media_type, headers = export_headers(dataset, format, gzip)
+    rows = service.iter_export(dataset, **filters)
+    return StreamingResponse(export_chunks(rows, columns, format, gzip), media_type=media_type, headers=headers)
 
 
 @router.get("/api/admin/export")
@@ -629,56 +704,45 @@ def export_reservations(
     source: Optional[str] = None,
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
+    format: str = "csv",
+    gzip: bool = False,
 ):
-    """Izvoz rezervacij v CSV (uporabi iste filtre kot /reservations)."""
-    data = get_reservations(limit=1000, status=status, type=type, source=source, date_from=date_from, date_to=date_to)
-    reservations = data.get("reservations", [])
-    headers = [
-        "id",
-        "date",
-        "time",
-        "nights",
-        "rooms",
-        "people",
-        "kids",
-        "kids_small",
-        "reservation_type",
-        "name",
-        "email",
-        "phone",
-        "location",
-        "note",
-        "status",
-        "source",
-        "created_at",
-    ]
-    lines = [",".join(headers)]
-    for r in reservations:
-        row = []
-        for h in headers:
-            val = r.get(h, "")
-            if val is None:
-                val = ""
-            cell = str(val).replace('"', '""')
-            if any(c in cell for c in [",", "\n", '"']):
-                cell = f'"{cell}"'
-            row.append(cell)
-        lines.append(",".join(row))
-    csv_content = "\n".join(lines)
-    return Response(
-        content=csv_content,
-        media_type="text/csv",
-        headers={"Content-Disposition": "attachment; filename=reservations.csv"},
+    """Pretočni izvoz rezervacij (isti filtri kot /reservations, brez omejitve števila vrstic)."""
+    _log("export", dataset="reservations", format=format, gzip=gzip)
+    start = _parse_filter_date(date_from)
+    end = _parse_filter_date(date_to)
+    return _stream_export(
+        "reservations",
+        format,
+        gzip,
+        status=status,
+        reservation_type=type,
+        source=source,
+        date_from=start.strftime("%Y-%m-%d") if start else None,
+        date_to=end.strftime("%Y-%m-%d") if end else None,
+        include_undated=True,
     )
 
 
+@router.get("/api/admin/export/{dataset}")
+def export_dataset(dataset: str, format: str = "csv", gzip: bool = False):
+    """Pretočni izvoz celotne tabele: reservations, conversations, conversations_archive ali reservation_messages."""
+    _log("export", dataset=dataset, format=format, gzip=gzip)
+    if dataset not in EXPORT_DATASETS:
+        raise HTTPException(status_code=404, detail="Neznan izvoz")
+    return _stream_export(dataset, format, gzip)
+
+
 @router.get("/api/admin/calendar/rooms")
 def calendar_rooms(month: int, year: int):
     """Vrne zasedenost sob po dnevih z ločenimi pending/confirmed."""
     if month < 1 or month > 12:
         raise HTTPException(status_code=400, detail="Neveljaven mesec")
     days: dict[str, dict[str, Any]] = {}
-    reservations = service.read_reservations(limit=1000, reservation_type="room")
+    month_start, month_end = _month_bounds(year, month)
+    reservations = service.read_reservations(
+        limit=1000, reservation_type="room", date_from=month_start, date_to=month_end
+    )
     for r in reservations:
         status = r.get("status")
         if status not in {"pending", "processing", "confirmed"}:
@@ -712,7 +776,14 @@ def calendar_rooms(month: int, year: int):
                     "admin_notes": r.get("admin_notes"),
                 }
             )
-    return {"days": days}
+    # prosto število sob po dnevih (planer nad indeksom zasedenosti)
+    first = datetime(year, month, 1).toordinal()
+    month_days = calendar_module.monthrange(year, month)[1]
+    free_counts = service.planner().free_room_counts(first, month_days)
+    free_rooms = {
+        day.strftime("%Y-%m-%d"): count for day, count in zip(ordinal_dates(first, month_days), free_counts)
+    }
+    return {"days": days, "free_rooms": free_rooms}
 
 
 @router.get("/api/admin/calendar/tables")
@@ -721,7 +792,10 @@ def calendar_tables(month: int, year: int):
     if month < 1 or month > 12:
         raise HTTPException(status_code=400, detail="Neveljaven mesec")
     calendar: dict[str, dict[str, Any]] = {}
-    reservations = service.read_reservations(limit=1000, reservation_type="table")
+    month_start, month_end = _month_bounds(year, month)
+    reservations = service.read_reservations(
+        limit=1000, reservation_type="table", date_from=month_start, date_to=month_end
+    )
     for r in reservations:
         status = r.get("status")
         if status in {"rejected", "cancelled"}:
@@ -903,16 +977,11 @@ def debug_weekend_reservations():
             SELECT id, date, time, people, name, status, location
             FROM reservations
             WHERE reservation_type = 'table'
-            AND date IN ({ph}, {ph}, {ph})
-            ORDER BY date ASC, time ASC
+            AND start_date BETWEEN {ph} AND {ph}
+            ORDER BY start_date ASC, time ASC
         """
 
-        # Database stores dates in DD.MM.YYYY format, not YYYY-MM-DD
-        friday_str = friday.strftime("%d.%m.%Y")
-        saturday_str = saturday.strftime("%d.%m.%Y")
-        sunday_str = sunday.strftime("%d.%m.%Y")
-
-        cursor.execute(query, (friday_str, saturday_str, sunday_str))
+        cursor.execute(query, (friday.strftime("%Y-%m-%d"), sunday.strftime("%Y-%m-%d")))
 
         rows = cursor.fetchall()
         cursor.close()
@@ -996,25 +1065,7 @@ def delete_all_conversations():
     """Pobriše VSE pogovore iz baze. POZOR: nepopravljivo!"""
     _log("delete_all_conversations")
     try:
-        conn = service._conn()
-        cursor = conn.cursor()
-
-        # Preštej pred brisanjem
-        cursor.execute("SELECT COUNT(*) as cnt FROM conversations")
-        row = cursor.fetchone()
-        count_before = row["cnt"] if isinstance(row, dict) else row[0]
-
-        # Pobriši vse
-        cursor.execute("DELETE FROM conversations")
-        conn.commit()
-
-        # Preštej po brisanju
-        cursor.execute("SELECT COUNT(*) as cnt FROM conversations")
-        row = cursor.fetchone()
-        count_after = row["cnt"] if isinstance(row, dict) else row[0]
-
-        cursor.close()
-        conn.close()
+        count_before, count_after = service.delete_all_conversations()
 
         return {
             "success": True,
@@ -0,0 +1,184 @@
+"""
+Inkrementalni povzetki pogovorov za admin nadzorno ploščo.
+
+Namesto da bi vsak klic (plošča se osveži vsakih 30 s) ponovno agregiral celo
+tabelo conversations, vzdržujemo tri povzetne tabele:
+
+- conv_daily_questions: število vprašanj na dan (že brez šuma), ločeno
+  skupno / s follow-upom, z oznako, ali gre za vprašanje o rezervaciji,
+- conv_daily_intents: število sporočil po intentu na dan,
+- conv_session_days: dejstva o seji na dan (ali je začela / zaključila rezervacijo).
+
+Nov pogovor se prišteje v povzetke v isti transakciji, v kateri se zapiše
+(fold_new), in dobi oznako rolled_up. Vrstice, zapisane mimo tega (uvoz,
+starejše verzije), povzame apply_pending po oznaki in ne po vodni črti id:
+pri Postgresu se SERIAL id-ji ne potrdijo po vrsti, zato bi vrstico z nižjim
+id, potrjeno za višjim, vodna črta za vedno preskočila. Brisanje ali
+arhiviranje pogovorov povzetkov ne spremeni.
+"""
+
+import os
+import re
+from collections import Counter
+from datetime import datetime
+from typing import Any, Iterable
+
+ANALYTICS_ROLLUP_BATCH = int(os.getenv("ANALYTICS_ROLLUP_BATCH", "5000"))
+
+WATERMARK_NAME = "conversations"
+
+_TRIVIAL = {"da", "ne", "ja", "ok", "okej", "hvala", "super"}
+_EMAIL_RE = re.compile(r"[a-z0-9._%+-]+@[a-z0-9.-]+\.[a-z]{2,}")
+_PHONE_RE = re.compile(r"\d{7,}")
+_NUMERIC_RE = re.compile(r"[\d\s./-]+")
+_DATE_RE = re.compile(r"\d{1,2}\.\d{1,2}\.\d{2,4}")
+_BOOKING_RE = re.compile(r"(rezerv|booking|reserve|soba|miza|nočitev|nocit|room|table)")
+
+
+def is_noise(text: str) -> bool:
+    """Kratki odgovori, kontakti, datumi in številke niso 'vprašanja'."""
+    if not text:
+        return True
+    cleaned = text.strip()
+    lowered = cleaned.lower()
+    if len(lowered) < 4:
+        return True
+    if lowered in _TRIVIAL:
+        return True
+    if "@" in cleaned:
+        return True
+    if _EMAIL_RE.search(lowered):
+        return True
+    if _PHONE_RE.search(cleaned.replace(" ", "")):
+        return True
+    if _NUMERIC_RE.fullmatch(cleaned):
+        return True
+    if _DATE_RE.search(cleaned):
+        return True
+    return False
+
+
+def is_booking_question(text: str) -> bool:
+    """Vprašanja, povezana z rezervacijami (izločena iz 'top vprašanj')."""
+    return bool(_BOOKING_RE.search((text or "").strip().lower()))
+
+
+def _is_started(intent: str) -> bool:
+    return intent.startswith("reservation") and intent not in ("reservation_completed", "reservation_cancel")
+
+
+def _day(created_at: Any) -> str:
+    if isinstance(created_at, datetime):
+        return created_at.strftime("%Y-%m-%d")
+    return str(created_at or "")[:10]
+
+
+def _value(row: Any, key: str, idx: int) -> Any:
+    return row[key] if isinstance(row, dict) else row[idx]
+
+
+def summarize(rows: Iterable[Any]) -> tuple[dict, Counter, dict]:
+    """Iz vrstic (id, session_id, user_message, intent, needs_followup, created_at)
+    pripravi prirastke za vse tri povzetne tabele."""
+    questions: dict[tuple[str, str], list[int]] = {}
+    intents: Counter = Counter()
+    sessions: dict[tuple[str, str], list[int]] = {}
+    for row in rows:
+        session_id = _value(row, "session_id", 1)
+        message = _value(row, "user_message", 2) or ""
+        intent = _value(row, "intent", 3) or ""
+        followup = 1 if _value(row, "needs_followup", 4) else 0
+        day = _day(_value(row, "created_at", 5))
+        if not day:
+            continue
+        intents[(day, intent)] += 1
+        if not is_noise(message):
+            entry = questions.setdefault((day, message), [0, 0, 1 if is_booking_question(message) else 0])
+            entry[0] += 1
+            entry[1] += followup
+        if session_id:
+            facts = sessions.setdefault((day, session_id), [0, 0])
+            facts[0] |= 1 if _is_started(intent) else 0
+            facts[1] |= 1 if intent == "reservation_completed" else 0
+    return questions, intents, sessions
+
+
+def fold(cur: Any, dialect: str, rows: Iterable[Any]) -> None:
+    """Prišteje vrstice (oblika kot pri summarize) v povzetne tabele.
+
+    Ključi se zapišejo urejeno, da sočasne transakcije zaklepajo vrstice
+    povzetkov v istem vrstnem redu (brez smrtnih objemov).
+    """
+    ph = "%s" if dialect == "postgres" else "?"
+    greatest = "GREATEST" if dialect == "postgres" else "MAX"
+    questions, intents, sessions = summarize(rows)
+    if questions:
+        cur.executemany(
+            "INSERT INTO conv_daily_questions (day, user_message, total, followups, booking) "
+            f"VALUES ({ph}, {ph}, {ph}, {ph}, {ph}) "
+            "ON CONFLICT (day, user_message) DO UPDATE SET "
+            "total = conv_daily_questions.total + excluded.total, "
+            "followups = conv_daily_questions.followups + excluded.followups",
+            [(day, message, total, followups, booking) for (day, message), (total, followups, booking) in sorted(questions.items())],
+        )
+    if intents:
+        cur.executemany(
+            f"INSERT INTO conv_daily_intents (day, intent, count) VALUES ({ph}, {ph}, {ph}) "
+            "ON CONFLICT (day, intent) DO UPDATE SET count = conv_daily_intents.count + excluded.count",
+            [(day, intent, count) for (day, intent), count in sorted(intents.items())],
+        )
+    if sessions:
+        cur.executemany(
+            f"INSERT INTO conv_session_days (day, session_id, started, completed) VALUES ({ph}, {ph}, {ph}, {ph}) "
+            "ON CONFLICT (day, session_id) DO UPDATE SET "
+            f"started = {greatest}(conv_session_days.started, excluded.started), "
+            f"completed = {greatest}(conv_session_days.completed, excluded.completed)",
+            [(day, session_id, started, completed) for (day, session_id), (started, completed) in sorted(sessions.items())],
+        )
+
+
+def fold_new(cur: Any, dialect: str, rows: Iterable[tuple]) -> None:
+    """Povzetki za pravkar zapisane pogovore (vrstice kot pri INSERT v conversations:
+    session_id, user_message, bot_response, intent, needs_followup, followup_email, created_at)."""
+    fold(cur, dialect, [(None, row[0], row[1], row[3], row[4], row[6]) for row in rows])
+
+
+def apply_pending(cur: Any, dialect: str, batch: int = ANALYTICS_ROLLUP_BATCH) -> int:
+    """Povzame naslednji paket pogovorov brez oznake rolled_up; vrne število vrstic.
+
+    Prvi stavek zaklene vrstico analytics_watermark, zato sočasni klici (več
+    workerjev) isti paket obdelajo le enkrat.
+    """
+    ph = "%s" if dialect == "postgres" else "?"
+    cur.execute(
+        f"UPDATE analytics_watermark SET updated_at = {ph} WHERE name = {ph}",
+        (datetime.now().isoformat(timespec="seconds"), WATERMARK_NAME),
+    )
+    cur.execute(
+        "SELECT id, session_id, user_message, intent, needs_followup, created_at FROM conversations "
+        f"WHERE rolled_up = FALSE ORDER BY id LIMIT {ph}",
+        (batch,),
+    )
+    rows = cur.fetchall()
+    if not rows:
+        return 0
+    fold(cur, dialect, rows)
+    cur.executemany(
+        f"UPDATE conversations SET rolled_up = TRUE WHERE id = {ph}",
+        [(int(_value(row, "id", 0)),) for row in rows],
+    )
+    return len(rows)
+
+
+def catch_up(cur: Any, dialect: str) -> None:
+    """Korak migracije: vrstice, ki jih je stara vodna črta že povzela, dobijo oznako."""
+    cur.execute(
+        "UPDATE conversations SET rolled_up = TRUE WHERE id <= "
+        f"(SELECT last_id FROM analytics_watermark WHERE name = '{WATERMARK_NAME}')"
+    )
+
+
+def reset(cur: Any) -> None:
+    """Izprazni povzetke (pred brisanjem vseh pogovorov)."""
+    for table in ("conv_daily_questions", "conv_daily_intents", "conv_session_days"):
+        cur.execute(f"DELETE FROM {table}")
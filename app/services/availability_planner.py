@@ -0,0 +1,129 @@
+"""
+Planer razpoložljivosti nad indeksom zasedenosti.
+
+Zasedenost sob predstavi kot polje po dnevih (št. zasedenih sob), sobe kot
+bitne maske noči, jedilnice pa kot polje zasedenih sedežev po terminih.
+Iskanje oken teče z drsečim oknom (prefiksne vsote) namesto ponovnega
+preverjanja vsake noči za vsak kandidatni datum.
+"""
+
+from datetime import date, timedelta
+from typing import Callable, Iterable, Optional
+
+from app.services.occupancy_index import OccupancyIndex, night_mask
+
+
+class AvailabilityPlanner:
+    def __init__(
+        self,
+        index: OccupancyIndex,
+        room_capacity: int,
+        dining_rooms: list[dict],
+    ) -> None:
+        self.index = index
+        self.room_capacity = room_capacity
+        self.dining_rooms = dining_rooms
+
+    # --- sobe ------------------------------------------------------------
+    def room_usage(self, start: int, days: int) -> list[int]:
+        """Št. zasedenih sob za dneve [start, start + days) (ordinali)."""
+        used = self.index.rooms_used_by_day()
+        return [used.get(start + i, 0) for i in range(days)]
+
+    def free_room_counts(self, start: int, days: int) -> list[int]:
+        return [max(0, self.room_capacity - used) for used in self.room_usage(start, days)]
+
+    def free_rooms_by_day(self, start: int, days: int) -> list[list[str]]:
+        """Proste konkretne sobe za vsako noč [start, start + days)."""
+        bits = self.index.room_bits()
+        result = []
+        for offset in range(days):
+            mask = night_mask(start + offset, 1)
+            result.append([room_id for room_id in self.index.room_ids if mask and not bits[room_id] & mask])
+        return result
+
+    def earliest_room_window(
+        self,
+        first: int,
+        nights: int,
+        rooms_needed: int,
+        horizon: int = 30,
+        accept: Optional[Callable[[int], bool]] = None,
+    ) -> Optional[int]:
+        """Najzgodnejši prihod v [first, first + horizon), kjer je N noči prostih R sob.
+
+        accept(ordinal) lahko dodatno izloči prihode (npr. zaprti dnevi).
+        """
+        if nights <= 0 or rooms_needed > self.room_capacity:
+            return None
+        usage = self.room_usage(first, horizon + nights)
+        # prefix[i] = število polnih noči v usage[:i]
+        prefix = [0]
+        for used in usage:
+            prefix.append(prefix[-1] + (1 if used + rooms_needed > self.room_capacity else 0))
+        for offset in range(horizon):
+            if prefix[offset + nights] - prefix[offset]:
+                continue
+            if accept is None or accept(first + offset):
+                return first + offset
+        return None
+
+    def rooms_for_window(
+        self, start: int, nights: int, rooms_needed: int, preferred: Iterable[str] = ()
+    ) -> Optional[list[str]]:
+        """Konkretne sobe (najprej želene), proste vse noči; None, če jih ni dovolj."""
+        mask = night_mask(start, nights)
+        bits = self.index.room_bits()
+        order = list(dict.fromkeys([*preferred, *self.index.room_ids]))
+        free = [room_id for room_id in order if room_id in bits and not bits[room_id] & mask]
+        if len(free) < rooms_needed:
+            return None
+        return free[:rooms_needed]
+
+    def earliest_room_assignment(
+        self,
+        first: int,
+        nights: int,
+        rooms_needed: int,
+        horizon: int = 30,
+        accept: Optional[Callable[[int], bool]] = None,
+    ) -> Optional[tuple[int, list[str]]]:
+        """Najzgodnejši prihod s konkretnimi sobami (drseča maska noči)."""
+        bits = self.index.room_bits()
+        mask = night_mask(first, nights)
+        for offset in range(horizon):
+            if mask and (accept is None or accept(first + offset)):
+                free = [room_id for room_id in self.index.room_ids if not bits[room_id] & mask]
+                if len(free) >= rooms_needed:
+                    return first + offset, free[:rooms_needed]
+            mask <<= 1
+        return None
+
+    # --- mize ------------------------------------------------------------
+    def table_free_seats(self, date_str: str, times: list[str]) -> dict[str, list[int]]:
+        """Ime jedilnice -> prosti sedeži po terminih (isti vrstni red kot times)."""
+        return {
+            room["name"]: [room["capacity"] - self.index.table_seats(date_str, t, room["name"]) for t in times]
+            for room in self.dining_rooms
+        }
+
+    def next_table_slots(
+        self, dates: Iterable[str], times: list[str], people: int, limit: int
+    ) -> list[tuple[str, str, str]]:
+        """Prvih `limit` terminov (datum, ura, jedilnica) z vsaj `people` prostimi sedeži."""
+        slots: list[tuple[str, str, str]] = []
+        for date_str in dates:
+            free = self.table_free_seats(date_str, times)
+            for slot, t in enumerate(times):
+                for room in self.dining_rooms:
+                    if free[room["name"]][slot] >= people:
+                        slots.append((date_str, t, room["name"]))
+                        break
+                if len(slots) >= limit:
+                    return slots
+        return slots
+
+
+def ordinal_dates(start: int, days: int) -> list[date]:
+    first = date.fromordinal(start)
+    return [first + timedelta(days=i) for i in range(days)]
@@ -0,0 +1,438 @@
+"""
+Stisnjene varnostne kopije baze z rotacijo, preverjanjem in obnovo.
+
+SQLite: online backup API (ločena bralna povezava; v WAL načinu en korak na
+posnetku, sicer po BACKUP_STEP_PAGES straneh s premori), rezultat se stisne.
+Postgres: COPY ... TO STDOUT v REPEATABLE READ transakciji. Polna kopija vseh
+tabel vsakih BACKUP_FULL_EVERY_DAYS dni, vmes inkrementalne: tabele, ki se le
+dopolnjujejo (pogovori, sporočila, report_log), ostale (majhne) v celoti.
+Vodna črta ni id (vrstica z nižjim id se lahko potrdi za višjim), ampak xmin
+posnetka prejšnje kopije: inkrementalna kopija vzame vrstice, ki jih je vstavila
+ali spremenila transakcija od tega xmin naprej (age(xmin)), torej tudi tiste,
+ki jih prejšnji posnetek še ni videl, in naknadne spremembe (npr.
+followup_email). Vrstice, ki jih je prejšnja kopija že imela, se lahko
+ponovijo; obnova jih zamenja po id. Primerjava z age() velja znotraj 2^31
+transakcij, polna kopija pa je vsaj na BACKUP_FULL_EVERY_DAYS dni.
+
+Vsaka kopija je mapa v BACKUP_DIR z manifest.json (vrsta, veriga, vodne črte,
+sha256 vsake datoteke). Kopije starejše od BACKUP_RETENTION_DAYS se brišejo,
+razen če jih potrebuje veriga obdržanih inkrementalnih kopij.
+
+Ročni zagon:
+    python -m app.services.backup_service backup
+    python -m app.services.backup_service list
+    python -m app.services.backup_service verify <ime>
+    python -m app.services.backup_service restore <ime> --target data/restored.db
+    python -m app.services.backup_service restore <ime> --target-url postgresql://...
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+from typing import Any, BinaryIO, Optional
+
+try:
+    import zstandard
+
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+BACKUP_DIR = os.getenv("BACKUP_DIR", os.path.join(PROJECT_ROOT, "backups", "db"))
+BACKUP_COMPRESSION = os.getenv("BACKUP_COMPRESSION", "zstd" if ZSTD_AVAILABLE else "gzip").strip().lower()
+BACKUP_RETENTION_DAYS = int(os.getenv("BACKUP_RETENTION_DAYS", "14"))
+BACKUP_FULL_EVERY_DAYS = int(os.getenv("BACKUP_FULL_EVERY_DAYS", "7"))
+BACKUP_STEP_PAGES = int(os.getenv("BACKUP_STEP_PAGES", "1024"))
+
+# Postgres: tabele, ki se le dopolnjujejo (inkrementalno po id), in tabele, ki se kopirajo v celoti
+PG_APPEND_TABLES = ("conversations", "conversations_archive", "reservation_messages", "report_log")
+# knjiga zasedenosti (migracija 9); brez nje bi obnovljena baza dovolila dvojne rezervacije
+PG_LEDGER_TABLES = ("room_night_claims", "table_slot_claims", "table_claims")
+PG_FULL_TABLES = (
+    "schema_version",
+    "reservations",
+    "inquiries",
+    "knowledge_feedback",
+    "conv_daily_questions",
+    "conv_daily_intents",
+    "conv_session_days",
+    "analytics_watermark",
+    # seje klepeta s skupno hrambo (migracija 12): rezervacije v teku preživijo obnovo
+    "chat_sessions",
+) + PG_LEDGER_TABLES
+
+_EXTENSIONS = {"gzip": ".gz", "zstd": ".zst"}
+_CHUNK = 1024 * 1024
+
+
+class BackupError(Exception):
+    pass
+
+
+# --- stiskanje ---------------------------------------------------------------
+def _open_writer(path: str, compression: str) -> BinaryIO:
+    if compression == "zstd":
+        if not ZSTD_AVAILABLE:
+            raise BackupError("zstd ni na voljo (pip install zstandard)")
+        return zstandard.ZstdCompressor(level=10).stream_writer(open(path, "wb"), closefd=True)
+    return gzip.open(path, "wb", compresslevel=6)
+
+
+def _open_reader(path: str) -> BinaryIO:
+    if path.endswith(".zst"):
+        if not ZSTD_AVAILABLE:
+            raise BackupError("zstd ni na voljo (pip install zstandard)")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    return gzip.open(path, "rb")
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _compress_file(src: str, dst: str, compression: str) -> None:
+    with open(src, "rb") as source, _open_writer(dst, compression) as target:
+        shutil.copyfileobj(source, target, _CHUNK)
+
+
+def _decompress_file(src: str, dst: str) -> None:
+    with _open_reader(src) as source, open(dst, "wb") as target:
+        shutil.copyfileobj(source, target, _CHUNK)
+
+
+class BackupManager:
+    """Izdela, našteje, preveri, obnovi in rotira kopije za ReservationService."""
+
+    def __init__(
+        self,
+        service: Any = None,
+        backup_dir: str = BACKUP_DIR,
+        compression: str = BACKUP_COMPRESSION,
+        retention_days: int = BACKUP_RETENTION_DAYS,
+        full_every_days: int = BACKUP_FULL_EVERY_DAYS,
+    ) -> None:
+        if service is None:
+            from app.services.reservation_service import get_reservation_service
+
+            service = get_reservation_service()
+        if compression not in _EXTENSIONS:
+            raise BackupError(f"Neznano stiskanje: {compression}")
+        self.service = service
+        self.backup_dir = backup_dir
+        self.compression = compression
+        self.retention_days = retention_days
+        self.full_every_days = full_every_days
+        os.makedirs(self.backup_dir, exist_ok=True)
+
+    # --- izdelava --------------------------------------------------------
+    def run(self) -> dict:
+        """Kopija + rotacija (kliče scheduler)."""
+        manifest = self.backup()
+        manifest["rotated"] = self.rotate()
+        return manifest
+
+    def backup(self) -> dict:
+        now = datetime.now()
+        if self.service.use_postgres:
+            previous = self._latest_chain_head(now)
+            kind = "pg-incremental" if previous else "pg-full"
+        else:
+            previous, kind = None, "sqlite"
+        name = f"{kind}-{now:%Y%m%d-%H%M%S-%f}"
+        path = os.path.join(self.backup_dir, name)
+        tmp_path = path + ".tmp"
+        os.makedirs(tmp_path)
+        try:
+            if kind == "sqlite":
+                files, watermarks, columns = self._backup_sqlite(tmp_path), {}, {}
+            else:
+                files, watermarks, columns = self._backup_postgres(tmp_path, previous)
+            manifest = {
+                "name": name,
+                "kind": kind,
+                "created_at": now.isoformat(timespec="seconds"),
+                "base": previous["base"] if previous else name,
+                "previous": previous["name"] if previous else None,
+                "compression": self.compression,
+                "watermarks": watermarks,
+                "columns": columns,
+                "files": {
+                    fname: {
+                        "sha256": _sha256(os.path.join(tmp_path, fname)),
+                        "bytes": os.path.getsize(os.path.join(tmp_path, fname)),
+                    }
+                    for fname in files
+                },
+            }
+            with open(os.path.join(tmp_path, "manifest.json"), "w", encoding="utf-8") as handle:
+                json.dump(manifest, handle, indent=2)
+            os.replace(tmp_path, path)  # kopija je vidna šele, ko je cela
+        except Exception:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+        return manifest
+
+    def _backup_sqlite(self, path: str) -> list[str]:
+        raw = os.path.join(path, "reservations.db")
+        source = self.service.storage.connect()
+        target = sqlite3.connect(raw)
+        try:
+            # v WAL načinu en korak bere iz posnetka in ne ovira pisanja;
+            # sicer po korakih, da pisalna nit vmes dobi zaklep
+            pages = -1 if self.service.sqlite_wal else BACKUP_STEP_PAGES
+            source.backup(target, pages=pages, sleep=0.05)
+        finally:
+            target.close()
+            source.close()
+        fname = "reservations.db" + _EXTENSIONS[self.compression]
+        _compress_file(raw, os.path.join(path, fname), self.compression)
+        os.remove(raw)
+        return [fname]
+
+    def _backup_postgres(self, path: str, previous: Optional[dict]) -> tuple[list[str], dict[str, int], dict]:
+        conn = self.service._conn()
+        files: list[str] = []
+        columns: dict[str, list[str]] = {}
+        try:
+            conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
+            cur = conn.cursor()
+            # najstarejša transakcija, ki je bila ob posnetku še odprta (32-bitni xid kot v stolpcu xmin)
+            cur.execute("SELECT txid_snapshot_xmin(txid_current_snapshot()) % 4294967296 AS snapshot_xmin")
+            watermarks = {"snapshot_xmin": int(cur.fetchone()["snapshot_xmin"])}
+            for table in PG_FULL_TABLES + PG_APPEND_TABLES:
+                # vrstni red stolpcev se med bazami lahko razlikuje (ALTER TABLE), zato ga zapišemo
+                cur.execute(f"SELECT * FROM {table} LIMIT 0")
+                columns[table] = [col[0] for col in cur.description]
+                query = f"SELECT {', '.join(columns[table])} FROM {table}"
+                if table in PG_APPEND_TABLES:
+                    if previous:
+                        last = int(previous["watermarks"]["snapshot_xmin"])
+                        query += f" WHERE age(xmin) <= age('{last}'::xid)"
+                    query += " ORDER BY id"
+                fname = f"{table}.csv" + _EXTENSIONS[self.compression]
+                with _open_writer(os.path.join(path, fname), self.compression) as handle:
+                    cur.copy_expert(f"COPY ({query}) TO STDOUT WITH CSV HEADER", handle)
+                files.append(fname)
+            conn.rollback()
+        finally:
+            conn.close()
+        return files, watermarks, columns
+
+    def _latest_chain_head(self, now: datetime) -> Optional[dict]:
+        """Zadnja Postgres kopija, na katero lahko nadaljujemo inkrementalno (ali None za polno)."""
+        manifests = [m for m in self.list_backups() if m["kind"].startswith("pg-")]
+        if not manifests:
+            return None
+        latest = manifests[-1]
+        if "snapshot_xmin" not in latest["watermarks"]:
+            return None  # starejša kopija z vodno črto id: začnemo novo verigo
+        base = next((m for m in manifests if m["name"] == latest["base"]), None)
+        if base is None or now - datetime.fromisoformat(base["created_at"]) >= timedelta(days=self.full_every_days):
+            return None
+        return latest
+
+    # --- pregled in preverjanje -------------------------------------------
+    def list_backups(self) -> list[dict]:
+        manifests = []
+        for entry in sorted(os.listdir(self.backup_dir)):
+            manifest_path = os.path.join(self.backup_dir, entry, "manifest.json")
+            if entry.endswith(".tmp") or not os.path.exists(manifest_path):
+                continue
+            with open(manifest_path, encoding="utf-8") as handle:
+                manifests.append(json.load(handle))
+        return sorted(manifests, key=lambda m: (m["created_at"], m["name"]))
+
+    def _manifest(self, name: str) -> dict:
+        manifest_path = os.path.join(self.backup_dir, name, "manifest.json")
+        if not os.path.exists(manifest_path):
+            raise BackupError(f"Kopija {name} ne obstaja")
+        with open(manifest_path, encoding="utf-8") as handle:
+            return json.load(handle)
+
+    def verify(self, name: str) -> list[str]:
+        """Vrne seznam težav (prazen seznam = kopija je celovita)."""
+        manifest = self._manifest(name)
+        path = os.path.join(self.backup_dir, name)
+        problems = []
+        for fname, meta in manifest["files"].items():
+            fpath = os.path.join(path, fname)
+            if not os.path.exists(fpath):
+                problems.append(f"{fname}: manjka")
+                continue
+            if _sha256(fpath) != meta["sha256"]:
+                problems.append(f"{fname}: sha256 se ne ujema")
+                continue
+            try:
+                if manifest["kind"] == "sqlite":
+                    with tempfile.TemporaryDirectory(dir=self.backup_dir) as tmp:
+                        raw = os.path.join(tmp, "check.db")
+                        _decompress_file(fpath, raw)
+                        conn = sqlite3.connect(raw)
+                        try:
+                            result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+                        finally:
+                            conn.close()
+                        if result != "ok":
+                            problems.append(f"{fname}: integrity_check: {result}")
+                else:
+                    with _open_reader(fpath) as handle:
+                        while handle.read(_CHUNK):
+                            pass  # gzip/zstd preveri kontrolno vsoto ob branju
+            except Exception as exc:
+                problems.append(f"{fname}: {exc}")
+        return problems
+
+    # --- obnova ----------------------------------------------------------
+    def restore(self, name: str, target: Optional[str] = None, target_url: Optional[str] = None) -> str:
+        manifest = self._manifest(name)
+        if manifest["kind"] == "sqlite":
+            if not target:
+                raise BackupError("Za SQLite obnovo podaj --target (pot do nove datoteke baze)")
+            return self._restore_sqlite(manifest, target)
+        if not target_url:
+            raise BackupError("Za Postgres obnovo podaj --target-url")
+        return self._restore_postgres(manifest, target_url)
+
+    def _restore_sqlite(self, manifest: dict, target: str) -> str:
+        problems = self.verify(manifest["name"])
+        if problems:
+            raise BackupError("; ".join(problems))
+        fname = next(iter(manifest["files"]))
+        tmp_target = target + ".restoring"
+        _decompress_file(os.path.join(self.backup_dir, manifest["name"], fname), tmp_target)
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(target + suffix):
+                os.remove(target + suffix)
+        os.replace(tmp_target, target)
+        return target
+
+    def _restore_postgres(self, manifest: dict, target_url: str) -> str:
+        import psycopg2
+        from psycopg2.extras import RealDictCursor
+
+        from app.services.migrations import run_migrations
+
+        chain = [m for m in self.list_backups() if m["base"] == manifest["base"]]
+        chain = chain[: [m["name"] for m in chain].index(manifest["name"]) + 1]
+        for link in chain:
+            problems = self.verify(link["name"])
+            if problems:
+                raise BackupError(f"{link['name']}: " + "; ".join(problems))
+        run_migrations(lambda: psycopg2.connect(target_url, cursor_factory=RealDictCursor), postgres=True, key=target_url)
+        conn = psycopg2.connect(target_url, cursor_factory=RealDictCursor)
+        try:
+            cur = conn.cursor()
+            cur.execute(f"TRUNCATE {', '.join(PG_FULL_TABLES + PG_APPEND_TABLES)}")
+            for link in chain:
+                for table in PG_FULL_TABLES + PG_APPEND_TABLES:
+                    fname = f"{table}.csv" + _EXTENSIONS[link["compression"]]
+                    if fname not in link["files"]:
+                        continue
+                    names = ", ".join(link["columns"][table])
+                    if table in PG_FULL_TABLES:
+                        cur.execute(f"TRUNCATE {table}")
+                    elif link["kind"] == "pg-incremental":
+                        # vrstice se lahko ponovijo iz prejšnje kopije (ali so bile vmes spremenjene)
+                        self._restore_append_rows(cur, link, table, fname, names)
+                        continue
+                    with _open_reader(os.path.join(self.backup_dir, link["name"], fname)) as handle:
+                        cur.copy_expert(f"COPY {table} ({names}) FROM STDIN WITH CSV HEADER", handle)
+            # inkrementalne kopije ne beležijo brisanja: arhivirani pogovori ne smejo ostati tudi v vročem delu
+            cur.execute("DELETE FROM conversations WHERE id IN (SELECT id FROM conversations_archive)")
+            for table in PG_FULL_TABLES + PG_APPEND_TABLES:
+                if "id" not in chain[-1]["columns"].get(table, []):
+                    continue  # povzetki in seje imajo sestavljen ključ, brez zaporedja
+                cur.execute("SELECT pg_get_serial_sequence(%s, 'id') AS seq", (table,))
+                seq = cur.fetchone()["seq"]
+                if seq:
+                    cur.execute(f"SELECT setval(%s, COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)", (seq,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        last = chain[-1]
+        if any(f"{table}.csv" + _EXTENSIONS[last["compression"]] not in last["files"] for table in PG_LEDGER_TABLES):
+            # kopija iz časa pred knjigo zasedenosti: knjigo zgradimo iz obnovljenih rezervacij
+            from app.services.reservation_service import ReservationService
+            from app.services.storage import PostgresStorage
+
+            ReservationService(storage=PostgresStorage(target_url)).rebuild_claims()
+        return target_url
+
+    def _restore_append_rows(self, cur: Any, link: dict, table: str, fname: str, names: str) -> None:
+        """COPY v začasno tabelo, nato zamenjava vrstic z istim id."""
+        cur.execute(f"CREATE TEMP TABLE restore_rows (LIKE {table})")
+        with _open_reader(os.path.join(self.backup_dir, link["name"], fname)) as handle:
+            cur.copy_expert(f"COPY restore_rows ({names}) FROM STDIN WITH CSV HEADER", handle)
+        cur.execute(f"DELETE FROM {table} WHERE id IN (SELECT id FROM restore_rows)")
+        cur.execute(f"INSERT INTO {table} ({names}) SELECT {names} FROM restore_rows")
+        cur.execute("DROP TABLE restore_rows")
+
+    # --- rotacija --------------------------------------------------------
+    def rotate(self, now: Optional[datetime] = None) -> list[str]:
+        """Pobriše kopije starejše od retention_days, razen baz verig, ki jih še potrebujemo."""
+        now = now or datetime.now()
+        cutoff = now - timedelta(days=self.retention_days)
+        manifests = self.list_backups()
+        if not manifests:
+            return []
+        kept = [m for m in manifests if datetime.fromisoformat(m["created_at"]) >= cutoff] or manifests[-1:]
+        needed_bases = {m["base"] for m in kept}
+        removed = []
+        for manifest in manifests:
+            if manifest in kept or manifest["base"] in needed_bases:
+                continue
+            shutil.rmtree(os.path.join(self.backup_dir, manifest["name"]), ignore_errors=True)
+            removed.append(manifest["name"])
+        return removed
+
+
+def run_scheduled_backup() -> dict:
+    """Kopija in rotacija za scheduler_service."""
+    return BackupManager().run()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Varnostne kopije baze rezervacij")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("backup")
+    sub.add_parser("list")
+    verify = sub.add_parser("verify")
+    verify.add_argument("name")
+    restore = sub.add_parser("restore")
+    restore.add_argument("name")
+    restore.add_argument("--target", help="SQLite: pot do nove datoteke baze")
+    restore.add_argument("--target-url", help="Postgres: connection string ciljne baze")
+    args = parser.parse_args()
+
+    manager = BackupManager()
+    if args.command == "backup":
+        manifest = manager.run()
+        print(f"{manifest['name']} ({manifest['kind']}), rotirano: {len(manifest['rotated'])}")
+    elif args.command == "list":
+        for manifest in manager.list_backups():
+            size = sum(meta["bytes"] for meta in manifest["files"].values())
+            print(f"{manifest['name']}  {manifest['kind']:<15} {size:>12} B  veriga={manifest['base']}")
+    elif args.command == "verify":
+        problems = manager.verify(args.name)
+        print("OK" if not problems else "\n".join(problems))
+        raise SystemExit(1 if problems else 0)
+    elif args.command == "restore":
+        print(f"Obnovljeno v {manager.restore(args.name, target=args.target, target_url=args.target_url)}")
+
+
+if __name__ == "__main__":
+    main()
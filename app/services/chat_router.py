@@ -13,7 +13,7 @@ from fastapi import APIRouter
 from fastapi.responses import StreamingResponse
 
 from app.models.chat import ChatRequest, ChatResponse
-from app.services.reservation_service import ReservationService
+from app.services.reservation_service import get_reservation_service
 from app.services.email_service import send_guest_confirmation, send_admin_notification, send_custom_message
 from app.rag.rag_engine import rag_engine
 from app.rag.knowledge_base import (
@@ -496,7 +496,7 @@ UNKNOWN_RESPONSES = [
     "Nimam informacije o tem.",
 ]
 
-reservation_service = ReservationService()
+reservation_service = get_reservation_service()
 
 # Spletna trgovina (policy)
 STRICT_POLICY = os.getenv("STRICT_POLICY", "true").strip().lower() in {"1", "true", "yes", "on"}
@@ -3260,6 +3260,7 @@ def chat_stream(payload: ChatRequestWithSession):
             bot_response=final_reply,
             intent="stream",
             needs_followup=False,
+            defer=True,
         )
         conversation_history.append({"role": "assistant", "content": final_reply})
         if len(conversation_history) > 12:
@@ -0,0 +1,278 @@
+"""
+Odloženo (write-behind) beleženje pogovorov.
+
+Chat odgovor ne čaka na bazo: vrstica gre v omejeno vrsto, ozadna nit pa jih
+zapiše z executemany, ko se nabere CONV_LOG_BATCH_ROWS vrstic ali poteče
+CONV_LOG_FLUSH_MS. Če baza ni dosegljiva (ali je vrsta polna), se vrstice
+zapišejo v JSONL datoteko in ob naslednjem uspešnem zapisu ponovno uvozijo.
+Paket, ki pri uvozu pade CONV_LOG_REPLAY_ATTEMPTS-krat (npr. vrstica, ki je baza
+ne sprejme), se uvozi po vrsticah; neuspešne gredo v <datoteka>.quarantine za
+ročni pregled, ostanek datoteke pa se uvaža naprej. Ob zaustavitvi se vrsta
+izprazni.
+"""
+
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Optional
+
+CONV_LOG_QUEUE_MAX = int(os.getenv("CONV_LOG_QUEUE_MAX", "10000"))
+CONV_LOG_BATCH_ROWS = int(os.getenv("CONV_LOG_BATCH_ROWS", "50"))
+CONV_LOG_FLUSH_MS = int(os.getenv("CONV_LOG_FLUSH_MS", "500"))
+CONV_LOG_REPLAY_ATTEMPTS = int(os.getenv("CONV_LOG_REPLAY_ATTEMPTS", "3"))
+
+# (session_id, user_message, bot_response, intent, needs_followup, followup_email, created_at)
+ConversationRow = tuple
+
+_STOP = object()
+
+
+class ConversationLogQueue:
+    def __init__(
+        self,
+        insert_rows: Callable[[list[ConversationRow]], None],
+        spill_path: str,
+        max_size: int = CONV_LOG_QUEUE_MAX,
+        batch_rows: int = CONV_LOG_BATCH_ROWS,
+        flush_ms: int = CONV_LOG_FLUSH_MS,
+    ) -> None:
+        self.insert_rows = insert_rows
+        self.spill_path = spill_path
+        self.batch_rows = max(1, batch_rows)
+        self.flush_interval = max(1, flush_ms) / 1000
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, max_size))
+        self._spill_lock = threading.Lock()
+        # neuspeli uvozi paketa iz datoteke (ključ = vsebina paketa)
+        self._replay_failures: dict[str, int] = {}
+        self._closed = False
+        self.stats = {
+            "enqueued": 0,
+            "flushed": 0,
+            "flushes": 0,
+            "spilled": 0,
+            "replayed": 0,
+            "quarantined": 0,
+            "errors": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+        }
+        self._thread = threading.Thread(target=self._run, name="conversation-log", daemon=True)
+        self._thread.start()
+
+    # --- API -------------------------------------------------------------
+    def enqueue(self, row: ConversationRow) -> bool:
+        """Doda vrstico v vrsto (ne blokira). Pri polni vrsti jo zapiše na disk."""
+        if self._closed:
+            self._spill([row])
+            return False
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self._spill([row])
+            return False
+        self.stats["enqueued"] += 1
+        return True
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def metrics(self) -> dict:
+        return {**self.stats, "queue_depth": self.queue_depth}
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Zapiše vse čakajoče vrstice in ustavi nit."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    # --- internals -------------------------------------------------------
+    def _run(self) -> None:
+        self._replay_spill()
+        stop = False
+        while not stop:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+        # izprazni, kar je ostalo (po _STOP ne pride nič novega)
+        leftover = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                leftover.append(item)
+        for start in range(0, len(leftover), self.batch_rows):
+            self._flush(leftover[start : start + self.batch_rows])
+
+    def _flush(self, batch: list[ConversationRow]) -> None:
+        started = time.perf_counter()
+        try:
+            self.insert_rows(batch)
+        except Exception as exc:
+            self.stats["errors"] += 1
+            print(f"[CONV LOG] Zapis {len(batch)} vrstic ni uspel ({exc}); shranjujem na disk.")
+            self._spill(batch)
+            return
+        elapsed = (time.perf_counter() - started) * 1000
+        self.stats["flushed"] += len(batch)
+        self.stats["flushes"] += 1
+        self.stats["last_flush_ms"] = round(elapsed, 2)
+        self.stats["max_flush_ms"] = max(self.stats["max_flush_ms"], round(elapsed, 2))
+        if os.path.exists(self.spill_path):
+            self._replay_spill()
+
+    def _spill(self, rows: list[ConversationRow]) -> None:
+        with self._spill_lock:
+            try:
+                os.makedirs(os.path.dirname(self.spill_path) or ".", exist_ok=True)
+                with open(self.spill_path, "a", encoding="utf-8") as handle:
+                    for row in rows:
+                        handle.write(json.dumps(list(row), ensure_ascii=False) + "\n")
+                self.stats["spilled"] += len(rows)
+            except OSError as exc:
+                print(f"[CONV LOG] Zapis na disk ni uspel, izgubljenih {len(rows)} vrstic: {exc}")
+
+    def _replay_spill(self) -> None:
+        """Uvozi vrstice iz JSONL datoteke po paketih.
+
+        Po vsakem uspešnem paketu datoteka obdrži le še neuvožene vrstice, zato
+        napaka (ali zaustavitev) sredi uvoza ne podvoji že zapisanih pogovorov.
+        Zaklep drži le branje in prepis datoteke, ne zapisov v bazo: _spill()
+        iz niti zahtevkov ne čaka na počasno bazo, njegove vrstice pa se ob
+        prepisu ohranijo.
+        """
+        with self._spill_lock:
+            if not os.path.exists(self.spill_path):
+                return
+            with open(self.spill_path, encoding="utf-8") as handle:
+                lines = [line for line in handle if line.strip()]
+            # vse, kar je za tem odmikom, je _spill() dodal med uvozom
+            offset = sum(len(line.encode("utf-8")) for line in lines)
+        rows = [tuple(json.loads(line)) for line in lines]
+        for start in range(0, len(rows), self.batch_rows):
+            if not self._replay_batch(rows[start : start + self.batch_rows], lines[start : start + self.batch_rows]):
+                return
+            with self._spill_lock:
+                offset = self._rewrite_spill(lines[start + self.batch_rows :], offset)
+        if not rows:
+            with self._spill_lock:
+                self._rewrite_spill([], offset)
+
+    def _replay_batch(self, batch: list[ConversationRow], lines: list[str]) -> bool:
+        """Uvozi paket; False pomeni, da ostane v datoteki za naslednji poskus."""
+        key = "".join(lines)
+        try:
+            self.insert_rows(batch)
+        except Exception as exc:
+            attempts = self._replay_failures.get(key, 0) + 1
+            if attempts < CONV_LOG_REPLAY_ATTEMPTS:
+                self._replay_failures[key] = attempts
+                print(f"[CONV LOG] Ponovni uvoz iz {self.spill_path} ni uspel: {exc}")
+                return False
+            self._replay_failures.pop(key, None)
+            self._quarantine_rows(batch, lines)
+            return True
+        self._replay_failures.pop(key, None)
+        self.stats["replayed"] += len(batch)
+        return True
+
+    def _quarantine_rows(self, batch: list[ConversationRow], lines: list[str]) -> None:
+        """Paket vztrajno pada: vrstice posamično, neuspešne v karanteno."""
+        rejected = []
+        for row, line in zip(batch, lines):
+            try:
+                self.insert_rows([row])
+            except Exception:
+                rejected.append(line)
+            else:
+                self.stats["replayed"] += 1
+        if not rejected:
+            return
+        with open(f"{self.spill_path}.quarantine", "a", encoding="utf-8") as handle:
+            handle.writelines(rejected)
+        self.stats["quarantined"] += len(rejected)
+        print(f"[CONV LOG] {len(rejected)} vrstic v {self.spill_path}.quarantine (baza jih zavrača).")
+
+    def _rewrite_spill(self, lines: list[str], offset: int) -> int:
+        """Datoteko atomično zamenja s preostalimi vrsticami in vsem, kar je bilo dodano za offset.
+
+        Brez vrstic jo izbriše. Vrne nov odmik konca preostalih vrstic.
+        """
+        with open(self.spill_path, "rb") as handle:
+            handle.seek(offset)
+            appended = handle.read().decode("utf-8")
+        if not lines and not appended:
+            os.remove(self.spill_path)
+            return 0
+        tmp_path = f"{self.spill_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as handle:
+            handle.writelines(lines)
+            handle.write(appended)
+        os.replace(tmp_path, self.spill_path)
+        return sum(len(line.encode("utf-8")) for line in lines)
+
+
+_LOGS: dict[str, ConversationLogQueue] = {}
+_LOGS_LOCK = threading.Lock()
+
+
+def get_conversation_log(
+    key: str, insert_rows: Callable[[list[ConversationRow]], None], spill_path: str
+) -> ConversationLogQueue:
+    """Vrne (in po potrebi zažene) vrsto za dano bazo."""
+    with _LOGS_LOCK:
+        log = _LOGS.get(key)
+        if log is None or log._closed:
+            log = ConversationLogQueue(insert_rows, spill_path)
+            _LOGS[key] = log
+        return log
+
+
+def conversation_log_metrics() -> dict[str, dict]:
+    with _LOGS_LOCK:
+        return {key: log.metrics() for key, log in _LOGS.items()}
+
+
+def close_conversation_log(key: str, timeout: float = 10.0) -> None:
+    """Izprazni in ustavi vrsto za dano bazo (ob zaprtju hrambe)."""
+    with _LOGS_LOCK:
+        log = _LOGS.pop(key, None)
+    if log is not None:
+        log.close(timeout)
+
+
+def shutdown_conversation_logs(timeout: Optional[float] = 10.0) -> None:
+    """Izprazni vse vrste (ob zaustavitvi aplikacije)."""
+    with _LOGS_LOCK:
+        logs = list(_LOGS.values())
+        _LOGS.clear()
+    for log in logs:
+        log.close(timeout or 10.0)
+
+
+atexit.register(shutdown_conversation_logs)
@@ -259,10 +259,10 @@ def generate_and_send_daily_report() -> bool:
     Returns:
         True če uspešno poslano
     """
-    from app.services.reservation_service import ReservationService
+    from app.services.reservation_service import get_reservation_service
 
     try:
-        service = ReservationService()
+        service = get_reservation_service()
         now = datetime.now()
         since = get_last_report_time()
 
@@ -341,20 +341,16 @@ def get_upcoming_weekend_reservations(service) -> Dict[str, List[Dict[str, Any]]
     ph = service._placeholder()
 
     query = f"""
-        SELECT id, date, time, people, name, email, phone, location, note, status
+        SELECT id, date, start_date, time, people, name, email, phone, location, note, status
         FROM reservations
         WHERE reservation_type = 'table'
         AND status = 'confirmed'
-        AND date IN ({ph}, {ph}, {ph})
-        ORDER BY date ASC, time ASC
+        AND start_date BETWEEN {ph} AND {ph}
+        ORDER BY start_date ASC, time ASC
     """
 
-    # Database stores dates in DD.MM.YYYY format
-    cursor.execute(query, (
-        friday.strftime("%d.%m.%Y"),
-        saturday.strftime("%d.%m.%Y"),
-        sunday.strftime("%d.%m.%Y"),
-    ))
+    # start_date je ISO (YYYY-MM-DD), zato zajame tudi datume kot "5.6.2026"
+    cursor.execute(query, (friday.strftime("%Y-%m-%d"), sunday.strftime("%Y-%m-%d")))
 
     rows = cursor.fetchall()
     cursor.close()
@@ -383,12 +379,7 @@ def get_upcoming_weekend_reservations(service) -> Dict[str, List[Dict[str, Any]]
             "note": row["note"],
             "status": row["status"],
         }
-        # Convert date from DD.MM.YYYY to YYYY-MM-DD for dictionary key
-        try:
-            db_date = datetime.strptime(row["date"], "%d.%m.%Y")
-            date_key = db_date.strftime("%Y-%m-%d")
-        except Exception:
-            date_key = row["date"]
+        date_key = row["start_date"]
 
         if date_key in by_date:
             by_date[date_key].append(reservation)
@@ -521,10 +512,10 @@ def generate_and_send_weekly_reminder() -> bool:
     Returns:
         True če uspešno poslano
     """
-    from app.services.reservation_service import ReservationService
+    from app.services.reservation_service import get_reservation_service
 
     try:
-        service = ReservationService()
+        service = get_reservation_service()
 
         print("[WEEKLY REMINDER] Generiram tedenski reminder...")
 
@@ -0,0 +1,97 @@
+"""
+Pretočni izvozi (CSV / NDJSON, opcijsko gzip) za admin.
+
+Vrstice pridejo iz ReservationService.iter_query (strežniški kurzor na
+Postgresu, fetchmany na SQLite), tu se le oblikujejo v kose bajtov za
+StreamingResponse. Pomnilnik je omejen z velikostjo kosa, ne s številom vrstic.
+"""
+
+import csv
+import io
+import json
+import zlib
+from typing import Any, Iterable, Iterator
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+}
+
+# podatkovni niz -> (tabela, stolpci v izvozu)
+EXPORT_DATASETS: dict[str, tuple[str, tuple[str, ...]]] = {
+    "reservations": (
+        "reservations",
+        (
+            "id", "date", "time", "nights", "rooms", "people", "kids", "kids_small", "reservation_type",
+            "name", "email", "phone", "location", "note", "status", "source", "created_at",
+        ),
+    ),
+    "conversations": (
+        "conversations",
+        ("id", "session_id", "user_message", "bot_response", "intent", "needs_followup", "followup_email", "created_at"),
+    ),
+    "conversations_archive": (
+        "conversations_archive",
+        ("id", "session_id", "user_message", "bot_response", "intent", "needs_followup", "followup_email", "created_at"),
+    ),
+    "reservation_messages": (
+        "reservation_messages",
+        ("id", "reservation_id", "direction", "subject", "body", "from_email", "to_email", "message_id", "created_at"),
+    ),
+}
+
+_FLUSH_BYTES = 64 * 1024
+
+
+def csv_chunks(rows: Iterable[dict], columns: Iterable[str]) -> Iterator[bytes]:
+    columns = list(columns)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow(["" if row.get(col) is None else row.get(col) for col in columns])
+        if buffer.tell() >= _FLUSH_BYTES:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def ndjson_chunks(rows: Iterable[dict], columns: Iterable[str]) -> Iterator[bytes]:
+    columns = list(columns)
+    lines: list[str] = []
+    size = 0
+    for row in rows:
+        line = json.dumps({col: row.get(col) for col in columns}, ensure_ascii=False, default=str)
+        lines.append(line)
+        size += len(line) + 1
+        if size >= _FLUSH_BYTES:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines, size = [], 0
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Stisne tok kosov v en gzip člen (brez branja vsega v pomnilnik)."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_chunks(rows: Iterable[dict], columns: Iterable[str], fmt: str, compress: bool) -> Iterator[bytes]:
+    chunks = csv_chunks(rows, columns) if fmt == "csv" else ndjson_chunks(rows, columns)
+    return gzip_chunks(chunks) if compress else chunks
+
+
+def export_headers(name: str, fmt: str, compress: bool) -> tuple[str, dict[str, Any]]:
+    """(media_type, glave) za prenos datoteke."""
+    media_type, extension = EXPORT_FORMATS[fmt]
+    filename = f"{name}.{extension}" + (".gz" if compress else "")
+    if compress:
+        media_type = "application/gzip"
+    return media_type, {"Content-Disposition": f"attachment; filename={filename}"}
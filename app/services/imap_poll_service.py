@@ -12,7 +12,7 @@ from typing import Optional, Tuple
 
 import imaplib
 
-from app.services.reservation_service import ReservationService
+from app.services.reservation_service import ReservationService, get_reservation_service
 
 IMAP_HOST = os.getenv("IMAP_HOST", "").strip()
 IMAP_PORT = int(os.getenv("IMAP_PORT", "993"))
@@ -202,7 +202,7 @@ def _poll_loop() -> None:
         print("[IMAP] Manjkajo IMAP nastavitve. Polling ne bo zagnan.")
         return
 
-    service = ReservationService()
+    service = get_reservation_service()
     last_uid = _load_last_uid()
     last_error: Optional[str] = None
 
@@ -253,7 +253,7 @@ def resync_last_messages(limit: int = 50) -> dict:
     if not (IMAP_HOST and IMAP_USER and IMAP_PASSWORD):
         return {"ok": False, "error": "IMAP nastavitve manjkajo."}
     limit = max(1, min(limit, 200))
-    service = ReservationService()
+    service = get_reservation_service()
     processed = 0
     matched = 0
     scanned = 0
@@ -0,0 +1,424 @@
+"""
+Verzionirane migracije sheme za SQLite in Postgres.
+
+Uporabljene verzije se beležijo v tabeli schema_version. Ob zagonu procesa
+se preveri le najvišja verzija (ena poizvedba); manjkajoče migracije se
+izvedejo vsaka v svoji transakciji. Sočasne zagone (več workerjev) uskladi
+pg_advisory_lock oz. BEGIN IMMEDIATE pri SQLite. Vsi koraki so idempotentni,
+zato jih lahko varno izvedemo tudi na bazah, ustvarjenih pred to shemo.
+
+Ročni zagon (npr. ob deployu):
+    python -m app.services.migrations
+"""
+
+import re
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Union
+
+from app.services.analytics_rollup import catch_up as mark_rolled_up
+from app.services.occupancy_ledger import create_ledger
+from app.services.search_index import create_search_index, rebuild_search_index
+
+Step = Union[str, Callable[[Any, str], None]]
+
+# poljubna konstanta za pg_advisory_lock (ključ migracij te aplikacije)
+_PG_LOCK_KEY = 724_301_2026
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    steps: tuple[Step, ...] = field(default_factory=tuple)
+
+
+def _pk(dialect: str) -> str:
+    return "SERIAL PRIMARY KEY" if dialect == "postgres" else "INTEGER PRIMARY KEY AUTOINCREMENT"
+
+
+def _create_tables(cur: Any, dialect: str) -> None:
+    pk = _pk(dialect)
+    cur.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS reservations (
+            id {pk},
+            date TEXT NOT NULL,
+            nights INTEGER,
+            rooms INTEGER,
+            people INTEGER NOT NULL,
+            reservation_type TEXT NOT NULL,
+            time TEXT,
+            location TEXT,
+            name TEXT,
+            phone TEXT,
+            email TEXT,
+            note TEXT,
+            status TEXT DEFAULT 'pending',
+            created_at TEXT NOT NULL,
+            source TEXT NOT NULL,
+            admin_notes TEXT,
+            confirmed_at TEXT,
+            confirmed_by TEXT,
+            guest_message TEXT,
+            country TEXT,
+            kids TEXT,
+            kids_small TEXT,
+            confirm_via TEXT,
+            event_type TEXT,
+            special_needs TEXT,
+            gdpr_consent TEXT
+        )
+        """
+    )
+    cur.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS conversations (
+            id {pk},
+            session_id TEXT,
+            user_message TEXT NOT NULL,
+            bot_response TEXT NOT NULL,
+            intent TEXT,
+            needs_followup BOOLEAN DEFAULT FALSE,
+            followup_email TEXT,
+            created_at TEXT NOT NULL
+        )
+        """
+    )
+    cur.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS inquiries (
+            id {pk},
+            session_id TEXT,
+            details TEXT NOT NULL,
+            deadline TEXT,
+            contact_name TEXT,
+            contact_email TEXT,
+            contact_phone TEXT,
+            contact_raw TEXT,
+            status TEXT DEFAULT 'new',
+            created_at TEXT NOT NULL,
+            source TEXT NOT NULL
+        )
+        """
+    )
+    cur.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS reservation_messages (
+            id {pk},
+            reservation_id INTEGER NOT NULL,
+            direction TEXT NOT NULL,
+            subject TEXT,
+            body TEXT,
+            from_email TEXT,
+            to_email TEXT,
+            message_id TEXT,
+            created_at TEXT NOT NULL
+        )
+        """
+    )
+    cur.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS knowledge_feedback (
+            id {pk},
+            question TEXT NOT NULL,
+            suggestion TEXT NOT NULL,
+            status TEXT DEFAULT 'new',
+            created_at TEXT NOT NULL
+        )
+        """
+    )
+    cur.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS report_log (
+            id {pk},
+            report_type TEXT NOT NULL,
+            sent_at TEXT NOT NULL
+        )
+        """
+    )
+
+
+def add_columns(table: str, columns: list[tuple[str, str]]) -> Callable[[Any, str], None]:
+    """Korak, ki doda manjkajoče stolpce (za baze iz starejših verzij)."""
+
+    def _step(cur: Any, dialect: str) -> None:
+        if dialect == "postgres":
+            for col, definition in columns:
+                cur.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {col} {definition}")
+            return
+        cur.execute(f"PRAGMA table_info({table})")
+        existing = {row[1] for row in cur.fetchall()}
+        for col, definition in columns:
+            if col not in existing:
+                cur.execute(f"ALTER TABLE {table} ADD COLUMN {col} {definition}")
+
+    return _step
+
+
+def _backfill_stay_dates(cur: Any, dialect: str) -> None:
+    """Dopolni start_date/end_date (ISO, end_date vključno) iz date + nights."""
+    ph = "%s" if dialect == "postgres" else "?"
+    cur.execute("SELECT id, date, nights FROM reservations WHERE start_date IS NULL")
+    updates = []
+    for row in cur.fetchall():
+        row_id, date_str, nights = (row["id"], row["date"], row["nights"]) if dialect == "postgres" else tuple(row)
+        try:
+            start = datetime.strptime((date_str or "").strip(), "%d.%m.%Y")
+        except ValueError:
+            continue
+        try:
+            nights_int = int(nights or 1)
+        except (TypeError, ValueError):
+            match = re.search(r"\d+", str(nights))
+            nights_int = int(match.group(0)) if match else 1
+        end = start + timedelta(days=max(1, nights_int) - 1)
+        updates.append((start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d"), row_id))
+    if updates:
+        cur.executemany(f"UPDATE reservations SET start_date = {ph}, end_date = {ph} WHERE id = {ph}", updates)
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(1, "initial_schema", (_create_tables,)),
+    Migration(
+        2,
+        "reservation_legacy_columns",
+        (
+            add_columns(
+                "reservations",
+                [
+                    ("rooms", "INTEGER"),
+                    ("status", "TEXT DEFAULT 'pending'"),
+                    ("admin_notes", "TEXT"),
+                    ("confirmed_at", "TEXT"),
+                    ("confirmed_by", "TEXT"),
+                    ("guest_message", "TEXT"),
+                    ("country", "TEXT"),
+                    ("kids", "TEXT"),
+                    ("kids_small", "TEXT"),
+                    ("confirm_via", "TEXT"),
+                    ("event_type", "TEXT"),
+                    ("special_needs", "TEXT"),
+                    ("gdpr_consent", "TEXT"),
+                ],
+            ),
+        ),
+    ),
+    Migration(
+        3,
+        "reservation_stay_dates",
+        (
+            add_columns("reservations", [("start_date", "TEXT"), ("end_date", "TEXT")]),
+            "CREATE INDEX IF NOT EXISTS idx_reservations_type_status_start "
+            "ON reservations (reservation_type, status, start_date)",
+            _backfill_stay_dates,
+        ),
+    ),
+    Migration(
+        4,
+        "hot_path_indexes",
+        (
+            "CREATE INDEX IF NOT EXISTS idx_conversations_created ON conversations (created_at)",
+            "CREATE INDEX IF NOT EXISTS idx_conversations_session_created ON conversations (session_id, created_at)",
+            "CREATE INDEX IF NOT EXISTS idx_reservation_messages_message_id ON reservation_messages (message_id)",
+            "CREATE INDEX IF NOT EXISTS idx_reservation_messages_res_created "
+            "ON reservation_messages (reservation_id, created_at)",
+            "CREATE INDEX IF NOT EXISTS idx_reservations_status_created ON reservations (status, created_at)",
+            "CREATE INDEX IF NOT EXISTS idx_inquiries_status ON inquiries (status)",
+            "CREATE INDEX IF NOT EXISTS idx_report_log_type_sent ON report_log (report_type, sent_at)",
+        ),
+    ),
+    Migration(
+        5,
+        "analytics_rollups",
+        (
+            "CREATE TABLE IF NOT EXISTS conv_daily_questions ("
+            "day TEXT NOT NULL, user_message TEXT NOT NULL, total INTEGER NOT NULL DEFAULT 0, "
+            "followups INTEGER NOT NULL DEFAULT 0, booking INTEGER NOT NULL DEFAULT 0, "
+            "PRIMARY KEY (day, user_message))",
+            "CREATE TABLE IF NOT EXISTS conv_daily_intents ("
+            "day TEXT NOT NULL, intent TEXT NOT NULL, count INTEGER NOT NULL DEFAULT 0, "
+            "PRIMARY KEY (day, intent))",
+            "CREATE TABLE IF NOT EXISTS conv_session_days ("
+            "day TEXT NOT NULL, session_id TEXT NOT NULL, started INTEGER NOT NULL DEFAULT 0, "
+            "completed INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (day, session_id))",
+            "CREATE TABLE IF NOT EXISTS analytics_watermark ("
+            "name TEXT PRIMARY KEY, last_id INTEGER NOT NULL DEFAULT 0, updated_at TEXT)",
+            # vrstica je zaklep za apply_pending (sočasni workerji povzamejo paket enkrat);
+            # last_id bere le še migracija 10 (catch_up), povzetki gredo po oznaki rolled_up
+            "INSERT INTO analytics_watermark (name, last_id) VALUES ('conversations', 0) ON CONFLICT (name) DO NOTHING",
+        ),
+    ),
+    Migration(
+        6,
+        "keyset_pagination_indexes",
+        (
+            # (created_at, id) za keyset strani admin seznamov (app/services/pagination.py)
+            "CREATE INDEX IF NOT EXISTS idx_reservations_created_id ON reservations (created_at, id)",
+            "CREATE INDEX IF NOT EXISTS idx_conversations_created_id ON conversations (created_at, id)",
+            "CREATE INDEX IF NOT EXISTS idx_inquiries_created_id ON inquiries (created_at, id)",
+        ),
+    ),
+    Migration(
+        7,
+        "conversations_archive",
+        (
+            # hladni del pogovorov (ReservationService.archive_conversations); id ostane izvirni
+            "CREATE TABLE IF NOT EXISTS conversations_archive ("
+            "id INTEGER PRIMARY KEY, session_id TEXT, user_message TEXT NOT NULL, bot_response TEXT NOT NULL, "
+            "intent TEXT, needs_followup BOOLEAN DEFAULT FALSE, followup_email TEXT, created_at TEXT NOT NULL)",
+            "CREATE INDEX IF NOT EXISTS idx_conversations_archive_session_created "
+            "ON conversations_archive (session_id, created_at)",
+            "CREATE INDEX IF NOT EXISTS idx_conversations_archive_created ON conversations_archive (created_at)",
+        ),
+    ),
+    Migration(8, "full_text_search", (create_search_index,)),
+    # knjigo iz obstoječih rezervacij napolni ReservationService.rebuild_claims
+    Migration(9, "occupancy_ledger", (create_ledger,)),
+    Migration(
+        10,
+        "conversation_rollup_flag",
+        (
+            # povzetki po oznaki namesto po vodni črti id (app/services/analytics_rollup.py)
+            add_columns("conversations", [("rolled_up", "BOOLEAN NOT NULL DEFAULT FALSE")]),
+            mark_rolled_up,
+            "CREATE INDEX IF NOT EXISTS idx_conversations_pending_rollup ON conversations (id) WHERE rolled_up = FALSE",
+        ),
+    ),
+    Migration(11, "search_index_fold_dj", (rebuild_search_index,)),
+    Migration(
+        12,
+        "chat_sessions",
+        (
+            # skupna hramba sej klepeta (app/services/session/backend.py)
+            "CREATE TABLE IF NOT EXISTS chat_sessions ("
+            "namespace TEXT NOT NULL, session_id TEXT NOT NULL, version INTEGER NOT NULL, "
+            "data TEXT NOT NULL, updated_at DOUBLE PRECISION NOT NULL, "
+            "PRIMARY KEY (namespace, session_id))",
+            "CREATE INDEX IF NOT EXISTS idx_chat_sessions_updated ON chat_sessions (updated_at)",
+        ),
+    ),
+]
+
+LATEST_VERSION = max(m.version for m in MIGRATIONS)
+
+_SCHEMA_VERSION_SQL = (
+    "CREATE TABLE IF NOT EXISTS schema_version ("
+    "version INTEGER PRIMARY KEY, name TEXT NOT NULL, applied_at TEXT NOT NULL)"
+)
+
+_MIGRATED: set[str] = set()
+_MIGRATED_LOCK = threading.Lock()
+
+
+def _current_version(cur: Any, dialect: str) -> int:
+    cur.execute("SELECT MAX(version) AS v FROM schema_version")
+    row = cur.fetchone()
+    value = row["v"] if dialect == "postgres" else row[0]
+    return int(value or 0)
+
+
+def _apply(cur: Any, dialect: str, migration: Migration) -> None:
+    for step in migration.steps:
+        if callable(step):
+            step(cur, dialect)
+        else:
+            cur.execute(step)
+    ph = "%s" if dialect == "postgres" else "?"
+    cur.execute(
+        f"INSERT INTO schema_version (version, name, applied_at) VALUES ({ph}, {ph}, {ph})",
+        (migration.version, migration.name, datetime.now().isoformat()),
+    )
+
+
+def _migrate_postgres(conn: Any) -> list[int]:
+    applied: list[int] = []
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT pg_advisory_lock(%s)", (_PG_LOCK_KEY,))
+        try:
+            cur.execute(_SCHEMA_VERSION_SQL)
+            conn.commit()
+            current = _current_version(cur, "postgres")
+            for migration in MIGRATIONS:
+                if migration.version <= current:
+                    continue
+                try:
+                    _apply(cur, "postgres", migration)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                applied.append(migration.version)
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (_PG_LOCK_KEY,))
+            conn.commit()
+    finally:
+        cur.close()
+    return applied
+
+
+def _migrate_sqlite(conn: Any) -> list[int]:
+    applied: list[int] = []
+    conn.isolation_level = None  # transakcije vodimo ročno
+    cur = conn.cursor()
+    try:
+        cur.execute(_SCHEMA_VERSION_SQL)
+        for migration in MIGRATIONS:
+            # BEGIN IMMEDIATE zaklene bazo za pisanje; drug proces počaka in nato vidi novo verzijo
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                if migration.version <= _current_version(cur, "sqlite"):
+                    cur.execute("COMMIT")
+                    continue
+                _apply(cur, "sqlite", migration)
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+            applied.append(migration.version)
+    finally:
+        cur.close()
+    return applied
+
+
+def run_migrations(conn_factory: Callable[[], Any], postgres: bool, key: str) -> list[int]:
+    """Izvede manjkajoče migracije in vrne uporabljene verzije.
+
+    Pri Postgresu se baza preveri enkrat na proces (key = DATABASE_URL). Pri
+    SQLite je preverjanje ena poizvedba na lokalni datoteki, zato ga izvedemo
+    vedno (datoteko lahko kdo tudi izbriše).
+    """
+    with _MIGRATED_LOCK:
+        if postgres and key in _MIGRATED:
+            return []
+        conn = conn_factory()
+        try:
+            if postgres:
+                applied = _migrate_postgres(conn)
+            else:
+                cur = conn.cursor()
+                try:
+                    cur.execute(_SCHEMA_VERSION_SQL)
+                    up_to_date = _current_version(cur, "sqlite") >= LATEST_VERSION
+                finally:
+                    cur.close()
+                applied = [] if up_to_date else _migrate_sqlite(conn)
+        finally:
+            conn.close()
+        if postgres:
+            _MIGRATED.add(key)
+        return applied
+
+
+if __name__ == "__main__":
+    from app.services.reservation_service import ReservationService
+
+    service = ReservationService()
+    conn = service._conn()
+    try:
+        cur = conn.cursor()
+        print(f"schema_version: {_current_version(cur, 'postgres' if service.use_postgres else 'sqlite')}")
+    finally:
+        conn.close()
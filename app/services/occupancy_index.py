@@ -0,0 +1,235 @@
+"""
+Indeks zasedenosti sob in miz v pomnilniku.
+
+Indeks se naloži enkrat (ena poizvedba brez pydantic modelov) in se nato
+posodablja ob vsakem pisanju rezervacije. Vsebuje:
+- število zasedenih sob po nočeh (za preverjanje kapacitete),
+- bitno masko noči za vsako sobo (dodelitev konkretnih sob),
+- število zasedenih sedežev po (datum, ura, jedilnica).
+
+Indeks je skupen vsem instancam ReservationService nad isto bazo. Zaradi
+pisanj iz drugih procesov se po OCCUPANCY_INDEX_TTL sekundah ponovno naloži.
+"""
+
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import date
+from typing import Callable, Iterable, Optional
+
+OCCUPANCY_INDEX_TTL = float(os.getenv("OCCUPANCY_INDEX_TTL", "300"))
+
+# bit 0 v maskah sob = 1.1.2000
+_EPOCH = date(2000, 1, 1).toordinal()
+
+
+@dataclass(frozen=True)
+class OccupancyEntry:
+    """Prispevek ene rezervacije k zasedenosti."""
+
+    id: int
+    kind: str  # "room" | "table"
+    start: int = 0  # ordinal prve noči (sobe)
+    nights: int = 0
+    rooms: int = 0
+    assigned: tuple[str, ...] = ()
+    table_key: Optional[tuple[str, str, str]] = None  # (datum, ura, jedilnica)
+    people: int = 0
+
+
+def night_mask(start: int, nights: int) -> int:
+    """Bitna maska za noči [start, start + nights)."""
+    offset = start - _EPOCH
+    if offset < 0 or nights <= 0:
+        return 0
+    return ((1 << nights) - 1) << offset
+
+
+def format_day(ordinal: int) -> str:
+    return date.fromordinal(ordinal).strftime("%d.%m.%Y")
+
+
+class OccupancyIndex:
+    def __init__(self, room_ids: list[str], max_nights: int, ttl: float = OCCUPANCY_INDEX_TTL) -> None:
+        self.room_ids = list(room_ids)
+        self.max_nights = max_nights
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._entries: dict[int, OccupancyEntry] = {}
+        self._rooms_used: dict[int, int] = {}
+        self._table_seats: dict[tuple[str, str, str], int] = {}
+        self._room_bits: dict[str, int] = {}
+        self._calendar_dirty = True
+        self._loaded_at: Optional[float] = None
+        # žeton loči verzije med procesi/ponovnimi zagoni (ETag)
+        self.token = uuid.uuid4().hex[:12]
+        self.version = 0
+        self.last_modified = time.time()
+
+    # --- nalaganje -------------------------------------------------------
+    def ensure_loaded(self, loader: Callable[[], Iterable[OccupancyEntry]]) -> None:
+        with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl:
+                return
+            self.reload(loader())
+
+    def reload(self, entries: Iterable[OccupancyEntry]) -> None:
+        with self._lock:
+            self._entries = {}
+            self._rooms_used = {}
+            self._table_seats = {}
+            for entry in entries:
+                self._entries[entry.id] = entry
+                self._apply(entry, +1)
+            self._calendar_dirty = True
+            self._loaded_at = time.monotonic()
+            self._touch()
+
+    def invalidate(self) -> None:
+        """Naslednje branje ponovno naloži indeks iz baze."""
+        with self._lock:
+            self._loaded_at = None
+            self._touch()
+
+    # --- posodobitve -----------------------------------------------------
+    def upsert(self, reservation_id: int, entry: Optional[OccupancyEntry]) -> None:
+        """Zamenja prispevek rezervacije (entry=None pomeni, da ne zaseda ničesar)."""
+        with self._lock:
+            if self._loaded_at is None:
+                self._touch()
+                return  # ni naložen; naslednje branje ga naloži v celoti
+            old = self._entries.pop(reservation_id, None)
+            if old is not None:
+                self._apply(old, -1)
+                if old.kind == "room":
+                    self._calendar_dirty = True
+            if entry is not None:
+                newest = not self._entries or entry.id > max(self._entries)
+                self._entries[entry.id] = entry
+                self._apply(entry, +1)
+                if entry.kind == "room" and not self._calendar_dirty:
+                    if newest and old is None:
+                        self._assign_rooms(entry)
+                    else:
+                        self._calendar_dirty = True
+            self._touch()
+
+    def _touch(self) -> None:
+        self.version += 1
+        self.last_modified = time.time()
+
+    def _apply(self, entry: OccupancyEntry, sign: int) -> None:
+        if entry.kind == "room":
+            for day in range(entry.start, entry.start + entry.nights):
+                used = self._rooms_used.get(day, 0) + sign * entry.rooms
+                if used:
+                    self._rooms_used[day] = used
+                else:
+                    self._rooms_used.pop(day, None)
+        elif entry.kind == "table" and entry.table_key:
+            seats = self._table_seats.get(entry.table_key, 0) + sign * entry.people
+            if seats:
+                self._table_seats[entry.table_key] = seats
+            else:
+                self._table_seats.pop(entry.table_key, None)
+
+    # --- dodelitev sob ---------------------------------------------------
+    def _assign_rooms(self, entry: OccupancyEntry) -> None:
+        if entry.nights > self.max_nights:
+            return
+        mask = night_mask(entry.start, entry.nights)
+        if not mask:
+            return
+        filled = 0
+        # najprej želene sobe, nato prve proste
+        for room_id in list(entry.assigned or self.room_ids) + self.room_ids:
+            if filled >= entry.rooms:
+                break
+            if not self._room_bits[room_id] & mask:
+                self._room_bits[room_id] |= mask
+                filled += 1
+
+    def _ensure_calendar(self) -> None:
+        if not self._calendar_dirty:
+            return
+        self._room_bits = {room_id: 0 for room_id in self.room_ids}
+        for reservation_id in sorted(self._entries):
+            entry = self._entries[reservation_id]
+            if entry.kind == "room":
+                self._assign_rooms(entry)
+        self._calendar_dirty = False
+
+    # --- poizvedbe -------------------------------------------------------
+    def rooms_used(self, day: int) -> int:
+        with self._lock:
+            return self._rooms_used.get(day, 0)
+
+    def fits_rooms(self, start: int, nights: int, rooms_needed: int, capacity: int) -> bool:
+        """O(nights): ali je v vseh nočeh dovolj prostih sob."""
+        with self._lock:
+            used = self._rooms_used
+            return all(used.get(day, 0) + rooms_needed <= capacity for day in range(start, start + nights))
+
+    def free_rooms(self, start: int, nights: int) -> list[str]:
+        """Sobe, ki so proste vse noči [start, start + nights)."""
+        mask = night_mask(start, nights)
+        with self._lock:
+            self._ensure_calendar()
+            return [room_id for room_id in self.room_ids if not self._room_bits[room_id] & mask]
+
+    def room_bits(self) -> dict[str, int]:
+        with self._lock:
+            self._ensure_calendar()
+            return dict(self._room_bits)
+
+    def room_calendar(self) -> dict[str, set[str]]:
+        """room_id -> set zasedenih datumov (dd.mm.yyyy)."""
+        calendar: dict[str, set[str]] = {}
+        for room_id, bits in self.room_bits().items():
+            days: set[str] = set()
+            offset = 0
+            while bits:
+                if bits & 1:
+                    days.add(format_day(_EPOCH + offset))
+                bits >>= 1
+                offset += 1
+            calendar[room_id] = days
+        return calendar
+
+    def rooms_used_by_day(self) -> dict[int, int]:
+        with self._lock:
+            return dict(self._rooms_used)
+
+    def room_occupancy(self) -> dict[str, int]:
+        """dd.mm.yyyy -> število zasedenih sob (združljivo z _room_occupancy)."""
+        return {format_day(day): used for day, used in self.rooms_used_by_day().items()}
+
+    def table_seats(self, date_str: str, time_str: str, room_name: str) -> int:
+        with self._lock:
+            return self._table_seats.get((date_str, time_str, room_name), 0)
+
+    def table_occupancy(self) -> dict[tuple[str, str, str], int]:
+        with self._lock:
+            return dict(self._table_seats)
+
+
+_INDEXES: dict[str, OccupancyIndex] = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def get_index(key: str, room_ids: list[str], max_nights: int) -> OccupancyIndex:
+    """Vrne skupni indeks za bazo (ključ = pot do SQLite datoteke ali DATABASE_URL)."""
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(key)
+        if index is None:
+            index = OccupancyIndex(room_ids, max_nights)
+            _INDEXES[key] = index
+        return index
+
+
+def drop_index(key: str) -> None:
+    """Zavrže skupni indeks za bazo (ob zaprtju hrambe)."""
+    with _INDEXES_LOCK:
+        _INDEXES.pop(key, None)
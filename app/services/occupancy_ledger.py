@@ -0,0 +1,183 @@
+"""
+Knjiga zasedenosti (occupancy ledger) za atomično rezervacijo terminov.
+
+Preverjanje razpoložljivosti (indeks v pomnilniku) in vpis rezervacije sta
+ločena koraka, zato bi lahko dva gosta hkrati dobila isto zadnjo sobo. Knjiga
+to zapre v bazi:
+
+- room_night_claims: ena vrstica na (soba, noč); primarni ključ prepreči, da
+  bi isto sobo isto noč zasedli dve rezervaciji,
+- table_slot_claims: zasedeni sedeži po (datum, ura, jedilnica); sedeži se
+  prištejejo s pogojnim UPDATE (seats + n <= kapaciteta), ki je atomičen,
+- table_claims: kateri termin je zasedla posamezna rezervacija (za sprostitev).
+
+Zahtevek (claim) se zapiše v isti transakciji kot rezervacija. Če ga ni mogoče
+izpolniti, se sproži ReservationConflict in transakcija se razveljavi.
+"""
+
+import sqlite3
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any, Iterable, Optional
+
+import psycopg2
+
+# kolikokrat ponovimo zahtevek, če je vmes drug proces zasedel isto sobo
+CLAIM_RETRIES = 3
+
+_INTEGRITY_ERRORS = (sqlite3.IntegrityError, psycopg2.IntegrityError)
+
+
+@dataclass
+class ReservationConflict(Exception):
+    """Termin ni (več) prost; alternative pripravi ReservationService."""
+
+    kind: str  # "room" | "table"
+    retry: bool = False  # izgubljena tekma za unikatni ključ (ponovni poskus ima smisel)
+    alternative: Optional[str] = None  # sobe: najbližji prost datum prihoda
+    suggestions: list[str] = field(default_factory=list)  # mize: prosti termini
+
+    def __str__(self) -> str:
+        return f"Termin ({self.kind}) ni več prost."
+
+
+def _ph(dialect: str) -> str:
+    return "%s" if dialect == "postgres" else "?"
+
+
+def create_ledger(cur: Any, dialect: str) -> None:
+    """Korak migracije: tabele knjige zasedenosti."""
+    cur.execute(
+        "CREATE TABLE IF NOT EXISTS room_night_claims ("
+        "room_id TEXT NOT NULL, night TEXT NOT NULL, reservation_id INTEGER NOT NULL, "
+        "PRIMARY KEY (room_id, night))"
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_room_night_claims_reservation ON room_night_claims (reservation_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_room_night_claims_night ON room_night_claims (night)")
+    cur.execute(
+        "CREATE TABLE IF NOT EXISTS table_slot_claims ("
+        "date TEXT NOT NULL, time TEXT NOT NULL, room TEXT NOT NULL, seats INTEGER NOT NULL DEFAULT 0, "
+        "PRIMARY KEY (date, time, room))"
+    )
+    cur.execute(
+        "CREATE TABLE IF NOT EXISTS table_claims ("
+        "reservation_id INTEGER PRIMARY KEY, date TEXT NOT NULL, time TEXT NOT NULL, room TEXT NOT NULL, "
+        "people INTEGER NOT NULL)"
+    )
+
+
+def nights_of(start: int, nights: int) -> list[str]:
+    """Ordinal prve noči + število noči -> ISO datumi noči."""
+    return [date.fromordinal(day).isoformat() for day in range(start, start + nights)]
+
+
+def claim_rooms(
+    cur: Any,
+    dialect: str,
+    reservation_id: int,
+    nights: list[str],
+    rooms_needed: int,
+    room_ids: Iterable[str],
+    preferred: Iterable[str] = (),
+    strict: bool = True,
+) -> list[str]:
+    """Zasede rooms_needed sob za vse noči in vrne uporabljene sobe.
+
+    Vrstni red: želene sobe, nato sobe, proste vse noči, nato ostale (soba se
+    lahko med bivanjem zamenja, kot dovoljuje preverjanje po številu sob).
+    strict=False (admin/uvoz) zasede le, kar je prosto, in ne sproži konflikta.
+    """
+    if not nights or rooms_needed <= 0:
+        return []
+    ph = _ph(dialect)
+    room_ids = list(room_ids)
+    cur.execute(
+        f"SELECT room_id, night FROM room_night_claims WHERE night >= {ph} AND night <= {ph}",
+        (nights[0], nights[-1]),
+    )
+    busy = {(row["room_id"], row["night"]) for row in cur.fetchall()}
+    whole_stay = [room for room in room_ids if all((room, night) not in busy for night in nights)]
+    order = list(dict.fromkeys([*[r for r in preferred if r in room_ids], *whole_stay, *room_ids]))
+
+    rows: list[tuple[str, str, int]] = []
+    used: list[str] = []
+    for night in nights:
+        free = [room for room in order if (room, night) not in busy][:rooms_needed]
+        if len(free) < rooms_needed and strict:
+            raise ReservationConflict("room")
+        rows.extend((room, night, reservation_id) for room in free)
+        used.extend(room for room in free if room not in used)
+    if not rows:
+        return []
+    sql = f"INSERT INTO room_night_claims (room_id, night, reservation_id) VALUES ({ph}, {ph}, {ph})"
+    if not strict:
+        cur.executemany(sql + " ON CONFLICT (room_id, night) DO NOTHING", rows)
+        return used
+    try:
+        cur.executemany(sql, rows)
+    except _INTEGRITY_ERRORS as exc:
+        # drug zahtevek je med branjem in vpisom zasedel isto sobo/noč
+        raise ReservationConflict("room", retry=True) from exc
+    return used
+
+
+def claim_table(
+    cur: Any,
+    dialect: str,
+    reservation_id: int,
+    day: str,
+    time: str,
+    people: int,
+    rooms: Iterable[tuple[str, int]],
+    strict: bool = True,
+) -> str:
+    """Prišteje sedeže v prvi jedilnici z dovolj prostora in vrne njeno ime.
+
+    rooms: (ime, kapaciteta) v vrstnem redu poskušanja. Pogoj seats + n <= cap
+    je v samem UPDATE, zato ga sočasni zahtevki ne morejo preskočiti.
+    strict=False sedeže prišteje prvi jedilnici ne glede na kapaciteto.
+    """
+    ph = _ph(dialect)
+    rooms = list(rooms)
+    for name, capacity in rooms:
+        cur.execute(
+            f"INSERT INTO table_slot_claims (date, time, room, seats) VALUES ({ph}, {ph}, {ph}, 0) "
+            "ON CONFLICT (date, time, room) DO NOTHING",
+            (day, time, name),
+        )
+        sql = f"UPDATE table_slot_claims SET seats = seats + {ph} WHERE date = {ph} AND time = {ph} AND room = {ph}"
+        params: tuple = (people, day, time, name)
+        if strict:
+            sql += f" AND seats + {ph} <= {ph}"
+            params += (people, capacity)
+        cur.execute(sql, params)
+        if cur.rowcount == 1:
+            cur.execute(
+                f"INSERT INTO table_claims (reservation_id, date, time, room, people) VALUES ({ph}, {ph}, {ph}, {ph}, {ph})",
+                (reservation_id, day, time, name, people),
+            )
+            return name
+        if not strict:
+            break
+    raise ReservationConflict("table")
+
+
+def release(cur: Any, dialect: str, reservation_id: int) -> None:
+    """Sprosti vse zahtevke rezervacije (preklic, zavrnitev, sprememba termina)."""
+    ph = _ph(dialect)
+    cur.execute(f"DELETE FROM room_night_claims WHERE reservation_id = {ph}", (reservation_id,))
+    cur.execute(f"SELECT date, time, room, people FROM table_claims WHERE reservation_id = {ph}", (reservation_id,))
+    row = cur.fetchone()
+    if row is None:
+        return
+    cur.execute(
+        f"UPDATE table_slot_claims SET seats = seats - {ph} WHERE date = {ph} AND time = {ph} AND room = {ph}",
+        (row["people"], row["date"], row["time"], row["room"]),
+    )
+    cur.execute(f"DELETE FROM table_claims WHERE reservation_id = {ph}", (reservation_id,))
+
+
+def clear(cur: Any) -> None:
+    cur.execute("DELETE FROM room_night_claims")
+    cur.execute("DELETE FROM table_slot_claims")
+    cur.execute("DELETE FROM table_claims")
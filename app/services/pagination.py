@@ -0,0 +1,81 @@
+"""
+Keyset (cursor) paginacija in izbira polj za admin sezname.
+
+Seznami so urejeni po (created_at DESC, id DESC). Kurzor je zadnji par
+(created_at, id) prejšnje strani, kodiran v URL-varen niz; naslednja stran je
+ena poizvedba z `(created_at, id) < (?, ?)` po indeksu, ne glede na to, kako
+daleč v zgodovino listamo (brez OFFSET).
+"""
+
+import base64
+import json
+from typing import Any, Optional
+
+MAX_PAGE_SIZE = 1000
+
+RESERVATION_FIELDS = frozenset(
+    {
+        "id", "date", "nights", "rooms", "people", "reservation_type", "time", "location", "name",
+        "phone", "email", "note", "status", "created_at", "source", "admin_notes", "confirmed_at",
+        "confirmed_by", "guest_message", "country", "kids", "kids_small", "confirm_via", "event_type",
+        "special_needs", "gdpr_consent", "start_date", "end_date",
+    }
+)
+CONVERSATION_FIELDS = frozenset(
+    {"id", "session_id", "user_message", "bot_response", "intent", "needs_followup", "followup_email", "created_at"}
+)
+INQUIRY_FIELDS = frozenset(
+    {
+        "id", "session_id", "details", "deadline", "contact_name", "contact_email", "contact_phone",
+        "contact_raw", "status", "created_at", "source",
+    }
+)
+
+# polja, ki jih kurzor potrebuje, so vedno zraven
+_KEY_FIELDS = ("id", "created_at")
+
+
+def encode_cursor(created_at: Any, row_id: Any) -> str:
+    raw = json.dumps([str(created_at), int(row_id)], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[str, int]:
+    """Vrne (created_at, id); ob neveljavnem kurzorju sproži ValueError."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return str(created_at), int(row_id)
+    except Exception as exc:
+        raise ValueError("Neveljaven kurzor") from exc
+
+
+def parse_fields(fields: Optional[str], allowed: frozenset) -> Optional[list[str]]:
+    """'a,b,c' -> seznam stolpcev (z id in created_at); None pomeni vse stolpce."""
+    if not fields:
+        return None
+    requested = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = sorted(set(requested) - allowed)
+    if unknown:
+        raise ValueError(f"Neznana polja: {', '.join(unknown)}")
+    return list(dict.fromkeys([*_KEY_FIELDS, *requested]))
+
+
+def page_size(limit: int) -> int:
+    return max(1, min(int(limit), MAX_PAGE_SIZE))
+
+
+def keyset_clause(cursor: Optional[str], placeholder: str) -> tuple[Optional[str], tuple]:
+    """Pogoj in parametri za stran po kurzorju (None, () za prvo stran)."""
+    if not cursor:
+        return None, ()
+    created_at, row_id = decode_cursor(cursor)
+    return f"(created_at, id) < ({placeholder}, {placeholder})", (created_at, row_id)
+
+
+def next_cursor(rows: list[dict], limit: int) -> Optional[str]:
+    """Kurzor za naslednjo stran ali None, če je bila stran zadnja (krajša od limit)."""
+    if len(rows) < limit or not rows:
+        return None
+    last = rows[-1]
+    return encode_cursor(last["created_at"], last["id"])
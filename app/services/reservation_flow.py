@@ -4,6 +4,7 @@ import re
 from datetime import datetime, timedelta
 from typing import Any, Optional, Tuple
 
+from app.services.occupancy_ledger import ReservationConflict
 from app.services.parsing import (
     extract_date,
     extract_date_from_text,
@@ -173,6 +174,25 @@ def advance_after_room_people(reservation_state: dict[str, Optional[str | int]],
     return "Odlično. Kako se glasi ime in priimek nosilca rezervacije?"
 
 
+def claim_conflict_reply(reservation_state: dict[str, Optional[str | int]], conflict: ReservationConflict) -> str:
+    """Termin je bil zaseden med povzetkom in potrditvijo: ponudi alternativo."""
+    if conflict.kind == "room":
+        reservation_state["step"] = "awaiting_room_date"
+        suggestion = (
+            f"Najbližji prost termin je {conflict.alternative}. Sporočite, ali vam ustreza, ali podajte drug datum."
+            if conflict.alternative
+            else "Prosim izberite drug datum ali manjšo skupino."
+        )
+        return f"Žal je bil izbrani termin ravnokar zaseden. {suggestion}"
+    reservation_state["step"] = "awaiting_table_time"
+    alt = (
+        "Predlagani prosti termini: " + "; ".join(conflict.suggestions)
+        if conflict.suggestions
+        else "Prosim izberite drugo uro ali enega od naslednjih vikendov."
+    )
+    return f"Žal je bil izbrani termin ravnokar zaseden. {alt}"
+
+
 def proceed_after_table_people(reservation_state: dict[str, Optional[str | int]], reservation_service: Any) -> str:
     people = int(reservation_state.get("people") or 0)
     available, location, suggestions = reservation_service.check_table_availability(
@@ -493,22 +513,26 @@ Ali soglašate? (da/ne)"""
             if reservation_state.get("dinner_people"):
                 dinner_note = f"Večerje: {reservation_state.get('dinner_people')} oseb (25€/oseba)"
             chosen_location = reservation_state.get("location") or "Sobe (dodelimo ob potrditvi)"
-            res_id = reservation_service.create_reservation(
-                date=reservation_state["date"] or "",
-                people=int(reservation_state["people"] or 0),
-                reservation_type="room",
-                source="chat",
-                nights=int(reservation_state["nights"] or 0),
-                rooms=int(reservation_state["rooms"] or 0),
-                name=str(reservation_state["name"]),
-                phone=str(reservation_state["phone"]),
-                email=reservation_state["email"],
-                location=chosen_location,
-                note=(reservation_state.get("note") or "") or dinner_note,
-                kids=str(reservation_state.get("kids") or ""),
-                kids_small=str(reservation_state.get("kids_ages") or ""),
-                gdpr_consent=reservation_state.get("gdpr_consent"),
-            )
+            try:
+                res_id = reservation_service.create_reservation(
+                    date=reservation_state["date"] or "",
+                    people=int(reservation_state["people"] or 0),
+                    reservation_type="room",
+                    source="chat",
+                    nights=int(reservation_state["nights"] or 0),
+                    rooms=int(reservation_state["rooms"] or 0),
+                    name=str(reservation_state["name"]),
+                    phone=str(reservation_state["phone"]),
+                    email=reservation_state["email"],
+                    location=chosen_location,
+                    note=(reservation_state.get("note") or "") or dinner_note,
+                    kids=str(reservation_state.get("kids") or ""),
+                    kids_small=str(reservation_state.get("kids_ages") or ""),
+                    gdpr_consent=reservation_state.get("gdpr_consent"),
+                    claim=True,
+                )
+            except ReservationConflict as conflict:
+                return claim_conflict_reply(reservation_state, conflict)
             email_data = {
                 "id": res_id,
                 "name": reservation_state.get("name", ""),
@@ -532,6 +556,7 @@ Ali soglašate? (da/ne)"""
                     bot_response="(auto) reservation completed",
                     intent="reservation_completed",
                     needs_followup=False,
+                    defer=True,
                 )
             send_reservation_emails_async(email_data)
             reset_reservation_state(state)
@@ -695,22 +720,26 @@ Ali soglašate? (da/ne)"""
             return "V redu, rezervacijo sem preklical. Kako vam lahko pomagam? (prekinil)"
         if is_affirmative(message):
             summary_state = reservation_state.copy()
-            res_id = reservation_service.create_reservation(
-                date=reservation_state["date"] or "",
-                people=int(reservation_state["people"] or 0),
-                reservation_type="table",
-                source="chat",
-                time=reservation_state["time"],
-                location=reservation_state["location"],
-                name=str(reservation_state["name"]),
-                phone=str(reservation_state["phone"]),
-                email=reservation_state["email"],
-                note=reservation_state.get("note") or "",
-                kids=str(reservation_state.get("kids") or ""),
-                kids_small=str(reservation_state.get("kids_ages") or ""),
-                event_type=reservation_state.get("event_type"),
-                gdpr_consent=reservation_state.get("gdpr_consent"),
-            )
+            try:
+                res_id = reservation_service.create_reservation(
+                    date=reservation_state["date"] or "",
+                    people=int(reservation_state["people"] or 0),
+                    reservation_type="table",
+                    source="chat",
+                    time=reservation_state["time"],
+                    location=reservation_state["location"],
+                    name=str(reservation_state["name"]),
+                    phone=str(reservation_state["phone"]),
+                    email=reservation_state["email"],
+                    note=reservation_state.get("note") or "",
+                    kids=str(reservation_state.get("kids") or ""),
+                    kids_small=str(reservation_state.get("kids_ages") or ""),
+                    event_type=reservation_state.get("event_type"),
+                    gdpr_consent=reservation_state.get("gdpr_consent"),
+                    claim=True,
+                )
+            except ReservationConflict as conflict:
+                return claim_conflict_reply(reservation_state, conflict)
             email_data = {
                 "id": res_id,
                 "name": reservation_state.get("name", ""),
@@ -733,6 +762,7 @@ Ali soglašate? (da/ne)"""
                     bot_response="(auto) reservation completed",
                     intent="reservation_completed",
                     needs_followup=False,
+                    defer=True,
                 )
             send_reservation_emails_async(email_data)
             reset_reservation_state(state)
@@ -1,15 +1,41 @@
-from fastapi import APIRouter
+import calendar
+from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import JSONResponse
 
 from app.models.reservation import ReservationCreate
-from app.services.reservation_service import ReservationService
+from app.services.pagination import RESERVATION_FIELDS, decode_cursor, next_cursor, page_size, parse_fields
+from app.services.reservation_service import get_reservation_service
 
 router = APIRouter(prefix="/reservations", tags=["reservations"])
-reservation_service = ReservationService()
+reservation_service = get_reservation_service()
+
+MAX_AVAILABILITY_MONTHS = 6
 
 
 @router.get("")
-def list_reservations() -> list[dict]:
-    return reservation_service.read_reservations()
+def list_reservations(
+    response: Response,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+) -> list[dict]:
+    """Rezervacije od najnovejše; naslednjo stran vrne glava X-Next-Cursor."""
+    try:
+        if cursor:
+            decode_cursor(cursor)
+        columns = parse_fields(fields, RESERVATION_FIELDS)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    limit = page_size(limit)
+    rows = reservation_service.read_reservations(limit=limit, cursor=cursor, fields=columns)
+    cursor_next = next_cursor(rows, limit)
+    if cursor_next:
+        response.headers["X-Next-Cursor"] = cursor_next
+    return rows
 
 
 @router.post("")
@@ -30,3 +56,52 @@ def create_reservation(payload: ReservationCreate) -> dict:
     )
     created = reservation_service.get_reservation(new_id) or {}
     return {"id": new_id, **created, "message": "Reservation created"}
+
+
+@router.get("/availability")
+def availability(request: Request, start: Optional[str] = None, months: int = 1) -> Response:
+    """Razpoložljivost sob po nočeh in miz po vikend terminih za cel mesec (ali več).
+
+    start = "YYYY-MM" (privzeto tekoči mesec). Odgovor nosi ETag/Last-Modified
+    in se ne spremeni, dokler ni novega pisanja rezervacije.
+    """
+    if months < 1 or months > MAX_AVAILABILITY_MONTHS:
+        raise HTTPException(status_code=400, detail=f"months mora biti med 1 in {MAX_AVAILABILITY_MONTHS}")
+    today = datetime.now()
+    try:
+        first = datetime.strptime(start, "%Y-%m") if start else today.replace(day=1)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start mora biti v obliki YYYY-MM")
+    first = first.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    days = 0
+    year, month = first.year, first.month
+    for _ in range(months):
+        days += calendar.monthrange(year, month)[1]
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+    token, version, last_modified = reservation_service.availability_version()
+    # današnji datum je del ključa, ker se pravila (pretekli dnevi) spreminjajo z dnem
+    etag = f'"{token}-{version}-{first:%Y%m}-{months}-{today:%Y%m%d}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(last_modified, usegmt=True),
+        "Cache-Control": "public, no-cache",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+            return Response(status_code=304, headers=headers)
+    elif request.headers.get("if-modified-since"):
+        try:
+            since = parsedate_to_datetime(request.headers["if-modified-since"]).timestamp()
+        except (TypeError, ValueError):
+            since = None
+        if since is not None and int(last_modified) <= since:
+            return Response(status_code=304, headers=headers)
+
+    payload = reservation_service.availability_range(first, days)
+    payload["from"] = first.strftime("%Y-%m-%d")
+    payload["days"] = days
+    return JSONResponse(payload, headers=headers)
@@ -2,16 +2,44 @@ import csv
 import math
 import os
 import re
-from collections import defaultdict
+import threading
+import time
+import uuid
 from datetime import datetime, timedelta
-from typing import Any, Dict, Optional, Tuple
-
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
 
 from app.models.reservation import ReservationRecord
+from app.services import analytics_rollup, occupancy_ledger
+from app.services.availability_planner import AvailabilityPlanner
+from app.services.conversation_log import ConversationLogQueue, get_conversation_log
+from app.services.export_stream import EXPORT_DATASETS, csv_chunks
+from app.services.migrations import run_migrations
+from app.services.occupancy_index import OccupancyEntry, OccupancyIndex, get_index
+from app.services.occupancy_ledger import CLAIM_RETRIES, ReservationConflict, nights_of
+from app.services.pagination import keyset_clause
+from app.services.search_index import (
+    SEARCH_SCOPES,
+    SNIPPET_END,
+    SNIPPET_START,
+    fts_match,
+    pg_document,
+    query_tokens,
+    ts_query,
+)
+from app.services.sqlite_writer import apply_pragmas, enable_wal, get_writer
+from app.services.storage import SQLiteFileStorage, Storage, storage_from_env
+from app.services.unit_of_work import UnitOfWork, current_unit_of_work
 
 DATABASE_URL = os.environ.get("DATABASE_URL")
+# SQLite produkcijski način: WAL + ena pisalna nit z group commit
+SQLITE_WAL_MODE = os.getenv("SQLITE_WAL_MODE", "").strip().lower() in {"1", "true", "yes"}
+# števci za admin ploščo: največja starost (pisanja v tem procesu jih razveljavijo takoj)
+ADMIN_STATS_TTL = float(os.getenv("ADMIN_STATS_TTL", "15"))
+# pogovori starejši od toliko dni gredo v conversations_archive (0 = brez arhiviranja)
+CONV_ARCHIVE_DAYS = int(os.getenv("CONV_ARCHIVE_DAYS", "180"))
+CONV_ARCHIVE_BATCH = int(os.getenv("CONV_ARCHIVE_BATCH", "2000"))
+# velikost kosa pri pretočnem branju (izvozi, backup)
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "500"))
 
 ROOMS = [
     {"id": "ALJAZ", "name": "Soba ALJAŽ - Soba z balkonom (2 + 2)", "capacity": 4},
@@ -41,6 +69,9 @@ DINING_ROOMS = [
 TOTAL_TABLE_CAPACITY = sum(r["capacity"] for r in DINING_ROOMS)
 MAX_NIGHTS = 30
 
+# polja rezervacije, ki vplivajo na zahtevke v knjigi zasedenosti
+_CLAIM_FIELDS = {"status", "date", "nights", "rooms", "people", "reservation_type", "time", "location"}
+
 ROOM_CLOSED_DAYS = {0, 1}  # pon, tor
 TABLE_OPEN_DAYS = {5, 6}  # sob, ned
 LAST_LUNCH_ARRIVAL_HOUR = 15
@@ -49,296 +80,96 @@ OPENING_END_HOUR = 20
 
 
 class ReservationService:
-    def __init__(self) -> None:
+    def __init__(
+        self, db_path: Optional[str] = None, sqlite_wal: Optional[bool] = None, storage: Optional[Storage] = None
+    ) -> None:
+        """storage izbere bazo za to instanco (app/services/storage.py); db_path je bližnjica za SQLite datoteko.
+
+        Brez obeh odloči okolje: RESERVATIONS_STORAGE, DATABASE_URL ali data/reservations.db.
+        """
         project_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
         self.csv_path = os.path.join(project_root, "reservations.csv")
         self.backup_dir = os.path.join(project_root, "backups")
         os.makedirs(self.backup_dir, exist_ok=True)
 
-        # Če ni DATABASE_URL, uporabimo SQLite (lokalni razvoj)
-        self.use_postgres = bool(DATABASE_URL)
-        if not self.use_postgres:
-            self.data_dir = os.path.join(project_root, "data")
-            os.makedirs(self.data_dir, exist_ok=True)
-            self.db_path = os.path.join(self.data_dir, "reservations.db")
+        if storage is None and db_path is not None:
+            storage = SQLiteFileStorage(db_path)
+        if storage is None:
+            storage = storage_from_env(os.path.join(project_root, "data", "reservations.db"), DATABASE_URL)
+        self.storage = storage
+        self.use_postgres = storage.dialect == "postgres"
+        self.db_path = getattr(storage, "path", None)
+        self.sqlite_wal = False
+        self._writer = None
+        self.data_dir = os.path.dirname(self.db_path) if self.db_path else os.path.join(project_root, "data")
+        os.makedirs(self.data_dir, exist_ok=True)
+        if self.db_path:
+            self.sqlite_wal = SQLITE_WAL_MODE if sqlite_wal is None else sqlite_wal
+        self.conversation_spill_path = os.path.join(self.data_dir, "conversations_spill.jsonl")
 
         self._ensure_db()
+        if self.sqlite_wal:
+            enable_wal(self.db_path)
+            self._writer = get_writer(self.db_path)
+        elif storage.needs_writer:
+            self._writer = get_writer(storage.key, connect=lambda: storage.connect(shared=True, isolation_level=None))
+        self._index = get_index(storage.key, [r["id"] for r in ROOMS], MAX_NIGHTS)
+        self._stats_cache: Optional[tuple] = None
         self._import_csv_if_empty()
 
     # --- DB helpers ------------------------------------------------------
     def _conn(self):
-        if self.use_postgres:
-            conn = psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
-            return conn
-        import sqlite3
+        """Povezava za en klic; znotraj enote dela (unit_of_work) skupna povezava poteze."""
+        uow = self._unit_of_work()
+        if uow is not None:
+            return uow.connection()
+        return self._connect()
+
+    def _unit_of_work(self) -> Optional[UnitOfWork]:
+        uow = current_unit_of_work()
+        if uow is None:
+            return None
+        return uow if uow.bind(self.storage.key, lambda: self._connect(shared=True)) else None
 
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+    def _connect(self, shared: bool = False):
+        conn = self.storage.connect(shared=shared)
+        if self.sqlite_wal:
+            apply_pragmas(conn)
         return conn
 
     def _placeholder(self) -> str:
         return "%s" if self.use_postgres else "?"
 
-    def _ensure_db(self) -> None:
-        new_columns = [
-            ("rooms", "INTEGER"),
-            ("status", "TEXT DEFAULT 'pending'"),
-            ("admin_notes", "TEXT"),
-            ("confirmed_at", "TEXT"),
-            ("confirmed_by", "TEXT"),
-            ("guest_message", "TEXT"),
-            ("country", "TEXT"),
-            ("kids", "TEXT"),
-            ("kids_small", "TEXT"),
-            ("confirm_via", "TEXT"),
-            ("event_type", "TEXT"),
-            ("special_needs", "TEXT"),
-        ]
-
-        if self.use_postgres:
-            conn = self._conn()
-            cur = None
-            try:
-                cur = conn.cursor()
-                cur.execute(
-                    """
-                    CREATE TABLE IF NOT EXISTS reservations (
-                        id SERIAL PRIMARY KEY,
-                        date TEXT NOT NULL,
-                        nights INTEGER,
-                        rooms INTEGER,
-                        people INTEGER NOT NULL,
-                        reservation_type TEXT NOT NULL,
-                        time TEXT,
-                        location TEXT,
-                        name TEXT,
-                        phone TEXT,
-                        email TEXT,
-                        note TEXT,
-                        status TEXT DEFAULT 'pending',
-                        created_at TEXT NOT NULL,
-                        source TEXT NOT NULL,
-                        admin_notes TEXT,
-                        confirmed_at TEXT,
-                        confirmed_by TEXT,
-                        guest_message TEXT,
-                        country TEXT,
-                        kids TEXT,
-                        kids_small TEXT,
-                        confirm_via TEXT,
-                        event_type TEXT,
-                        special_needs TEXT,
-                        gdpr_consent TEXT
-                    )
-                    """
-                )
-                # Migration: add gdpr_consent column if missing
-                cur.execute(
-                    """
-                    DO $$
-                    BEGIN
-                        IF NOT EXISTS (
-                            SELECT 1 FROM information_schema.columns
-                            WHERE table_name='reservations' AND column_name='gdpr_consent'
-                        ) THEN
-                            ALTER TABLE reservations ADD COLUMN gdpr_consent TEXT;
-                        END IF;
-                    END $$;
-                    """
-                )
-                cur.execute(
-                    """
-                    CREATE TABLE IF NOT EXISTS conversations (
-                        id SERIAL PRIMARY KEY,
-                        session_id TEXT,
-                        user_message TEXT NOT NULL,
-                        bot_response TEXT NOT NULL,
-                        intent TEXT,
-                        needs_followup BOOLEAN DEFAULT FALSE,
-                        followup_email TEXT,
-                        created_at TEXT NOT NULL
-                    )
-                    """
-                )
-                cur.execute(
-                    """
-                    CREATE TABLE IF NOT EXISTS inquiries (
-                        id SERIAL PRIMARY KEY,
-                        session_id TEXT,
-                        details TEXT NOT NULL,
-                        deadline TEXT,
-                        contact_name TEXT,
-                        contact_email TEXT,
-                        contact_phone TEXT,
-                        contact_raw TEXT,
-                        status TEXT DEFAULT 'new',
-                        created_at TEXT NOT NULL,
-                        source TEXT NOT NULL
-                    )
-                    """
-                )
-                cur.execute(
-                    """
-                    CREATE TABLE IF NOT EXISTS reservation_messages (
-                        id SERIAL PRIMARY KEY,
-                        reservation_id INTEGER NOT NULL,
-                        direction TEXT NOT NULL,
-                        subject TEXT,
-                        body TEXT,
-                        from_email TEXT,
-                        to_email TEXT,
-                        message_id TEXT,
-                        created_at TEXT NOT NULL
-                    )
-                    """
-                )
-                cur.execute(
-                    """
-                    CREATE TABLE IF NOT EXISTS knowledge_feedback (
-                        id SERIAL PRIMARY KEY,
-                        question TEXT NOT NULL,
-                        suggestion TEXT NOT NULL,
-                        status TEXT DEFAULT 'new',
-                        created_at TEXT NOT NULL
-                    )
-                    """
-                )
-                cur.execute(
-                    """
-                    CREATE TABLE IF NOT EXISTS report_log (
-                        id SERIAL PRIMARY KEY,
-                        report_type TEXT NOT NULL,
-                        sent_at TEXT NOT NULL
-                    )
-                    """
-                )
-                # dodaj manjkajoče stolpce na obstoječo tabelo (robustnost)
-                for col, definition in new_columns:
-                    cur.execute(
-                        f"ALTER TABLE reservations ADD COLUMN IF NOT EXISTS {col} {definition}"
-                    )
-                conn.commit()
-            finally:
-                if cur:
-                    cur.close()
-                conn.close()
-        else:
-            import sqlite3
-
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS reservations (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    date TEXT NOT NULL,
-                    nights INTEGER,
-                    rooms INTEGER,
-                    people INTEGER NOT NULL,
-                    reservation_type TEXT NOT NULL,
-                    time TEXT,
-                    location TEXT,
-                    name TEXT,
-                    phone TEXT,
-                    email TEXT,
-                    note TEXT,
-                    status TEXT DEFAULT 'pending',
-                    created_at TEXT NOT NULL,
-                    source TEXT NOT NULL,
-                    admin_notes TEXT,
-                    confirmed_at TEXT,
-                    confirmed_by TEXT,
-                    guest_message TEXT,
-                    country TEXT,
-                    kids TEXT,
-                    kids_small TEXT,
-                    confirm_via TEXT,
-                    event_type TEXT,
-                    special_needs TEXT,
-                    gdpr_consent TEXT
-                )
-                """
-            )
-            # Migration: add gdpr_consent column if missing
-            try:
-                conn.execute("ALTER TABLE reservations ADD COLUMN gdpr_consent TEXT")
-            except Exception:
-                pass  # Column already exists
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS conversations (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    session_id TEXT,
-                    user_message TEXT NOT NULL,
-                    bot_response TEXT NOT NULL,
-                    intent TEXT,
-                    needs_followup BOOLEAN DEFAULT FALSE,
-                    followup_email TEXT,
-                    created_at TEXT NOT NULL
-                )
-                """
-            )
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS inquiries (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    session_id TEXT,
-                    details TEXT NOT NULL,
-                    deadline TEXT,
-                    contact_name TEXT,
-                    contact_email TEXT,
-                    contact_phone TEXT,
-                    contact_raw TEXT,
-                    status TEXT DEFAULT 'new',
-                    created_at TEXT NOT NULL,
-                    source TEXT NOT NULL
-                )
-                """
-            )
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS reservation_messages (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    reservation_id INTEGER NOT NULL,
-                    direction TEXT NOT NULL,
-                    subject TEXT,
-                    body TEXT,
-                    from_email TEXT,
-                    to_email TEXT,
-                    message_id TEXT,
-                    created_at TEXT NOT NULL
-                )
-                """
-            )
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS knowledge_feedback (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    question TEXT NOT NULL,
-                    suggestion TEXT NOT NULL,
-                    status TEXT DEFAULT 'new',
-                    created_at TEXT NOT NULL
-                )
-                """
-            )
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS report_log (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    report_type TEXT NOT NULL,
-                    sent_at TEXT NOT NULL
-                )
-                """
-            )
-            # dodaj manjkajoče stolpce za stare tabele
-            info = conn.execute("PRAGMA table_info(reservations)").fetchall()
-            existing_cols = {row[1] for row in info}
-            for col, definition in new_columns:
-                if col not in existing_cols:
-                    conn.execute(f"ALTER TABLE reservations ADD COLUMN {col} {definition};")
+    def _write(self, fn: Callable[[Any], Any]) -> Any:
+        """Izvede pisalno operacijo (fn prejme cursor) in jo potrdi.
+
+        V WAL načinu gre operacija skozi skupno pisalno nit, znotraj enote dela
+        v skupni transakciji poteze, sicer pa na novi povezavi kot doslej.
+        """
+        if self._writer is not None:
+            return self._writer.execute(fn)
+        uow = self._unit_of_work()
+        if uow is not None:
+            # indeks je posodobljen sproti; če se poteza razveljavi, ga naloži znova
+            uow.on_rollback(self._index.invalidate)
+            return uow.write(fn)
+        conn = self._conn()
+        cur = conn.cursor()
+        try:
+            result = fn(cur)
             conn.commit()
+            return result
+        finally:
+            cur.close()
             conn.close()
 
+    def _ensure_db(self) -> None:
+        """Posodobi shemo z verzioniranimi migracijami (app/services/migrations.py)."""
+        applied = run_migrations(self._connect, postgres=self.use_postgres, key=self.storage.key)
+        if 9 in applied:
+            # nova knjiga zasedenosti: vpiši obstoječe rezervacije
+            self.rebuild_claims()
+
     def _import_csv_if_empty(self) -> None:
         conn = self._conn()
         try:
@@ -362,21 +193,21 @@ class ReservationService:
         legacy_rows = self._read_legacy_csv()
         if not legacy_rows:
             return
-        conn = self._conn()
         ph = self._placeholder()
-        placeholders = ", ".join([ph] * 11)
+        placeholders = ", ".join([ph] * 13)
         insert_sql = (
-            f"INSERT INTO reservations (date, nights, people, reservation_type, time, location, name, phone, email, created_at, source) "
+            f"INSERT INTO reservations (date, nights, people, reservation_type, time, location, name, phone, email, created_at, source, start_date, end_date) "
             f"VALUES ({placeholders})"
         )
-        try:
-            cur = conn.cursor()
+
+        def _insert_all(cur) -> None:
             for row in legacy_rows:
+                nights = int(row.get("nights") or 0) or None
                 cur.execute(
                     insert_sql,
                     (
                         row.get("date", ""),
-                        int(row.get("nights") or 0) or None,
+                        nights,
                         int(row.get("people") or 0),
                         row.get("reservation_type") or row.get("type") or "room",
                         row.get("time") or None,
@@ -386,12 +217,12 @@ class ReservationService:
                         row.get("email") or None,
                         row.get("created_at") or datetime.now().isoformat(),
                         row.get("source") or "import",
+                        *self._stay_range(row.get("date", ""), nights),
                     ),
                 )
-            conn.commit()
-        finally:
-            cur.close()
-            conn.close()
+
+        self._write(_insert_all)
+        self._index.invalidate()
 
     # --- helpers ---------------------------------------------------------
     def _parse_date(self, date_str: str) -> Optional[datetime]:
@@ -400,6 +231,20 @@ class ReservationService:
         except ValueError:
             return None
 
+    def _stay_range(self, date_str: Optional[str], nights: Any) -> tuple[Optional[str], Optional[str]]:
+        """DD.MM.YYYY + nočitve -> (start_date, end_date) v ISO; end_date je zadnja noč (vključno)."""
+        start = self._parse_date(date_str or "")
+        if not start:
+            return None, None
+        try:
+            nights_int = int(nights or 1)
+        except (TypeError, ValueError):
+            match = re.search(r"\d+", str(nights))
+            nights_int = int(match.group(0)) if match else 1
+        nights_int = max(1, nights_int)
+        end = start + timedelta(days=nights_int - 1)
+        return start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
+
     def _parse_time(self, time_str: str) -> Optional[str]:
         """Normalize various time inputs to HH:MM."""
         if not time_str:
@@ -431,92 +276,153 @@ class ReservationService:
                 selected.append(rid)
         return selected
 
+    # --- occupancy index -------------------------------------------------
+    def _occupancy_entry(self, row: Dict[str, Any]) -> Optional[OccupancyEntry]:
+        """Pretvori vrstico rezervacije v prispevek k indeksu zasedenosti."""
+        if row.get("status") in ("cancelled", "rejected"):
+            return None
+        try:
+            people = int(row.get("people"))
+        except (TypeError, ValueError):
+            people = 0
+        if row.get("reservation_type") == "room":
+            try:
+                nights = int(row.get("nights") or 0)
+            except (TypeError, ValueError):
+                nights = 0
+            arrival = self._parse_date(row.get("date") or "")
+            if nights <= 0 or not arrival:
+                return None
+            try:
+                rooms = int(row["rooms"]) if row.get("rooms") is not None else 0
+            except (TypeError, ValueError):
+                rooms = 0
+            return OccupancyEntry(
+                id=int(row["id"]),
+                kind="room",
+                start=arrival.toordinal(),
+                nights=nights,
+                rooms=rooms or self._rooms_needed(people),
+                assigned=tuple(self._normalize_room_location(row.get("location"))),
+            )
+        if row.get("reservation_type") == "table" and row.get("time"):
+            room_key = row.get("location") or "Jedilnica Pri vrtu"
+            return OccupancyEntry(
+                id=int(row["id"]),
+                kind="table",
+                table_key=(row.get("date"), row.get("time"), room_key),
+                people=people,
+            )
+        return None
+
+    def _load_occupancy(self) -> list[OccupancyEntry]:
+        conn = self._conn()
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                SELECT id, date, nights, rooms, people, reservation_type, time, location, status
+                FROM reservations
+                WHERE status NOT IN ('cancelled', 'rejected')
+                """
+            )
+            entries = [self._occupancy_entry(dict(row)) for row in cur.fetchall()]
+        finally:
+            cur.close()
+            conn.close()
+        return [entry for entry in entries if entry is not None]
+
+    def _occupancy(self) -> OccupancyIndex:
+        uow = self._unit_of_work()
+        if uow is not None and "occupancy" in uow.cache:
+            # en posnetek zasedenosti na potezo (pisanja ga sproti posodabljajo)
+            return self._index
+        self._index.ensure_loaded(self._load_occupancy)
+        if uow is not None:
+            uow.cache["occupancy"] = True
+        return self._index
+
+    def warm_up(self) -> None:
+        """Naloži indeks zasedenosti vnaprej (ob zagonu aplikacije)."""
+        self._occupancy()
+
+    def planner(self) -> AvailabilityPlanner:
+        return AvailabilityPlanner(self._occupancy(), len(ROOMS), DINING_ROOMS)
+
+    def _refresh_occupancy(self, reservation_id: int) -> None:
+        """Po pisanju ponovno prebere eno vrstico in posodobi indeks."""
+        row = self.get_reservation(reservation_id)
+        self._index.upsert(reservation_id, self._occupancy_entry(row) if row else None)
+
+    # --- knjiga zasedenosti (app/services/occupancy_ledger.py) -----------
+    def _record_claims(self, cur, entry: Optional[OccupancyEntry], strict: bool) -> Optional[str]:
+        """Zapiše zahtevke rezervacije; pri mizah vrne uporabljeno jedilnico."""
+        if entry is None:
+            return None
+        dialect = "postgres" if self.use_postgres else "sqlite"
+        if entry.kind == "room":
+            occupancy_ledger.claim_rooms(
+                cur,
+                dialect,
+                entry.id,
+                nights_of(entry.start, entry.nights),
+                entry.rooms,
+                [r["id"] for r in ROOMS],
+                preferred=entry.assigned,
+                strict=strict,
+            )
+            return None
+        day, time_value, room_name = entry.table_key
+        capacities = {r["name"]: r["capacity"] for r in DINING_ROOMS}
+        order = [(room_name, capacities.get(room_name, 0))] if room_name in capacities or not strict else []
+        order += [(name, cap) for name, cap in capacities.items() if name != room_name]
+        return occupancy_ledger.claim_table(
+            cur, dialect, entry.id, day, self._parse_time(time_value) or time_value, entry.people, order, strict=strict
+        )
+
+    def _sync_claims(self, cur, reservation_id: int) -> None:
+        """Po spremembi rezervacije (status, termin) na novo zapiše njene zahtevke."""
+        occupancy_ledger.release(cur, "postgres" if self.use_postgres else "sqlite", reservation_id)
+        cur.execute(
+            "SELECT id, date, nights, rooms, people, reservation_type, time, location, status "
+            f"FROM reservations WHERE id = {self._placeholder()}",
+            (reservation_id,),
+        )
+        row = cur.fetchone()
+        if row:
+            self._record_claims(cur, self._occupancy_entry(dict(row)), strict=False)
+
+    def rebuild_claims(self) -> int:
+        """Knjigo zasedenosti zgradi znova iz aktivnih rezervacij (po id). Vrne število rezervacij."""
+
+        def _rebuild(cur) -> int:
+            occupancy_ledger.clear(cur)
+            cur.execute(
+                "SELECT id, date, nights, rooms, people, reservation_type, time, location, status "
+                "FROM reservations WHERE status NOT IN ('cancelled', 'rejected') ORDER BY id"
+            )
+            rows = [dict(row) for row in cur.fetchall()]
+            for row in rows:
+                self._record_claims(cur, self._occupancy_entry(row), strict=False)
+            return len(rows)
+
+        return self._write(_rebuild)
+
     def _room_calendar(self) -> dict[str, set[str]]:
         """Vrne slovar room_id -> set datumov (dd.mm.yyyy) ki so zasedeni."""
-        calendar: dict[str, set[str]] = {r["id"]: set() for r in ROOMS}
-        for reservation in self._fetch_reservations():
-            if reservation.reservation_type != "room":
-                continue
-            if reservation.status == "cancelled":
-                continue
-            if not reservation.nights:
-                continue
-            if reservation.nights > MAX_NIGHTS:
-                continue
-            if reservation.nights > MAX_NIGHTS:
-                continue
-            arrival = self._parse_date(reservation.date)
-            if not arrival:
-                continue
-            dates = [(arrival + timedelta(days=offset)).strftime("%d.%m.%Y") for offset in range(reservation.nights)]
-            assigned = self._normalize_room_location(reservation.location)
-            rooms_to_mark = assigned if assigned else [r["id"] for r in ROOMS]
-            rooms_needed = reservation.rooms or self._rooms_needed(reservation.people)
-            # če nimamo točne sobe, zapolnimo prve proste
-            filled = 0
-            for room_id in rooms_to_mark:
-                if filled >= rooms_needed:
-                    break
-                # preveri, ali je soba prosta za vse datume
-                if all(date not in calendar[room_id] for date in dates):
-                    for d in dates:
-                        calendar[room_id].add(d)
-                    filled += 1
-            # če še vedno kaj manjka, zapolnimo preostale
-            if filled < rooms_needed:
-                for room_id in [r["id"] for r in ROOMS]:
-                    if filled >= rooms_needed:
-                        break
-                    if all(date not in calendar[room_id] for date in dates):
-                        for d in dates:
-                            calendar[room_id].add(d)
-                        filled += 1
-        return calendar
+        return self._occupancy().room_calendar()
 
     def available_rooms(self, arrival_str: str, nights: int) -> list[str]:
         arrival = self._parse_date(arrival_str)
         if not arrival:
             return []
-        dates = [(arrival + timedelta(days=offset)).strftime("%d.%m.%Y") for offset in range(nights)]
-        calendar = self._room_calendar()
-        free = []
-        for room_id in [r["id"] for r in ROOMS]:
-            occupied = calendar.get(room_id, set())
-            if all(d not in occupied for d in dates):
-                free.append(room_id)
-        return free
+        return self._occupancy().free_rooms(arrival.toordinal(), nights)
 
     def _room_occupancy(self) -> dict[str, int]:
-        occupancy: dict[str, int] = defaultdict(int)
-        for reservation in self._fetch_reservations():
-            if reservation.reservation_type != "room":
-                continue
-            if reservation.status == "cancelled":
-                continue
-            if not reservation.nights:
-                continue
-            arrival = self._parse_date(reservation.date)
-            if not arrival:
-                continue
-            rooms_needed = reservation.rooms or self._rooms_needed(reservation.people)
-            for offset in range(reservation.nights):
-                day = (arrival + timedelta(days=offset)).strftime("%d.%m.%Y")
-                occupancy[day] += rooms_needed
-        return occupancy
+        return self._occupancy().room_occupancy()
 
     def _table_room_occupancy(self) -> dict[tuple[str, str, str], int]:
-        occupancy: dict[tuple[str, str, str], int] = defaultdict(int)
-        for reservation in self._fetch_reservations():
-            if reservation.reservation_type != "table":
-                continue
-            if reservation.status == "cancelled":
-                continue
-            if not reservation.time:
-                continue
-            room_key = reservation.location or "Jedilnica Pri vrtu"
-            key = (reservation.date, reservation.time, room_key)
-            occupancy[key] += reservation.people
-        return occupancy
+        return self._occupancy().table_occupancy()
 
     # --- availability ----------------------------------------------------
     def validate_room_rules(self, arrival_str: str, nights: int) -> Tuple[bool, str]:
@@ -558,35 +464,22 @@ class ReservationService:
         if rooms_needed > len(ROOMS):
             return False, None
 
-        occupancy = self._room_occupancy()
-        for offset in range(nights):
-            day = (arrival + timedelta(days=offset)).strftime("%d.%m.%Y")
-            used = occupancy.get(day, 0)
-            if used + rooms_needed > len(ROOMS):
-                alternative = self.suggest_room_alternative(arrival, nights, rooms_needed)
-                return False, alternative
+        if not self._occupancy().fits_rooms(arrival.toordinal(), nights, rooms_needed, len(ROOMS)):
+            alternative = self.suggest_room_alternative(arrival, nights, rooms_needed)
+            return False, alternative
         return True, None
 
     def suggest_room_alternative(
         self, arrival: datetime, nights: int, rooms_needed: int
     ) -> Optional[str]:
-        occupancy = self._room_occupancy()
-        for delta in range(1, 31):
-            candidate = arrival + timedelta(days=delta)
-            if candidate.weekday() in ROOM_CLOSED_DAYS:
-                continue
-            min_nights = self._room_min_nights(candidate)
-            if nights < min_nights:
-                continue
-            fits = True
-            for offset in range(nights):
-                day = (candidate + timedelta(days=offset)).strftime("%d.%m.%Y")
-                if occupancy.get(day, 0) + rooms_needed > len(ROOMS):
-                    fits = False
-                    break
-            if fits:
-                return candidate.strftime("%d.%m.%Y")
-        return None
+        def _open_for(ordinal: int) -> bool:
+            candidate = datetime.fromordinal(ordinal)
+            return candidate.weekday() not in ROOM_CLOSED_DAYS and nights >= self._room_min_nights(candidate)
+
+        found = self.planner().earliest_room_window(
+            arrival.toordinal() + 1, nights, rooms_needed, horizon=30, accept=_open_for
+        )
+        return datetime.fromordinal(found).strftime("%d.%m.%Y") if found else None
 
     def validate_table_rules(self, date_str: str, time_str: str) -> Tuple[bool, str]:
         dining_day = self._parse_date(date_str)
@@ -614,63 +507,144 @@ class ReservationService:
         normalized_time = self._parse_time(time_str)
         if not normalized_time:
             return False, None, []
-        occupancy = self._table_room_occupancy()
+        index = self._occupancy()
         suggestions: list[str] = []
 
         # global limit čez oba prostora
         total_used = 0
         for room in DINING_ROOMS:
-            total_used += occupancy.get((date_str, normalized_time, room["name"]), 0)
+            total_used += index.table_seats(date_str, normalized_time, room["name"])
         if total_used + people > TOTAL_TABLE_CAPACITY:
             suggestions = self.suggest_table_slots(date_str, people, limit=3)
             return False, None, suggestions
 
         for room in DINING_ROOMS:
-            key = (date_str, normalized_time, room["name"])
-            used = occupancy.get(key, 0)
+            used = index.table_seats(date_str, normalized_time, room["name"])
             if used + people <= room["capacity"]:
                 return True, room["name"], suggestions
 
         suggestions = self.suggest_table_slots(date_str, people, limit=3)
         return False, None, suggestions
 
-    def suggest_table_slots(self, date_str: str, people: int, limit: int = 3) -> list[str]:
-        slots: list[str] = []
-        occupancy = self._table_room_occupancy()
+    def _table_start_times(self) -> list[str]:
         start_times = []
         for hour in range(OPENING_START_HOUR, LAST_LUNCH_ARRIVAL_HOUR + 1):
             start_times.append(f"{hour:02d}:00")
             if hour != LAST_LUNCH_ARRIVAL_HOUR:
                 start_times.append(f"{hour:02d}:30")
+        return start_times
+
+    def suggest_table_slots(self, date_str: str, people: int, limit: int = 3) -> list[str]:
+        start_times = self._table_start_times()
 
-        # 1) isti dan
-        for t in start_times:
-            for room in DINING_ROOMS:
-                used = occupancy.get((date_str, t, room["name"]), 0)
-                if used + people <= room["capacity"]:
-                    slots.append(f"{date_str} ob {t} ({room['name']})")
-                    break
-            if len(slots) >= limit:
-                return slots
-
-        # 2) najbližji vikend v prihodnjih dveh tednih
+        # 1) isti dan, 2) najbližji vikend v prihodnjih dveh tednih
+        dates = [date_str]
         parsed_date = self._parse_date(date_str)
-        if not parsed_date:
-            return slots
-        for delta in range(1, 15):
-            candidate = parsed_date + timedelta(days=delta)
-            if candidate.weekday() not in TABLE_OPEN_DAYS:
+        if parsed_date:
+            for delta in range(1, 15):
+                candidate = parsed_date + timedelta(days=delta)
+                if candidate.weekday() in TABLE_OPEN_DAYS:
+                    dates.append(candidate.strftime("%d.%m.%Y"))
+
+        found = self.planner().next_table_slots(dates, start_times, people, limit)
+        return [f"{day} ob {t} ({room_name})" for day, t, room_name in found]
+
+    def availability_range(self, start: datetime, days: int) -> Dict[str, Any]:
+        """Koledar razpoložljivosti sob (po nočeh) in miz (po vikend terminih) v enem prehodu."""
+        planner = self.planner()
+        first = start.toordinal()
+        today = datetime.now().date()
+        free_by_day = planner.free_rooms_by_day(first, days)
+        free_counts = planner.free_room_counts(first, days)
+        start_times = self._table_start_times()
+
+        room_days = []
+        table_slots = []
+        for offset in range(days):
+            day = datetime.fromordinal(first + offset)
+            date_str = day.strftime("%d.%m.%Y")
+            room_days.append(
+                {
+                    "date": day.strftime("%Y-%m-%d"),
+                    "free_rooms": free_counts[offset],
+                    "free_room_ids": free_by_day[offset],
+                    "arrival_allowed": day.date() >= today and day.weekday() not in ROOM_CLOSED_DAYS,
+                    "min_nights": self._room_min_nights(day),
+                }
+            )
+            if day.weekday() not in TABLE_OPEN_DAYS or day.date() < today:
                 continue
-            candidate_str = candidate.strftime("%d.%m.%Y")
-            for t in start_times:
-                for room in DINING_ROOMS:
-                    used = occupancy.get((candidate_str, t, room["name"]), 0)
-                    if used + people <= room["capacity"]:
-                        slots.append(f"{candidate_str} ob {t} ({room['name']})")
-                        break
-                if len(slots) >= limit:
-                    return slots
-        return slots
+            free_seats = planner.table_free_seats(date_str, start_times)
+            for slot, t in enumerate(start_times):
+                table_slots.append(
+                    {
+                        "date": day.strftime("%Y-%m-%d"),
+                        "time": t,
+                        "free_seats": {name: seats[slot] for name, seats in free_seats.items()},
+                    }
+                )
+        return {
+            "rooms": {
+                "capacity": len(ROOMS),
+                "closed_weekdays": sorted(ROOM_CLOSED_DAYS),
+                "max_nights": MAX_NIGHTS,
+                "days": room_days,
+            },
+            "tables": {
+                "capacity": {room["name"]: room["capacity"] for room in DINING_ROOMS},
+                "open_weekdays": sorted(TABLE_OPEN_DAYS),
+                "last_arrival": f"{LAST_LUNCH_ARRIVAL_HOUR:02d}:00",
+                "slots": table_slots,
+            },
+        }
+
+    def availability_version(self) -> tuple[str, int, float]:
+        """(žeton indeksa, verzija, čas zadnje spremembe) za ETag/Last-Modified."""
+        index = self._occupancy()
+        return index.token, index.version, index.last_modified
+
+    def reservation_stats(self) -> dict[str, int]:
+        """Števci rezervacij za admin ploščo (ena vrstica iz baze).
+
+        Rezultat se hrani ADMIN_STATS_TTL sekund oz. do naslednjega pisanja
+        rezervacije v tem procesu (verzija indeksa zasedenosti).
+        """
+        now = datetime.now()
+        today = now.strftime("%Y-%m-%d")
+        cache_key = (self._index.token, self._index.version, today)
+        cached = self._stats_cache
+        if cached and cached[0] == cache_key and time.monotonic() < cached[1]:
+            return dict(cached[2])
+        ph = self._placeholder()
+        sql = (
+            "SELECT "
+            "COUNT(*) FILTER (WHERE status = 'pending') AS pending, "
+            "COUNT(*) FILTER (WHERE status = 'processing') AS processing, "
+            "COUNT(*) FILTER (WHERE status = 'confirmed') AS confirmed, "
+            "COUNT(*) FILTER (WHERE status = 'rejected') AS rejected, "
+            "COUNT(*) FILTER (WHERE reservation_type = 'room') AS room, "
+            "COUNT(*) FILTER (WHERE reservation_type = 'table') AS \"table\", "
+            f"COUNT(*) FILTER (WHERE created_at >= {ph}) AS today, "
+            f"COUNT(*) FILTER (WHERE created_at >= {ph}) AS week, "
+            f"COUNT(*) FILTER (WHERE created_at >= {ph}) AS month "
+            "FROM reservations"
+        )
+        params = (
+            today,
+            (now - timedelta(days=7)).isoformat(timespec="seconds"),
+            now.strftime("%Y-%m-01"),
+        )
+        conn = self._conn()
+        try:
+            cur = conn.cursor()
+            cur.execute(sql, params)
+            row = dict(cur.fetchone())
+        finally:
+            cur.close()
+            conn.close()
+        stats = {key: int(value or 0) for key, value in row.items()}
+        self._stats_cache = (cache_key, time.monotonic() + ADMIN_STATS_TTL, stats)
+        return dict(stats)
 
     # --- CRUD ------------------------------------------------------------
     def create_reservation(
@@ -699,24 +673,32 @@ class ReservationService:
         event_type: Optional[str] = None,
         special_needs: Optional[str] = None,
         gdpr_consent: Optional[str] = None,
+        claim: bool = False,
     ) -> int:
+        """Vpiše rezervacijo in njene zahtevke v knjigo zasedenosti (v eni transakciji).
+
+        claim=True (klepet): termin mora biti prost v trenutku vpisa, sicer se
+        sproži ReservationConflict z najbližjo alternativo iz planerja in nič se
+        ne zapiše. Brez claim (admin, API) se zasede le, kar je prosto.
+        """
         created_at = datetime.now().isoformat()
         # Admin / telefon / API vnosi se avtomatsko potrdijo
         if source in ("admin", "phone", "api"):
             status = "confirmed"
-        conn = self._conn()
         ph = self._placeholder()
-        placeholders = ", ".join([ph] * 25)  # 25 fields including gdpr_consent
+        start_date, end_date = self._stay_range(date, nights)
+        placeholders = ", ".join([ph] * 27)  # 25 polj + start_date/end_date
         sql = (
             f"INSERT INTO reservations "
             f"(date, nights, rooms, people, reservation_type, time, location, name, phone, email, note, status, created_at, source, "
-            f"admin_notes, confirmed_at, confirmed_by, guest_message, country, kids, kids_small, confirm_via, event_type, special_needs, gdpr_consent) "
+            f"admin_notes, confirmed_at, confirmed_by, guest_message, country, kids, kids_small, confirm_via, event_type, special_needs, gdpr_consent, "
+            f"start_date, end_date) "
             f"VALUES ({placeholders})"
         )
         if self.use_postgres:
             sql += " RETURNING id"
-        try:
-            cur = conn.cursor()
+
+        def _insert(cur) -> tuple[int, Optional[str]]:
             cur.execute(
                 sql,
                 (
@@ -745,46 +727,101 @@ class ReservationService:
                     event_type,
                     special_needs,
                     gdpr_consent,
+                    start_date,
+                    end_date,
                 ),
             )
             if self.use_postgres:
                 fetched = cur.fetchone()
-                new_id = fetched["id"] if isinstance(fetched, dict) else fetched[0]
+                new_id = int(fetched["id"] if isinstance(fetched, dict) else fetched[0])
             else:
-                new_id = cur.lastrowid
-            conn.commit()
-        finally:
-            cur.close()
-            conn.close()
+                new_id = int(cur.lastrowid)
+            claimed = self._record_claims(cur, self._occupancy_entry({**occupancy_row, "id": new_id}), strict=claim)
+            if claimed and claimed != location:
+                # miza je dobila prostor v drugi jedilnici
+                cur.execute(f"UPDATE reservations SET location = {ph} WHERE id = {ph}", (claimed, new_id))
+            return new_id, claimed or location
+
+        occupancy_row = {
+            "date": date,
+            "nights": nights,
+            "rooms": rooms,
+            "people": people,
+            "reservation_type": reservation_type,
+            "time": time,
+            "location": location,
+            "status": status,
+        }
+        attempts = CLAIM_RETRIES if claim else 1
+        for attempt in range(attempts):
+            try:
+                new_id, location = self._write(_insert)
+                break
+            except ReservationConflict as conflict:
+                if conflict.retry and attempt + 1 < attempts:
+                    continue
+                raise self._conflict_alternatives(conflict, date, time, people, nights, rooms) from None
+        self._index.upsert(new_id, self._occupancy_entry({**occupancy_row, "id": new_id, "location": location}))
+        return new_id
 
-        return int(new_id)
+    def _conflict_alternatives(
+        self,
+        conflict: ReservationConflict,
+        date: str,
+        time: Optional[str],
+        people: int,
+        nights: Optional[int],
+        rooms: Optional[int],
+    ) -> ReservationConflict:
+        """Dopolni konflikt z naslednjo možnostjo planerja."""
+        # knjiga je videla pisanje, ki ga indeks tega procesa morda še nima
+        self._index.invalidate()
+        if conflict.kind == "room":
+            arrival = self._parse_date(date)
+            if arrival:
+                conflict.alternative = self.suggest_room_alternative(
+                    arrival, int(nights or 0), rooms or self._rooms_needed(people)
+                )
+        else:
+            conflict.suggestions = self.suggest_table_slots(date, people, limit=3)
+        return conflict
 
     def update_status(self, reservation_id: int, new_status: str) -> bool:
         """Posodobi status rezervacije. Vrne True če uspešno."""
         if new_status not in ("pending", "processing", "confirmed", "rejected", "cancelled"):
             return False
-        conn = self._conn()
         ph = self._placeholder()
         sql = f"UPDATE reservations SET status = {ph} WHERE id = {ph}"
-        try:
-            cur = conn.cursor()
+
+        def _update(cur) -> bool:
             cur.execute(sql, (new_status, reservation_id))
-            conn.commit()
-            return cur.rowcount > 0
-        finally:
-            cur.close()
-            conn.close()
+            updated = cur.rowcount > 0
+            if updated:
+                self._sync_claims(cur, reservation_id)
+            return updated
+
+        updated = self._write(_update)
+        if updated:
+            self._refresh_occupancy(reservation_id)
+        return updated
 
     def get_reservation(self, reservation_id: int) -> Optional[Dict[str, Any]]:
+        uow = self._unit_of_work()
+        if uow is not None and ("reservation", reservation_id) in uow.cache:
+            cached = uow.cache[("reservation", reservation_id)]
+            return dict(cached) if cached else None
         conn = self._conn()
         try:
             cur = conn.cursor()
             cur.execute("SELECT * FROM reservations WHERE id = " + self._placeholder(), (reservation_id,))
             row = cur.fetchone()
-            return dict(row) if row else None
+            result = dict(row) if row else None
         finally:
             cur.close()
             conn.close()
+        if uow is not None:
+            uow.cache[("reservation", reservation_id)] = result
+        return dict(result) if result else None
 
     def read_reservations(
         self,
@@ -792,26 +829,32 @@ class ReservationService:
         status: Optional[str] = None,
         reservation_type: Optional[str] = None,
         source: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        include_undated: bool = False,
+        cursor: Optional[str] = None,
+        fields: Optional[list[str]] = None,
     ) -> list[Dict[str, Any]]:
+        """Rezervacije s filtri; date_from/date_to (ISO) izberejo bivanja, ki prekrivajo obdobje.
+
+        include_undated obdrži tudi vrstice z neprepoznanim datumom (start_date IS NULL).
+        cursor/fields: keyset stran in izbrani stolpci (app/services/pagination.py).
+        """
+        ph = self._placeholder()
+        conditions, params = self._reservation_filters(
+            status, reservation_type, source, date_from, date_to, include_undated
+        )
+        keyset, keyset_params = keyset_clause(cursor, ph)
+        if keyset:
+            conditions.append(keyset)
+            params.extend(keyset_params)
         conn = self._conn()
         try:
             cur = conn.cursor()
-            sql = "SELECT * FROM reservations"
-            params: list[Any] = []
-            conditions: list[str] = []
-            ph = self._placeholder()
-            if status:
-                conditions.append(f"status = {ph}")
-                params.append(status)
-            if reservation_type:
-                conditions.append(f"reservation_type = {ph}")
-                params.append(reservation_type)
-            if source:
-                conditions.append(f"source = {ph}")
-                params.append(source)
+            sql = f"SELECT {', '.join(fields) if fields else '*'} FROM reservations"
             if conditions:
                 sql += " WHERE " + " AND ".join(conditions)
-            sql += " ORDER BY created_at DESC LIMIT " + str(int(limit))
+            sql += " ORDER BY created_at DESC, id DESC LIMIT " + str(int(limit))
             cur.execute(sql, tuple(params))
             rows = cur.fetchall()
             return [dict(row) for row in rows]
@@ -819,6 +862,78 @@ class ReservationService:
             cur.close()
             conn.close()
 
+    def _reservation_filters(
+        self,
+        status: Optional[str] = None,
+        reservation_type: Optional[str] = None,
+        source: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        include_undated: bool = False,
+    ) -> tuple[list[str], list[Any]]:
+        """WHERE pogoji in parametri za filtre seznama/izvoza rezervacij."""
+        ph = self._placeholder()
+        params: list[Any] = []
+        conditions: list[str] = []
+        if status:
+            conditions.append(f"status = {ph}")
+            params.append(status)
+        if reservation_type:
+            conditions.append(f"reservation_type = {ph}")
+            params.append(reservation_type)
+        if source:
+            conditions.append(f"source = {ph}")
+            params.append(source)
+        if date_from or date_to:
+            overlap: list[str] = []
+            if date_from:
+                overlap.append(f"end_date >= {ph}")
+                params.append(date_from)
+            if date_to:
+                overlap.append(f"start_date <= {ph}")
+                params.append(date_to)
+            predicate = " AND ".join(overlap)
+            if include_undated:
+                predicate = f"(start_date IS NULL OR ({predicate}))"
+            conditions.append(predicate)
+        return conditions, params
+
+    def iter_query(self, sql: str, params: tuple = (), chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[dict]:
+        """Pretočno branje: strežniški (named) kurzor na Postgresu, fetchmany na SQLite.
+
+        Povezava ostane odprta, dokler generator ni izčrpan ali zaprt. Je lastna
+        (ne povezava enote dela) in brez check_same_thread: StreamingResponse
+        kliče next() iz različnih niti bazena (iterate_in_threadpool).
+        """
+        conn = self._connect(shared=True)
+        try:
+            if self.use_postgres:
+                cur = conn.cursor(name=f"export_{uuid.uuid4().hex[:12]}")
+                cur.itersize = chunk_rows
+            else:
+                cur = conn.cursor()
+            try:
+                cur.execute(sql, params)
+                while True:
+                    rows = cur.fetchmany(chunk_rows)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield dict(row)
+            finally:
+                cur.close()
+        finally:
+            conn.close()
+
+    def iter_export(self, dataset: str, **filters: Any) -> Iterator[dict]:
+        """Vse vrstice podatkovnega niza (EXPORT_DATASETS) po id; filtri le za rezervacije."""
+        table, columns = EXPORT_DATASETS[dataset]
+        conditions, params = self._reservation_filters(**filters) if dataset == "reservations" else ([], [])
+        sql = f"SELECT {', '.join(columns)} FROM {table}"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        return self.iter_query(sql + " ORDER BY id", tuple(params))
+
     def update_reservation(self, reservation_id: int, **fields: Any) -> bool:
         """Posodobi poljubna polja rezervacije (le tista, ki niso None)."""
         allowed_fields = {
@@ -852,31 +967,43 @@ class ReservationService:
         set_parts = [f"{k} = {ph}" for k in updates.keys()]
         params = list(updates.values())
         params.append(reservation_id)
-        conn = self._conn()
-        try:
-            cur = conn.cursor()
-            sql = f"UPDATE reservations SET {', '.join(set_parts)} WHERE id = {ph}"
+        sql = f"UPDATE reservations SET {', '.join(set_parts)} WHERE id = {ph}"
+        stay_changed = "date" in updates or "nights" in updates
+        claims_changed = bool(set(updates) & _CLAIM_FIELDS)
+
+        def _update(cur) -> bool:
             cur.execute(sql, tuple(params))
-            conn.commit()
-            return cur.rowcount > 0
-        finally:
-            cur.close()
-            conn.close()
+            updated = cur.rowcount > 0
+            if updated and stay_changed:
+                cur.execute(f"SELECT date, nights FROM reservations WHERE id = {ph}", (reservation_id,))
+                row = cur.fetchone()
+                cur.execute(
+                    f"UPDATE reservations SET start_date = {ph}, end_date = {ph} WHERE id = {ph}",
+                    (*self._stay_range(row["date"], row["nights"]), reservation_id),
+                )
+            if updated and claims_changed:
+                self._sync_claims(cur, reservation_id)
+            return updated
+
+        updated = self._write(_update)
+        if updated:
+            self._refresh_occupancy(reservation_id)
+        return updated
 
     def delete_all_reservations(self) -> int:
         """Izbriše VSE rezervacije - za reset baze."""
-        conn = self._conn()
-        try:
-            cur = conn.cursor()
+
+        def _delete(cur) -> int:
             cur.execute("SELECT COUNT(*) as cnt FROM reservations")
             row = cur.fetchone()
             count = row["cnt"] if isinstance(row, dict) else row[0]
             cur.execute("DELETE FROM reservations")
-            conn.commit()
+            occupancy_ledger.clear(cur)
             return count
-        finally:
-            cur.close()
-            conn.close()
+
+        count = self._write(_delete)
+        self._index.invalidate()
+        return count
 
     def _fetch_reservations(self) -> list[ReservationRecord]:
         records: list[ReservationRecord] = []
@@ -963,68 +1090,37 @@ class ReservationService:
         """Ustvari CSV backup iz SQLite in vrne pot do datoteke."""
         today_str = datetime.now().strftime("%Y%m%d")
         backup_path = os.path.join(self.backup_dir, f"reservations-{today_str}.csv")
-        rows = self.read_reservations()
-        with open(backup_path, mode="w", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow(
-                [
-                    "id",
-                    "date",
-                    "nights",
-                    "rooms",
-                    "people",
-                    "reservation_type",
-                    "time",
-                    "location",
-                    "name",
-                    "phone",
-                    "email",
-                    "note",
-                    "status",
-                    "created_at",
-                    "source",
-                    "admin_notes",
-                    "confirmed_at",
-                    "confirmed_by",
-                    "guest_message",
-                    "country",
-                    "kids",
-                    "kids_small",
-                    "confirm_via",
-                    "event_type",
-                    "special_needs",
-                ]
-            )
-            for row in rows:
-                writer.writerow(
-                    [
-                        row.get("id", ""),
-                        row.get("date", ""),
-                        row.get("nights", ""),
-                        row.get("rooms", ""),
-                        row.get("people", ""),
-                        row.get("reservation_type", ""),
-                        row.get("time", ""),
-                        row.get("location", ""),
-                        row.get("name", ""),
-                        row.get("phone", ""),
-                        row.get("email", ""),
-                        row.get("note", ""),
-                        row.get("status", ""),
-                        row.get("created_at", ""),
-                        row.get("source", ""),
-                        row.get("admin_notes", ""),
-                        row.get("confirmed_at", ""),
-                        row.get("confirmed_by", ""),
-                        row.get("guest_message", ""),
-                        row.get("country", ""),
-                        row.get("kids", ""),
-                        row.get("kids_small", ""),
-                        row.get("confirm_via", ""),
-                        row.get("event_type", ""),
-                        row.get("special_needs", ""),
-                    ]
-                )
+        columns = [
+            "id",
+            "date",
+            "nights",
+            "rooms",
+            "people",
+            "reservation_type",
+            "time",
+            "location",
+            "name",
+            "phone",
+            "email",
+            "note",
+            "status",
+            "created_at",
+            "source",
+            "admin_notes",
+            "confirmed_at",
+            "confirmed_by",
+            "guest_message",
+            "country",
+            "kids",
+            "kids_small",
+            "confirm_via",
+            "event_type",
+            "special_needs",
+        ]
+        rows = self.iter_query(f"SELECT {', '.join(columns)} FROM reservations ORDER BY id")
+        with open(backup_path, mode="wb") as f:
+            for chunk in csv_chunks(rows, columns):
+                f.write(chunk)
         return backup_path
 
     # --- conversation logging -------------------------------------------
@@ -1036,44 +1132,80 @@ class ReservationService:
         intent: Optional[str] = None,
         needs_followup: bool = False,
         followup_email: Optional[str] = None,
+        defer: bool = False,
     ) -> Optional[int]:
-        """Shrani pogovor v bazo in vrne ID vrstice."""
+        """Shrani pogovor v bazo in vrne ID vrstice.
+
+        defer=True: vrstica gre v vrsto za odloženo pisanje (brez čakanja na bazo),
+        vrne None.
+        """
         created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        ph = self._placeholder()
-        conn = self._conn()
-        conv_id: Optional[int] = None
-        try:
-            cur = conn.cursor()
-            sql = (
-                "INSERT INTO conversations (session_id, user_message, bot_response, intent, needs_followup, followup_email, created_at) "
-                f"VALUES ({ph}, {ph}, {ph}, {ph}, {ph}, {ph}, {ph})"
+        if defer:
+            self.conversation_log().enqueue(
+                (session_id, user_message, bot_response, intent, needs_followup, followup_email, created_at)
             )
-            params = (session_id, user_message, bot_response, intent, needs_followup, followup_email, created_at)
-            if self.use_postgres:
-                sql += " RETURNING id"
+            return None
+        sql = self._conversation_insert_sql()
+        params = (session_id, user_message, bot_response, intent, needs_followup, followup_email, created_at)
+        if self.use_postgres:
+            sql += " RETURNING id"
+
+        def _insert(cur) -> Optional[int]:
             cur.execute(sql, params)
             if self.use_postgres:
                 fetched = cur.fetchone()
-                if fetched:
-                    conv_id = fetched["id"] if isinstance(fetched, dict) else fetched[0]
+                row_id = (fetched["id"] if isinstance(fetched, dict) else fetched[0]) if fetched else None
             else:
-                conv_id = cur.lastrowid
-            conn.commit()
-        finally:
-            cur.close()
-            conn.close()
-        return conv_id
+                row_id = cur.lastrowid
+            analytics_rollup.fold_new(cur, "postgres" if self.use_postgres else "sqlite", [params])
+            return row_id
+
+        return self._write(_insert)
+
+    def insert_conversations(self, rows: list[tuple]) -> None:
+        """Zapiše več pogovorov naenkrat (executemany, ena transakcija)."""
+        if not rows:
+            return
+        sql = self._conversation_insert_sql()
+
+        def _insert(cur) -> None:
+            cur.executemany(sql, rows)
+            analytics_rollup.fold_new(cur, "postgres" if self.use_postgres else "sqlite", rows)
+
+        self._write(_insert)
+
+    def _conversation_insert_sql(self) -> str:
+        # povzetki se prištejejo v isti transakciji (analytics_rollup.fold_new)
+        ph = self._placeholder()
+        return (
+            "INSERT INTO conversations (session_id, user_message, bot_response, intent, needs_followup, followup_email, "
+            f"created_at, rolled_up) VALUES ({ph}, {ph}, {ph}, {ph}, {ph}, {ph}, {ph}, TRUE)"
+        )
 
-    def get_conversations(self, limit: int = 100, needs_followup_only: bool = False) -> list[dict]:
+    def conversation_log(self) -> ConversationLogQueue:
+        """Vrsta za odloženo beleženje pogovorov (ena na bazo)."""
+        return get_conversation_log(self.storage.key, self.insert_conversations, self.conversation_spill_path)
+
+    def get_conversations(
+        self,
+        limit: int = 100,
+        needs_followup_only: bool = False,
+        cursor: Optional[str] = None,
+        fields: Optional[list[str]] = None,
+    ) -> list[dict]:
         """Vrne zadnje pogovore, opcijsko filtrirane po potrebi po followupu."""
+        keyset, params = keyset_clause(cursor, self._placeholder())
         conn = self._conn()
         try:
             cur = conn.cursor()
-            sql = "SELECT * FROM conversations"
-            if needs_followup_only:
-                sql += " WHERE needs_followup = TRUE"
-            sql += " ORDER BY created_at DESC LIMIT " + str(limit)
-            cur.execute(sql)
+            sql = f"SELECT {', '.join(fields) if fields else '*'} FROM conversations"
+            conditions = ["needs_followup = TRUE"] if needs_followup_only else []
+            if keyset:
+                conditions.append(keyset)
+            if conditions:
+                sql += " WHERE " + " AND ".join(conditions)
+            sql += " ORDER BY created_at DESC, id DESC LIMIT " + str(int(limit))
+            cur.execute(sql, params)
             rows = cur.fetchall()
             return [dict(row) for row in rows]
         finally:
@@ -1081,193 +1213,231 @@ class ReservationService:
             conn.close()
 
     def get_conversations_by_session(self, session_id: str, limit: int = 200) -> list[dict]:
-        """Vrne pogovor po session_id."""
+        """Vrne pogovor po session_id (starejši del iz conversations_archive, če je arhiviran)."""
         conn = self._conn()
         ph = self._placeholder()
         try:
             cur = conn.cursor()
             sql = f"SELECT * FROM conversations WHERE session_id = {ph} ORDER BY created_at ASC LIMIT {limit}"
             cur.execute(sql, (session_id,))
-            rows = cur.fetchall()
-            return [dict(row) for row in rows]
+            rows = [dict(row) for row in cur.fetchall()]
+            if len(rows) < limit:
+                # arhivirane vrstice so vedno starejše od vročih, zato gredo na začetek
+                cur.execute(
+                    f"SELECT * FROM conversations_archive WHERE session_id = {ph} "
+                    f"ORDER BY created_at DESC LIMIT {limit - len(rows)}",
+                    (session_id,),
+                )
+                archived = [dict(row) for row in cur.fetchall()]
+                rows = archived[::-1] + rows
+            return rows
         finally:
             cur.close()
             conn.close()
 
-    def update_followup_email(self, conversation_id: int, email: str) -> bool:
-        """Posodobi email za followup pogovor."""
+    def archive_conversations(self, older_than_days: Optional[int] = None, batch: int = CONV_ARCHIVE_BATCH) -> int:
+        """Premakne pogovore starejše od horizonta v conversations_archive; vrne število vrstic.
+
+        Premikajo se le vrstice, ki so že v povzetkih (analytics_rollup), po
+        paketih v svojih transakcijah, da pisanje novih pogovorov ne čaka dolgo.
+        """
+        days = CONV_ARCHIVE_DAYS if older_than_days is None else older_than_days
+        if days <= 0:
+            return 0
+        self.refresh_analytics()
+        cutoff = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+        ph = self._placeholder()
+        columns = "id, session_id, user_message, bot_response, intent, needs_followup, followup_email, created_at"
+        eligible = f"created_at < {ph} AND rolled_up = TRUE"
+
+        def _move(cur) -> int:
+            cur.execute(f"SELECT id FROM conversations WHERE {eligible} ORDER BY id LIMIT {ph}", (cutoff, batch))
+            ids = [row["id"] if isinstance(row, dict) else row[0] for row in cur.fetchall()]
+            if not ids:
+                return 0
+            params = (cutoff, ids[0], ids[-1])
+            cur.execute(
+                f"INSERT INTO conversations_archive ({columns}) SELECT {columns} FROM conversations "
+                f"WHERE {eligible} AND id BETWEEN {ph} AND {ph} ON CONFLICT (id) DO NOTHING",
+                params,
+            )
+            cur.execute(f"DELETE FROM conversations WHERE {eligible} AND id BETWEEN {ph} AND {ph}", params)
+            return len(ids)
+
+        total = 0
+        while True:
+            moved = self._write(_move)
+            total += moved
+            if moved < batch:
+                return total
+
+    def search(
+        self,
+        query: str,
+        scope: str = "conversations",
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+    ) -> list[dict]:
+        """Polnotekstovno iskanje (app/services/search_index.py), od najnovejšega zadetka.
+
+        date_from/date_to sta ISO datuma (vključno); cursor iz pagination.next_cursor.
+        """
+        tokens = query_tokens(query)
+        if not tokens:
+            return []
         ph = self._placeholder()
+        base_conditions: list[str] = []
+        base_params: list[Any] = []
+        if date_from:
+            base_conditions.append(f"t.created_at >= {ph}")
+            base_params.append(date_from)
+        if date_to:
+            base_conditions.append(f"t.created_at < {ph}")
+            base_params.append((datetime.strptime(date_to, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d"))
+        keyset, keyset_params = keyset_clause(cursor, ph)
+        if keyset:
+            base_conditions.append(keyset.replace("(created_at, id)", "(t.created_at, t.id)"))
+            base_params.extend(keyset_params)
+
+        results: list[dict] = []
         conn = self._conn()
         try:
             cur = conn.cursor()
-            cur.execute(f"UPDATE conversations SET followup_email = {ph} WHERE id = {ph}", (email, conversation_id))
-            conn.commit()
-            return True
+            for source in SEARCH_SCOPES[scope]:
+                meta = ", ".join(f"t.{col}" for col in source.meta)
+                if self.use_postgres:
+                    text = " || ' ' || ".join(f"coalesce(t.{col}, '')" for col in source.columns)
+                    sql = (
+                        f"SELECT t.id, t.created_at, {meta}, ts_headline('simple', {text}, to_tsquery('simple', {ph}), "
+                        f"'StartSel={SNIPPET_START}, StopSel={SNIPPET_END}, MaxWords=24, MinWords=8') AS snippet "
+                        f"FROM {source.table} t WHERE {pg_document(source.columns, 't')} @@ to_tsquery('simple', {ph})"
+                    )
+                    params: list[Any] = [ts_query(tokens), ts_query(tokens)]
+                else:
+                    sql = (
+                        f"SELECT t.id, t.created_at, {meta}, "
+                        f"snippet({source.fts_table}, -1, '{SNIPPET_START}', '{SNIPPET_END}', '…', 16) AS snippet "
+                        f"FROM {source.fts_table} JOIN {source.table} t ON t.id = {source.fts_table}.rowid "
+                        f"WHERE {source.fts_table} MATCH {ph}"
+                    )
+                    params = [fts_match(tokens)]
+                for condition in base_conditions:
+                    sql += f" AND {condition}"
+                sql += f" ORDER BY t.created_at DESC, t.id DESC LIMIT {int(limit)}"
+                cur.execute(sql, (*params, *base_params))
+                results.extend({"source": source.table, **dict(row)} for row in cur.fetchall())
         finally:
             cur.close()
             conn.close()
+        results.sort(key=lambda row: (str(row["created_at"]), row["id"]), reverse=True)
+        return results[:limit]
 
-    def get_top_questions(self, limit: int = 10) -> list[dict]:
-        """Vrne najpogostejša vprašanja."""
-        def is_noise(text: str) -> bool:
-            if not text:
-                return True
-            cleaned = text.strip()
-            lowered = cleaned.lower()
-            if len(lowered) < 4:
-                return True
-            if lowered in {"da", "ne", "ja", "ok", "okej", "hvala", "super"}:
-                return True
-            # izloči vprašanja, povezana z rezervacijami
-            if re.search(r"(rezerv|booking|reserve|soba|miza|nočitev|nocit|room|table)", lowered):
-                return True
-            if "@" in cleaned:
-                return True
-            if re.search(r"[a-z0-9._%+-]+@[a-z0-9.-]+\.[a-z]{2,}", lowered):
-                return True
-            if re.search(r"\d{7,}", cleaned.replace(" ", "")):
-                return True
-            if re.fullmatch(r"[\d\s./-]+", cleaned):
-                return True
-            if re.search(r"\d{1,2}\.\d{1,2}\.\d{2,4}", cleaned):
-                return True
-            return False
+    def update_followup_email(self, conversation_id: int, email: str) -> bool:
+        """Posodobi email za followup pogovor."""
+        ph = self._placeholder()
+        self._write(
+            lambda cur: cur.execute(
+                f"UPDATE conversations SET followup_email = {ph} WHERE id = {ph}", (email, conversation_id)
+            )
+        )
+        return True
+
+    def refresh_analytics(self) -> int:
+        """Povzame pogovore, zapisane mimo log_conversation (analytics_rollup); vrne število vrstic.
 
+        Kliče ga scheduler in arhiviranje. Če takih vrstic ni, je to ena poizvedba brez pisanja.
+        """
+        dialect = "postgres" if self.use_postgres else "sqlite"
         conn = self._conn()
-        ph = self._placeholder()
         try:
             cur = conn.cursor()
-            sql = (
-                "SELECT user_message, COUNT(*) as count "
-                "FROM conversations "
-                "GROUP BY user_message "
-                "ORDER BY count DESC "
-                f"LIMIT {ph}"
-            )
-            cur.execute(sql, (max(limit * 10, 200),))
-            rows = cur.fetchall()
-            filtered = []
-            for row in rows:
-                item = dict(row)
-                if is_noise(item.get("user_message", "")):
-                    continue
-                filtered.append(item)
-                if len(filtered) >= limit:
-                    break
-            return filtered
+            cur.execute("SELECT id FROM conversations WHERE rolled_up = FALSE LIMIT 1")
+            pending = cur.fetchone()
         finally:
             cur.close()
             conn.close()
-
-    def get_lost_intents(self, limit: int = 10) -> list[dict]:
-        """Vrne najpogostejša vprašanja, kjer je sistem potreboval follow-up."""
-        def is_noise(text: str) -> bool:
-            if not text:
-                return True
-            cleaned = text.strip()
-            lowered = cleaned.lower()
-            if len(lowered) < 4:
-                return True
-            if lowered in {"da", "ne", "ja", "ok", "okej", "hvala", "super"}:
-                return True
-            if "@" in cleaned:
-                return True
-            if re.search(r"[a-z0-9._%+-]+@[a-z0-9.-]+\.[a-z]{2,}", lowered):
-                return True
-            if re.search(r"\d{7,}", cleaned.replace(" ", "")):
-                return True
-            if re.fullmatch(r"[\d\s./-]+", cleaned):
-                return True
-            if re.search(r"\d{1,2}\.\d{1,2}\.\d{2,4}", cleaned):
-                return True
-            return False
-
+        if not pending:
+            return 0
+        total = 0
+        while True:
+            processed = self._write(lambda cur: analytics_rollup.apply_pending(cur, dialect))
+            total += processed
+            if processed < analytics_rollup.ANALYTICS_ROLLUP_BATCH:
+                return total
+
+    def _read_rollup(self, sql: str, params: tuple = ()) -> list[dict]:
+        # povzetki so sveži ob zapisu pogovora; branje plošče ne piše
         conn = self._conn()
-        ph = self._placeholder()
         try:
             cur = conn.cursor()
-            if self.use_postgres:
-                sql = (
-                    "SELECT user_message, COUNT(*) as count "
-                    "FROM conversations "
-                    "WHERE needs_followup = TRUE "
-                    "GROUP BY user_message "
-                    "ORDER BY count DESC "
-                    f"LIMIT {ph}"
-                )
-            else:
-                sql = (
-                    "SELECT user_message, COUNT(*) as count "
-                    "FROM conversations "
-                    "WHERE needs_followup = 1 "
-                    "GROUP BY user_message "
-                    "ORDER BY count DESC "
-                    f"LIMIT {ph}"
-                )
-            cur.execute(sql, (max(limit * 10, 200),))
-            rows = cur.fetchall()
-            filtered = []
-            for row in rows:
-                item = dict(row)
-                if is_noise(item.get("user_message", "")):
-                    continue
-                filtered.append(item)
-                if len(filtered) >= limit:
-                    break
-            return filtered
+            cur.execute(sql, params)
+            return [dict(row) for row in cur.fetchall()]
         finally:
             cur.close()
             conn.close()
 
-    def get_funnel_stats(self, days: int = 30) -> dict:
-        """Vrne osnovni funnel za rezervacije v zadnjih N dneh."""
-        days = max(1, int(days or 30))
-        cutoff = (datetime.now() - timedelta(days=days)).isoformat(timespec="seconds")
-        conn = self._conn()
+    def get_top_questions(self, limit: int = 10) -> list[dict]:
+        """Vrne najpogostejša vprašanja (brez šuma in vprašanj o rezervacijah)."""
         ph = self._placeholder()
-        try:
-            cur = conn.cursor()
-            base_where = f"created_at >= {ph}"
-            params = (cutoff,)
-            cur.execute(
-                f"SELECT COUNT(DISTINCT session_id) as count FROM conversations "
-                f"WHERE session_id IS NOT NULL AND session_id != '' AND {base_where}",
-                params,
-            )
-            total_sessions = cur.fetchone()
-            total = list(total_sessions.values())[0] if isinstance(total_sessions, dict) else total_sessions[0]
+        rows = self._read_rollup(
+            "SELECT user_message, SUM(total) AS count FROM conv_daily_questions "
+            "WHERE booking = 0 GROUP BY user_message "
+            f"ORDER BY count DESC, user_message LIMIT {ph}",
+            (limit,),
+        )
+        return [{"user_message": row["user_message"], "count": int(row["count"])} for row in rows]
 
-            cur.execute(
-                f"SELECT COUNT(DISTINCT session_id) as count FROM conversations "
-                f"WHERE session_id IS NOT NULL AND session_id != '' AND {base_where} "
-                "AND intent LIKE 'reservation%' AND intent NOT IN ('reservation_completed','reservation_cancel')",
-                params,
-            )
-            started_row = cur.fetchone()
-            started = list(started_row.values())[0] if isinstance(started_row, dict) else started_row[0]
+    def get_lost_intents(self, limit: int = 10) -> list[dict]:
+        """Vrne najpogostejša vprašanja, kjer je sistem potreboval follow-up."""
+        ph = self._placeholder()
+        rows = self._read_rollup(
+            "SELECT user_message, SUM(followups) AS count FROM conv_daily_questions "
+            "GROUP BY user_message HAVING SUM(followups) > 0 "
+            f"ORDER BY count DESC, user_message LIMIT {ph}",
+            (limit,),
+        )
+        return [{"user_message": row["user_message"], "count": int(row["count"])} for row in rows]
 
-            cur.execute(
-                f"SELECT COUNT(DISTINCT session_id) as count FROM conversations "
-                f"WHERE session_id IS NOT NULL AND session_id != '' AND {base_where} "
-                "AND intent = 'reservation_completed'",
-                params,
-            )
-            completed_row = cur.fetchone()
-            completed = list(completed_row.values())[0] if isinstance(completed_row, dict) else completed_row[0]
-
-            start_rate = round((started / total) * 100, 1) if total else 0.0
-            completion_rate = round((completed / started) * 100, 1) if started else 0.0
-            return {
-                "days": days,
-                "total_sessions": int(total or 0),
-                "reservation_started": int(started or 0),
-                "reservation_completed": int(completed or 0),
-                "start_rate_pct": start_rate,
-                "completion_rate_pct": completion_rate,
-            }
-        finally:
-            cur.close()
-            conn.close()
+    def get_intent_stats(self, days: int = 30) -> list[dict]:
+        """Vrne število sporočil po intentu v zadnjih N dneh."""
+        days = max(1, int(days or 30))
+        cutoff = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+        ph = self._placeholder()
+        rows = self._read_rollup(
+            f"SELECT intent, SUM(count) AS count FROM conv_daily_intents WHERE day >= {ph} "
+            "GROUP BY intent ORDER BY count DESC, intent",
+            (cutoff,),
+        )
+        return [{"intent": row["intent"] or None, "count": int(row["count"])} for row in rows]
+
+    def get_funnel_stats(self, days: int = 30) -> dict:
+        """Vrne osnovni funnel za rezervacije v zadnjih N dneh (po koledarskih dneh)."""
+        days = max(1, int(days or 30))
+        cutoff = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+        ph = self._placeholder()
+        rows = self._read_rollup(
+            "SELECT COUNT(DISTINCT session_id) AS total, "
+            "COUNT(DISTINCT CASE WHEN started = 1 THEN session_id END) AS started, "
+            "COUNT(DISTINCT CASE WHEN completed = 1 THEN session_id END) AS completed "
+            f"FROM conv_session_days WHERE day >= {ph}",
+            (cutoff,),
+        )
+        row = rows[0] if rows else {}
+        total = int(row.get("total") or 0)
+        started = int(row.get("started") or 0)
+        completed = int(row.get("completed") or 0)
+        start_rate = round((started / total) * 100, 1) if total else 0.0
+        completion_rate = round((completed / started) * 100, 1) if started else 0.0
+        return {
+            "days": days,
+            "total_sessions": total,
+            "reservation_started": started,
+            "reservation_completed": completed,
+            "start_rate_pct": start_rate,
+            "completion_rate_pct": completion_rate,
+        }
 
     def create_knowledge_feedback(self, question: str, suggestion: str) -> Optional[int]:
         """Zabeleži predlog za izboljšavo baze znanja."""
@@ -1275,29 +1445,25 @@ class ReservationService:
             return None
         created_at = datetime.now().isoformat(timespec="seconds")
         ph = self._placeholder()
-        conn = self._conn()
-        feedback_id: Optional[int] = None
-        try:
-            cur = conn.cursor()
-            sql = (
-                "INSERT INTO knowledge_feedback (question, suggestion, status, created_at) "
-                f"VALUES ({ph}, {ph}, {ph}, {ph})"
-            )
-            params = (question, suggestion, "new", created_at)
-            if self.use_postgres:
-                sql += " RETURNING id"
+        sql = (
+            "INSERT INTO knowledge_feedback (question, suggestion, status, created_at) "
+            f"VALUES ({ph}, {ph}, {ph}, {ph})"
+        )
+        params = (question, suggestion, "new", created_at)
+        if self.use_postgres:
+            sql += " RETURNING id"
+
+        def _insert(cur) -> Optional[int]:
             cur.execute(sql, params)
             if self.use_postgres:
                 fetched = cur.fetchone()
                 if fetched:
-                    feedback_id = fetched["id"] if isinstance(fetched, dict) else fetched[0]
-            else:
-                feedback_id = cur.lastrowid
-            conn.commit()
-            return int(feedback_id) if feedback_id is not None else None
-        finally:
-            cur.close()
-            conn.close()
+                    return fetched["id"] if isinstance(fetched, dict) else fetched[0]
+                return None
+            return cur.lastrowid
+
+        feedback_id = self._write(_insert)
+        return int(feedback_id) if feedback_id is not None else None
 
     # --- inquiries -------------------------------------------
     def create_inquiry(
@@ -1314,51 +1480,59 @@ class ReservationService:
     ) -> Optional[int]:
         created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         ph = self._placeholder()
-        conn = self._conn()
-        inquiry_id: Optional[int] = None
-        try:
-            cur = conn.cursor()
-            sql = (
-                "INSERT INTO inquiries (session_id, details, deadline, contact_name, contact_email, contact_phone, contact_raw, status, created_at, source) "
-                f"VALUES ({ph}, {ph}, {ph}, {ph}, {ph}, {ph}, {ph}, {ph}, {ph}, {ph})"
-            )
-            params = (
-                session_id,
-                details,
-                deadline,
-                contact_name,
-                contact_email,
-                contact_phone,
-                contact_raw,
-                status,
-                created_at,
-                source,
-            )
-            if self.use_postgres:
-                sql += " RETURNING id"
+        sql = (
+            "INSERT INTO inquiries (session_id, details, deadline, contact_name, contact_email, contact_phone, contact_raw, status, created_at, source) "
+            f"VALUES ({ph}, {ph}, {ph}, {ph}, {ph}, {ph}, {ph}, {ph}, {ph}, {ph})"
+        )
+        params = (
+            session_id,
+            details,
+            deadline,
+            contact_name,
+            contact_email,
+            contact_phone,
+            contact_raw,
+            status,
+            created_at,
+            source,
+        )
+        if self.use_postgres:
+            sql += " RETURNING id"
+
+        def _insert(cur) -> Optional[int]:
             cur.execute(sql, params)
             if self.use_postgres:
                 fetched = cur.fetchone()
                 if fetched:
-                    inquiry_id = fetched["id"] if isinstance(fetched, dict) else fetched[0]
-            else:
-                inquiry_id = cur.lastrowid
-            conn.commit()
-        finally:
-            cur.close()
-            conn.close()
-        return inquiry_id
+                    return fetched["id"] if isinstance(fetched, dict) else fetched[0]
+                return None
+            return cur.lastrowid
 
-    def get_inquiries(self, limit: int = 200, status: Optional[str] = None) -> list[dict]:
+        return self._write(_insert)
+
+    def get_inquiries(
+        self,
+        limit: int = 200,
+        status: Optional[str] = None,
+        cursor: Optional[str] = None,
+        fields: Optional[list[str]] = None,
+    ) -> list[dict]:
+        keyset, keyset_params = keyset_clause(cursor, self._placeholder())
         conn = self._conn()
         try:
             cur = conn.cursor()
-            sql = "SELECT * FROM inquiries"
-            params = []
+            sql = f"SELECT {', '.join(fields) if fields else '*'} FROM inquiries"
+            params: list[Any] = []
+            conditions: list[str] = []
             if status:
-                sql += " WHERE status = " + self._placeholder()
+                conditions.append("status = " + self._placeholder())
                 params.append(status)
-            sql += " ORDER BY created_at DESC LIMIT " + str(limit)
+            if keyset:
+                conditions.append(keyset)
+                params.extend(keyset_params)
+            if conditions:
+                sql += " WHERE " + " AND ".join(conditions)
+            sql += " ORDER BY created_at DESC, id DESC LIMIT " + str(int(limit))
             cur.execute(sql, params)
             rows = cur.fetchall()
             return [dict(row) for row in rows]
@@ -1368,28 +1542,22 @@ class ReservationService:
 
     def get_usage_stats(self) -> dict:
         """Vrne unikatne session_id za danes/ta mesec/letos."""
-        conn = self._conn()
-        try:
-            cur = conn.cursor()
-            today_prefix = datetime.now().strftime("%Y-%m-%d")
-            month_prefix = datetime.now().strftime("%Y-%m")
-            year_prefix = datetime.now().strftime("%Y")
-            ph = self._placeholder()
-            sql_base = "SELECT DISTINCT session_id FROM conversations WHERE session_id IS NOT NULL AND session_id != '' AND created_at LIKE "
-            cur.execute(sql_base + ph, (today_prefix + "%",))
-            today_sessions = {row["session_id"] if isinstance(row, dict) else row[0] for row in cur.fetchall()}
-            cur.execute(sql_base + ph, (month_prefix + "%",))
-            month_sessions = {row["session_id"] if isinstance(row, dict) else row[0] for row in cur.fetchall()}
-            cur.execute(sql_base + ph, (year_prefix + "%",))
-            year_sessions = {row["session_id"] if isinstance(row, dict) else row[0] for row in cur.fetchall()}
-            return {
-                "today": len(today_sessions),
-                "month": len(month_sessions),
-                "year": len(year_sessions),
-            }
-        finally:
-            cur.close()
-            conn.close()
+        now = datetime.now()
+        ph = self._placeholder()
+        rows = self._read_rollup(
+            "SELECT "
+            f"COUNT(DISTINCT CASE WHEN day = {ph} THEN session_id END) AS today, "
+            f"COUNT(DISTINCT CASE WHEN day LIKE {ph} THEN session_id END) AS month, "
+            "COUNT(DISTINCT session_id) AS year "
+            f"FROM conv_session_days WHERE day LIKE {ph}",
+            (now.strftime("%Y-%m-%d"), now.strftime("%Y-%m") + "%", now.strftime("%Y") + "%"),
+        )
+        row = rows[0] if rows else {}
+        return {
+            "today": int(row.get("today") or 0),
+            "month": int(row.get("month") or 0),
+            "year": int(row.get("year") or 0),
+        }
 
     def add_reservation_message(
         self,
@@ -1403,35 +1571,28 @@ class ReservationService:
     ) -> bool:
         """Shrani sporočilo vezano na rezervacijo (inbound/outbound)."""
         created_at = datetime.now().isoformat()
-        conn = self._conn()
-        cur = conn.cursor()
+        ph = self._placeholder()
+        sql = (
+            "INSERT INTO reservation_messages "
+            "(reservation_id, direction, subject, body, from_email, to_email, message_id, created_at) "
+            f"VALUES ({ph}, {ph}, {ph}, {ph}, {ph}, {ph}, {ph}, {ph})"
+        )
+        params = (
+            reservation_id,
+            direction,
+            subject,
+            body,
+            from_email,
+            to_email,
+            message_id,
+            created_at,
+        )
         try:
-            ph = self._placeholder()
-            cur.execute(
-                (
-                    "INSERT INTO reservation_messages "
-                    "(reservation_id, direction, subject, body, from_email, to_email, message_id, created_at) "
-                    f"VALUES ({ph}, {ph}, {ph}, {ph}, {ph}, {ph}, {ph}, {ph})"
-                ),
-                (
-                    reservation_id,
-                    direction,
-                    subject,
-                    body,
-                    from_email,
-                    to_email,
-                    message_id,
-                    created_at,
-                ),
-            )
-            conn.commit()
+            self._write(lambda cur: cur.execute(sql, params))
             return True
         except Exception as exc:
             print(f"[IMAP] Napaka pri shranjevanju sporočila: {exc}")
             return False
-        finally:
-            cur.close()
-            conn.close()
 
     def list_reservation_messages(self, reservation_id: int) -> list[Dict[str, Any]]:
         """Vrne vsa sporočila za rezervacijo, urejena po času."""
@@ -1498,12 +1659,14 @@ class ReservationService:
                 cutoff = since
             else:
                 cutoff = (datetime.now() - timedelta(hours=hours)).strftime("%Y-%m-%d %H:%M:%S")
+            columns = "id, session_id, user_message, bot_response, intent, needs_followup, followup_email, created_at"
             sql = f"""
-                SELECT * FROM conversations
-                WHERE created_at >= {ph}
+                SELECT {columns} FROM conversations WHERE created_at >= {ph}
+                UNION ALL
+                SELECT {columns} FROM conversations_archive WHERE created_at >= {ph}
                 ORDER BY session_id, created_at ASC
             """
-            cur.execute(sql, (cutoff,))
+            cur.execute(sql, (cutoff, cutoff))
             rows = cur.fetchall()
             return [dict(row) for row in rows]
         finally:
@@ -1553,18 +1716,48 @@ class ReservationService:
 
     def save_report_time(self, report_type: str = "daily") -> None:
         """Shrani čas pošiljanja poročila."""
-        conn = self._conn()
         ph = self._placeholder()
+        now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         try:
-            cur = conn.cursor()
-            now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            cur.execute(
-                f"INSERT INTO report_log (report_type, sent_at) VALUES ({ph}, {ph})",
-                (report_type, now_str),
+            self._write(
+                lambda cur: cur.execute(
+                    f"INSERT INTO report_log (report_type, sent_at) VALUES ({ph}, {ph})",
+                    (report_type, now_str),
+                )
             )
-            conn.commit()
         except Exception:
             pass
-        finally:
-            cur.close()
-            conn.close()
+
+    def delete_all_conversations(self) -> tuple[int, int]:
+        """Pobriše VSE pogovore. Vrne (število pred, število po)."""
+
+        def _count(cur) -> int:
+            cur.execute("SELECT COUNT(*) as cnt FROM conversations")
+            row = cur.fetchone()
+            return row["cnt"] if isinstance(row, dict) else row[0]
+
+        def _delete(cur) -> tuple[int, int]:
+            before = _count(cur)
+            analytics_rollup.reset(cur)
+            cur.execute("DELETE FROM conversations")
+            cur.execute("DELETE FROM conversations_archive")
+            return before, _count(cur)
+
+        return self._write(_delete)
+
+
+_shared_service: Optional[ReservationService] = None
+_shared_service_lock = threading.Lock()
+
+
+def get_reservation_service() -> ReservationService:
+    """Skupna instanca za cel proces (shema, CSV uvoz in indeks se pripravijo enkrat).
+
+    Uporabna tudi kot FastAPI odvisnost: Depends(get_reservation_service).
+    """
+    global _shared_service
+    if _shared_service is None:
+        with _shared_service_lock:
+            if _shared_service is None:
+                _shared_service = ReservationService()
+    return _shared_service
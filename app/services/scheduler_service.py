@@ -6,6 +6,9 @@ Currently runs:
 - Hourly new-conversation alert at :02 (only if new convos exist)
 - Weekly table reservation reminder (Thursday 18:00)
 - Email draft generator (every hour)
+- Analytics rollup for the admin dashboard (every 5 minutes)
+- Compressed database backup with rotation (daily, BACKUP_TIME)
+- Archival of old conversations into conversations_archive (daily 04:15)
 """
 
 import os
@@ -76,8 +79,37 @@ def start_scheduler():
         replace_existing=True,
     )
 
+    # Povzetki pogovorov za admin ploščo - vsakih 5 minut
+    _scheduler.add_job(
+        func=_run_analytics_rollup,
+        trigger=CronTrigger(minute="*/5"),
+        id="analytics_rollup",
+        name="Analytics Rollup",
+        replace_existing=True,
+    )
+
+    # Varnostna kopija baze - dnevno (privzeto 03:30)
+    if os.getenv("BACKUP_ENABLED", "true").lower() == "true":
+        b_hour, b_minute = map(int, os.getenv("BACKUP_TIME", "03:30").split(":"))
+        _scheduler.add_job(
+            func=_run_backup,
+            trigger=CronTrigger(hour=b_hour, minute=b_minute),
+            id="database_backup",
+            name="Database Backup",
+            replace_existing=True,
+        )
+
+    # Arhiviranje starih pogovorov - dnevno ob 04:15
+    _scheduler.add_job(
+        func=_run_conversation_archive,
+        trigger=CronTrigger(hour=4, minute=15),
+        id="conversation_archive",
+        name="Conversation Archive",
+        replace_existing=True,
+    )
+
     _scheduler.start()
-    print("[SCHEDULER] Zagnan: dnevno ob 05:00, urno ob :02, tedenski reminder, draft generator")
+    print("[SCHEDULER] Zagnan: dnevno ob 05:00, urno ob :02, tedenski reminder, draft generator, povzetki, backup, arhiv")
 
 
 def stop_scheduler():
@@ -175,6 +207,43 @@ def _run_draft_generator():
         traceback.print_exc()
 
 
+def _run_analytics_rollup():
+    """Wrapper za inkrementalne povzetke pogovorov (analytics_rollup)."""
+    from app.services.reservation_service import get_reservation_service
+
+    try:
+        processed = get_reservation_service().refresh_analytics()
+        if processed:
+            print(f"[SCHEDULER] Povzetki pogovorov: {processed} novih vrstic")
+    except Exception as e:
+        print(f"[SCHEDULER] Napaka pri povzetkih pogovorov: {e}")
+
+
+def _run_backup():
+    """Wrapper za varnostno kopijo baze (backup_service)."""
+    from app.services.backup_service import run_scheduled_backup
+
+    print(f"[SCHEDULER] Zaganjalnik varnostne kopije: {datetime.now()}")
+    try:
+        manifest = run_scheduled_backup()
+        print(f"[SCHEDULER] Varnostna kopija {manifest['name']}, rotirano: {len(manifest['rotated'])}")
+    except Exception as e:
+        print(f"[SCHEDULER] Napaka pri varnostni kopiji: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+def _run_conversation_archive():
+    """Wrapper za arhiviranje starih pogovorov (CONV_ARCHIVE_DAYS)."""
+    from app.services.reservation_service import get_reservation_service
+
+    try:
+        moved = get_reservation_service().archive_conversations()
+        print(f"[SCHEDULER] Arhiviranih pogovorov: {moved}")
+    except Exception as e:
+        print(f"[SCHEDULER] Napaka pri arhiviranju pogovorov: {e}")
+
+
 def trigger_draft_generator_now():
     """
     Ročno sproži draft generator (za testiranje).
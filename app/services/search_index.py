@@ -0,0 +1,129 @@
+"""
+Polnotekstovno iskanje po pogovorih in sporočilih rezervacij.
+
+SQLite: FTS5 tabele z zunanjo vsebino (content=...) in tokenizerjem
+`unicode61 remove_diacritics 2` (č/š/ž/ć -> c/s/z/c), ki jih vzdržujejo
+prožilci ob INSERT/UPDATE/DELETE. Črka đ nima razcepa in je tokenizer ne
+poenostavi, zato jo prožilci v indeksiran tekst zapišejo kot d (ena črka za
+eno, položaji za snippet ostanejo enaki). Postgres: GIN indeks na izrazu
+to_tsvector('simple', normaliziran tekst), zato ni dodatnih stolpcev ne
+prožilcev; poizvedba uporabi isti izraz.
+
+Iskalni niz se razbije na besede (brez operatorjev), vsaka se išče kot
+predpona, vse morajo biti prisotne.
+"""
+
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import Any
+
+SNIPPET_START = "«"
+SNIPPET_END = "»"
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_PG_FROM = "čšžćđ"
+_PG_TO = "cszcd"
+
+
+@dataclass(frozen=True)
+class SearchSource:
+    table: str
+    fts_table: str
+    columns: tuple[str, ...]
+    meta: tuple[str, ...]
+
+
+# obseg iskanja -> viri (pogovori vključujejo arhiv; id-ji so skupni, zato je kurzor enoličen)
+SEARCH_SCOPES: dict[str, tuple[SearchSource, ...]] = {
+    "conversations": (
+        SearchSource("conversations", "conversations_fts", ("user_message", "bot_response"), ("session_id", "intent")),
+        SearchSource(
+            "conversations_archive", "conversations_archive_fts", ("user_message", "bot_response"), ("session_id", "intent")
+        ),
+    ),
+    "messages": (
+        SearchSource("reservation_messages", "reservation_messages_fts", ("subject", "body"), ("reservation_id", "direction")),
+    ),
+}
+
+
+def normalize(text: str) -> str:
+    """Male črke brez diakritike (ista pravila kot indeks)."""
+    lowered = (text or "").lower().replace("đ", "d")
+    return "".join(ch for ch in unicodedata.normalize("NFKD", lowered) if not unicodedata.combining(ch))
+
+
+def query_tokens(query: str) -> list[str]:
+    return _TOKEN_RE.findall(normalize(query))[:12]
+
+
+def fts_match(tokens: list[str]) -> str:
+    """FTS5 MATCH izraz: vsaka beseda kot predpona, med njimi AND."""
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def ts_query(tokens: list[str]) -> str:
+    """Postgres to_tsquery izraz z enako semantiko."""
+    return " & ".join(f"{token}:*" for token in tokens)
+
+
+def pg_document(columns: tuple[str, ...], alias: str = "") -> str:
+    """SQL izraz dokumenta za Postgres (mora se ujemati z indeksom)."""
+    prefix = f"{alias}." if alias else ""
+    joined = " || ' ' || ".join(f"coalesce({prefix}{col}, '')" for col in columns)
+    return f"to_tsvector('simple', translate(lower({joined}), '{_PG_FROM}', '{_PG_TO}'))"
+
+
+def _fts_values(prefix: str, columns: tuple[str, ...]) -> str:
+    """Vrednosti za FTS5 indeks (đ -> d kot v normalize)."""
+    return ", ".join(f"replace(replace({prefix}{col}, 'đ', 'd'), 'Đ', 'D')" for col in columns)
+
+
+def _sources() -> list[SearchSource]:
+    return list({source.table: source for scope in SEARCH_SCOPES.values() for source in scope}.values())
+
+
+def create_search_index(cur: Any, dialect: str) -> None:
+    """Korak migracije: FTS5 + prožilci (SQLite) oz. GIN indeksi (Postgres)."""
+    for source in _sources():
+        if dialect == "postgres":
+            cur.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_{source.table}_search "
+                f"ON {source.table} USING GIN ({pg_document(source.columns)})"
+            )
+            continue
+        cols = ", ".join(source.columns)
+        new_vals = _fts_values("new.", source.columns)
+        old_vals = _fts_values("old.", source.columns)
+        fts = source.fts_table
+        cur.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, content='{source.table}', "
+            "content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+        )
+        cur.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {source.table} BEGIN "
+            f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_vals}); END"
+        )
+        cur.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {source.table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_vals}); END"
+        )
+        cur.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {source.table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_vals}); "
+            f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_vals}); END"
+        )
+        # obstoječe vrstice ('rebuild' bi bral nenormaliziran tekst iz tabele)
+        cur.execute(f"INSERT INTO {fts}({fts}) VALUES ('delete-all')")
+        cur.execute(f"INSERT INTO {fts}(rowid, {cols}) SELECT id, {_fts_values('', source.columns)} FROM {source.table}")
+
+
+def rebuild_search_index(cur: Any, dialect: str) -> None:
+    """Korak migracije: prožilci z normalizacijo đ in ponovno indeksiranje (samo SQLite)."""
+    if dialect == "postgres":
+        return
+    for source in _sources():
+        for suffix in ("ai", "ad", "au"):
+            cur.execute(f"DROP TRIGGER IF EXISTS {source.fts_table}_{suffix}")
+    create_search_index(cur, dialect)
@@ -0,0 +1,124 @@
+"""
+Skupna hramba sej za več procesov (uvicorn workerjev).
+
+Seja je JSON zapis v tabeli chat_sessions (namespace, session_id, version,
+data, updated_at; migracija 12 v app/services/migrations.py). Zapis je optimističen: UPDATE uspe le, če se verzija v bazi
+ujema s tisto, ki jo je proces prebral; sicer SessionVersionConflict (prvi
+zapis zmaga, poraženec ob naslednjem branju dobi novejše stanje).
+
+Branje vrne podatke le, če je verzija v bazi drugačna od znane (ena poizvedba,
+blob se prenese samo ob spremembi), zato lahko proces hrani prebrane seje v
+pomnilniku kot predpomnilnik.
+
+SESSION_BACKEND:
+    memory (privzeto)    seje samo v pomnilniku procesa (en worker)
+    database             ista baza kot rezervacije (RESERVATIONS_STORAGE/DATABASE_URL)
+    sqlite:///<pot> | postgres://... | memory://<ime>   ločena baza
+"""
+
+import os
+import time
+from typing import Optional
+
+from app.services.migrations import run_migrations
+from app.services.storage import Storage, storage_from_url
+
+
+class SessionVersionConflict(Exception):
+    """Seja je bila vmes zapisana v drugem procesu."""
+
+
+class SQLSessionBackend:
+    def __init__(self, storage: Storage) -> None:
+        self.storage = storage
+        self.ph = "%s" if storage.dialect == "postgres" else "?"
+        self.stats = {"loads": 0, "blob_loads": 0, "saves": 0, "conflicts": 0}
+        self._ensure_table()
+
+    def _ensure_table(self) -> None:
+        # ločena baza sej dobi isto verzionirano shemo kot baza rezervacij
+        run_migrations(self.storage.connect, postgres=self.storage.dialect == "postgres", key=self.storage.key)
+
+    def load(self, namespace: str, session_id: str, known_version: int = 0) -> tuple[int, Optional[str]]:
+        """Vrne (verzija, blob); blob je None, če seje ni (verzija 0) ali se ni spremenila."""
+        ph = self.ph
+        conn = self.storage.connect()
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                f"SELECT version, CASE WHEN version = {ph} THEN NULL ELSE data END AS data "
+                f"FROM chat_sessions WHERE namespace = {ph} AND session_id = {ph}",
+                (known_version, namespace, session_id),
+            )
+            row = cur.fetchone()
+        finally:
+            conn.close()
+        self.stats["loads"] += 1
+        if row is None:
+            return 0, None
+        if row["data"] is not None:
+            self.stats["blob_loads"] += 1
+        return int(row["version"]), row["data"]
+
+    def save(self, namespace: str, session_id: str, blob: str, expected_version: int) -> int:
+        """Zapiše sejo, če je verzija v bazi še expected_version; vrne novo verzijo."""
+        ph = self.ph
+        conn = self.storage.connect()
+        try:
+            cur = conn.cursor()
+            if expected_version == 0:
+                cur.execute(
+                    f"INSERT INTO chat_sessions (namespace, session_id, version, data, updated_at) "
+                    f"VALUES ({ph}, {ph}, 1, {ph}, {ph}) ON CONFLICT (namespace, session_id) DO NOTHING",
+                    (namespace, session_id, blob, time.time()),
+                )
+            else:
+                cur.execute(
+                    f"UPDATE chat_sessions SET data = {ph}, version = version + 1, updated_at = {ph} "
+                    f"WHERE namespace = {ph} AND session_id = {ph} AND version = {ph}",
+                    (blob, time.time(), namespace, session_id, expected_version),
+                )
+            written = cur.rowcount == 1
+            conn.commit()
+        finally:
+            conn.close()
+        if not written:
+            self.stats["conflicts"] += 1
+            raise SessionVersionConflict(session_id)
+        self.stats["saves"] += 1
+        return expected_version + 1
+
+    def delete(self, namespace: str, session_id: str) -> None:
+        conn = self.storage.connect()
+        try:
+            conn.cursor().execute(
+                f"DELETE FROM chat_sessions WHERE namespace = {self.ph} AND session_id = {self.ph}",
+                (namespace, session_id),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def purge(self, older_than: float) -> int:
+        """Izbriše seje, ki niso bile zapisane od older_than (unix čas)."""
+        conn = self.storage.connect()
+        try:
+            cur = conn.cursor()
+            cur.execute(f"DELETE FROM chat_sessions WHERE updated_at < {self.ph}", (older_than,))
+            removed = cur.rowcount
+            conn.commit()
+        finally:
+            conn.close()
+        return removed
+
+
+def session_backend_from_env() -> Optional[SQLSessionBackend]:
+    """None pomeni seje samo v pomnilniku procesa."""
+    configured = os.getenv("SESSION_BACKEND", "memory").strip() or "memory"
+    if configured == "memory":
+        return None
+    if configured == "database":
+        from app.services.reservation_service import get_reservation_service
+
+        return SQLSessionBackend(get_reservation_service().storage)
+    return SQLSessionBackend(storage_from_url(configured))
@@ -0,0 +1,227 @@
+"""
+Omejena shramba sej klepeta v pomnilniku.
+
+Seje (v2/v3 SessionState, v1 unified state) so bile navadni slovarji brez
+omejitve: vsak session_id je ostal v pomnilniku do ponovnega zagona. Shramba:
+
+- LRU vrstni red (OrderedDict); ob vsakem branju gre seja na konec,
+- SESSION_MAX_COUNT: pri preseženem številu se izloči najdlje neuporabljena,
+- SESSION_IDLE_TTL_MINUTES: neaktivne seje odstrani ozadna nit vsakih
+  SESSION_SWEEP_SECONDS (in branje, ki naleti na poteklo sejo),
+- SESSION_MEMORY_BUDGET_MB: ob čiščenju se oceni velikost sej (JSON dolžina
+  podatkov in zgodovine) in izločajo se najstarejše, dokler ni pod mejo,
+- števci: žive seje, izločitve po razlogu (ttl, lru, memory), ocena bajtov.
+
+Seja, ki jo zahtevek še drži, ostane veljavna tudi po izločitvi; naslednji
+zahtevek z istim id-jem dobi novo.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Generic, Optional, TypeVar
+
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "5000"))
+SESSION_IDLE_TTL_MINUTES = float(os.getenv("SESSION_IDLE_TTL_MINUTES", "30"))
+SESSION_MEMORY_BUDGET_MB = float(os.getenv("SESSION_MEMORY_BUDGET_MB", "64"))
+SESSION_SWEEP_SECONDS = float(os.getenv("SESSION_SWEEP_SECONDS", "60"))
+
+V = TypeVar("V")
+
+
+def approx_json_size(value: Any) -> int:
+    """Groba ocena velikosti (dolžina JSON zapisa)."""
+    return len(json.dumps(value, default=str, ensure_ascii=False))
+
+
+class SessionStore(Generic[V]):
+    def __init__(
+        self,
+        name: str,
+        factory: Callable[[str], V],
+        max_sessions: int = SESSION_MAX_COUNT,
+        idle_ttl: float = SESSION_IDLE_TTL_MINUTES * 60,
+        memory_budget: int = int(SESSION_MEMORY_BUDGET_MB * 1024 * 1024),
+        sweep_interval: float = SESSION_SWEEP_SECONDS,
+        size_of: Callable[[V], int] = approx_json_size,
+        is_expired: Optional[Callable[[V], bool]] = None,
+        on_sweep: Optional[Callable[[], None]] = None,
+    ) -> None:
+        self.name = name
+        self.factory = factory
+        self.max_sessions = max(1, max_sessions)
+        self.idle_ttl = idle_ttl
+        self.memory_budget = memory_budget
+        self.sweep_interval = max(0.05, sweep_interval)
+        self.size_of = size_of
+        self.is_expired = is_expired
+        # dodatno čiščenje ob vsakem prehodu (npr. potekle seje v skupni bazi)
+        self.on_sweep = on_sweep
+        # session_id -> (seja, čas zadnjega dostopa po time.monotonic)
+        self._items: "OrderedDict[str, tuple[V, float]]" = OrderedDict()
+        self._sizes: dict[str, int] = {}
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {
+            "created": 0,
+            "evicted_ttl": 0,
+            "evicted_lru": 0,
+            "evicted_memory": 0,
+            "sweeps": 0,
+            "approx_bytes": 0,
+            "last_sweep_ms": 0.0,
+        }
+        _register(self)
+
+    # --- API -------------------------------------------------------------
+    def get(self, key: str) -> Optional[V]:
+        """Vrne sejo (in jo premakne na konec LRU) ali None, če je ni ali je potekla."""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            if self._expired(item, time.monotonic()):
+                self._evict(key, "ttl")
+                return None
+            self._items[key] = (item[0], time.monotonic())
+            self._items.move_to_end(key)
+            return item[0]
+
+    def get_or_create(self, key: str) -> V:
+        with self._lock:
+            value = self.get(key)
+            if value is None:
+                value = self.factory(key)
+                self.put(key, value)
+                self.stats["created"] += 1
+            return value
+
+    def put(self, key: str, value: V) -> None:
+        with self._lock:
+            self._items[key] = (value, time.monotonic())
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_sessions:
+                self._evict(next(iter(self._items)), "lru")
+        self._ensure_sweeper()
+
+    def pop(self, key: str) -> Optional[V]:
+        with self._lock:
+            item = self._items.pop(key, None)
+            self._sizes.pop(key, None)
+        return item[0] if item else None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._sizes.clear()
+
+    def items(self) -> list[tuple[str, V]]:
+        """Seje v LRU vrstnem redu (najstarejša prva), brez potekle."""
+        with self._lock:
+            now = time.monotonic()
+            return [(key, item[0]) for key, item in self._items.items() if not self._expired(item, now)]
+
+    def __contains__(self, key: object) -> bool:
+        with self._lock:
+            return key in self._items
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def sweep(self) -> int:
+        """Odstrani potekle seje in uveljavi pomnilniško mejo; vrne število izločenih."""
+        start = time.perf_counter()
+        with self._lock:
+            now = time.monotonic()
+            items = list(self._items.items())
+        expired = [key for key, item in items if self._expired(item, now)]
+        # velikost se oceni izven zaklepa (seje se med tem lahko spreminjajo)
+        sizes = {key: self._measure(key, item[0]) for key, item in items if key not in expired}
+        removed = 0
+        with self._lock:
+            now = time.monotonic()
+            for key in expired:
+                # medtem je lahko prišel nov zahtevek za isto sejo
+                if key in self._items and self._expired(self._items[key], now):
+                    self._evict(key, "ttl")
+                    removed += 1
+            self._sizes = {key: sizes.get(key, 0) for key in self._items}
+            total = sum(self._sizes.values())
+            while total > self.memory_budget and self._items:
+                key = next(iter(self._items))
+                total -= self._sizes.get(key, 0)
+                self._evict(key, "memory")
+                removed += 1
+            self.stats["approx_bytes"] = total
+            self.stats["sweeps"] += 1
+            self.stats["last_sweep_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        if self.on_sweep is not None:
+            self.on_sweep()
+        return removed
+
+    def metrics(self) -> dict:
+        with self._lock:
+            evictions = self.stats["evicted_ttl"] + self.stats["evicted_lru"] + self.stats["evicted_memory"]
+            return {
+                **self.stats,
+                "live_sessions": len(self._items),
+                "evictions": evictions,
+                "max_sessions": self.max_sessions,
+                "memory_budget_bytes": self.memory_budget,
+            }
+
+    def close(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    # --- interno ---------------------------------------------------------
+    def _expired(self, item: tuple[V, float], now: float) -> bool:
+        value, accessed = item
+        if self.idle_ttl > 0 and now - accessed > self.idle_ttl:
+            return True
+        return bool(self.is_expired and self.is_expired(value))
+
+    def _evict(self, key: str, reason: str) -> None:
+        self._items.pop(key, None)
+        self._sizes.pop(key, None)
+        self.stats[f"evicted_{reason}"] += 1
+
+    def _measure(self, key: str, value: V) -> int:
+        try:
+            return self.size_of(value)
+        except (RuntimeError, TypeError, ValueError):
+            # slovar se je spremenil med serializacijo: zadnja znana ocena
+            return self._sizes.get(key, 0)
+
+    def _ensure_sweeper(self) -> None:
+        if self._thread is not None or self._stop.is_set():
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"session-sweeper-{self.name}", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.sweep_interval):
+            try:
+                self.sweep()
+            except Exception as exc:  # čiščenje ne sme ustaviti niti
+                print(f"[session_store] {self.name}: čiščenje ni uspelo: {exc}")
+
+
+_STORES: dict[str, SessionStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def _register(store: SessionStore) -> None:
+    with _STORES_LOCK:
+        _STORES[store.name] = store
+
+
+def session_store_metrics() -> dict[str, dict]:
+    with _STORES_LOCK:
+        return {name: store.metrics() for name, store in _STORES.items()}
@@ -0,0 +1,158 @@
+"""
+Zaporedne poteze na sejo in združevanje podvojenih zahtevkov.
+
+Widget ob počasnem odgovoru ponovi zahtevek, uporabniki pa sporočilo pošljejo
+dvakrat. Brez zaščite oba zahtevka poženeta LLM in hkrati spreminjata
+session.data. TurnCoalescer:
+
+- poteze iste seje tečejo ena za drugo (asyncio.Lock na session_id),
+- podvojen zahtevek (isti ključ) počaka na potezo v teku in dobi isti odgovor,
+- z message_id od odjemalca se zaključen odgovor hrani še
+  CHAT_MESSAGE_ID_TTL_SECONDS (ponovitev po odgovoru dobi isti odgovor);
+  brez njega se ključ po hashu privzeto ne hrani (CHAT_DEDUP_WINDOW_SECONDS=0),
+  ker gost isto vprašanje lahko namenoma ponovi.
+
+Ključ je message_id odjemalca ali hash (session_id, sporočilo); brez
+session_id ključa ni (dva nova gosta z istim "živjo" nista ista poteza).
+Poteza s ključem teče kot lastna naloga (task) coalescerja: prekinjen prvi
+zahtevek (odjemalec se odklopi) ne prekine poteze, na katero čakajo
+podvojeni. Zaklepi in poteze v teku so vezani na event loop, shranjeni
+odgovori ne.
+"""
+
+import asyncio
+import hashlib
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+CHAT_DEDUP_WINDOW_SECONDS = float(os.getenv("CHAT_DEDUP_WINDOW_SECONDS", "0"))
+CHAT_MESSAGE_ID_TTL_SECONDS = float(os.getenv("CHAT_MESSAGE_ID_TTL_SECONDS", "120"))
+CHAT_DEDUP_MAX_RESULTS = 2000
+
+
+def idempotency_key(
+    channel: str, session_id: Optional[str], message: str, message_id: Optional[str] = None
+) -> Optional[str]:
+    if message_id:
+        return f"{channel}:id:{session_id or ''}:{message_id}"
+    if not session_id:
+        return None
+    digest = hashlib.sha256(f"{session_id}\x00{message.strip().lower()}".encode("utf-8")).hexdigest()[:24]
+    return f"{channel}:hash:{digest}"
+
+
+class _LoopState:
+    def __init__(self) -> None:
+        # session_id -> [zaklep, število uporabnikov]; zaklep se zavrže, ko ga nihče ne rabi
+        self.locks: dict[str, list[Any]] = {}
+        self.inflight: dict[str, asyncio.Future] = {}
+
+
+class TurnCoalescer:
+    def __init__(
+        self,
+        dedup_window: float = CHAT_DEDUP_WINDOW_SECONDS,
+        message_id_ttl: float = CHAT_MESSAGE_ID_TTL_SECONDS,
+        max_results: int = CHAT_DEDUP_MAX_RESULTS,
+    ) -> None:
+        self.dedup_window = dedup_window
+        self.message_id_ttl = message_id_ttl
+        self.max_results = max_results
+        self._loops: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+        # ključ -> (odgovor, čas poteka)
+        self._done: "OrderedDict[str, tuple[Any, float]]" = OrderedDict()
+        self._done_lock = threading.Lock()
+        self.stats = {"turns": 0, "coalesced": 0, "replayed": 0, "lock_waits": 0}
+
+    async def run(self, session_id: Optional[str], key: Optional[str], turn: Callable[[], Awaitable[Any]]) -> Any:
+        """Izvede potezo (ali vrne odgovor istega zahtevka, ki teče / je pravkar končal)."""
+        state = self._state()
+        if key is None:
+            return await self._execute(state, session_id, None, turn)
+        cached = self._cached(key)
+        if cached is not None:
+            self.stats["replayed"] += 1
+            return cached
+        pending = state.inflight.get(key)
+        if pending is not None:
+            self.stats["coalesced"] += 1
+        else:
+            pending = asyncio.ensure_future(self._execute(state, session_id, key, turn))
+            # napaka se preda čakajočim; brez njih ne sme sprožiti opozorila
+            pending.add_done_callback(lambda fut: fut.cancelled() or fut.exception())
+            state.inflight[key] = pending
+        # shield: prekinjen zahtevek ne prekine skupne poteze
+        return await asyncio.shield(pending)
+
+    async def _execute(
+        self, state: _LoopState, session_id: Optional[str], key: Optional[str], turn: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        try:
+            self.stats["turns"] += 1
+            if session_id:
+                async with self._session_lock(state, session_id):
+                    result = await turn()
+            else:
+                result = await turn()
+            if key is not None:
+                self._remember(key, result)
+            return result
+        finally:
+            if key is not None:
+                state.inflight.pop(key, None)
+
+    def metrics(self) -> dict:
+        with self._done_lock:
+            remembered = len(self._done)
+        return {**self.stats, "remembered": remembered}
+
+    # --- interno ---------------------------------------------------------
+    def _state(self) -> _LoopState:
+        loop = asyncio.get_running_loop()
+        state = self._loops.get(loop)
+        if state is None:
+            state = self._loops[loop] = _LoopState()
+        return state
+
+    @asynccontextmanager
+    async def _session_lock(self, state: _LoopState, session_id: str) -> AsyncIterator[None]:
+        entry = state.locks.setdefault(session_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            if entry[0].locked():
+                self.stats["lock_waits"] += 1
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                state.locks.pop(session_id, None)
+
+    def _cached(self, key: str) -> Any:
+        with self._done_lock:
+            item = self._done.get(key)
+            if item is None:
+                return None
+            if item[1] < time.monotonic():
+                del self._done[key]
+                return None
+            return item[0]
+
+    def _remember(self, key: str, result: Any) -> None:
+        ttl = self.message_id_ttl if ":id:" in key else self.dedup_window
+        if ttl <= 0:
+            return
+        with self._done_lock:
+            self._done[key] = (result, time.monotonic() + ttl)
+            self._done.move_to_end(key)
+            while len(self._done) > self.max_results:
+                self._done.popitem(last=False)
+
+
+# skupno za /v2/chat in /v3/chat (isti session_id, ista seja)
+chat_turns = TurnCoalescer()
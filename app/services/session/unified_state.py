@@ -2,6 +2,8 @@ from __future__ import annotations
 
 from typing import Any, Dict, Optional
 
+from app.services.session.store import SessionStore
+
 
 def _blank_unified_state() -> Dict[str, Any]:
     return {
@@ -13,13 +15,13 @@ def _blank_unified_state() -> Dict[str, Any]:
     }
 
 
-_SESSION_STATES: Dict[str, Dict[str, Any]] = {}
+_SESSION_STATES: SessionStore[Dict[str, Any]] = SessionStore(
+    "unified", factory=lambda _session_id: _blank_unified_state()
+)
 
 
 def get_unified_state(session_id: str) -> Dict[str, Any]:
-    if session_id not in _SESSION_STATES:
-        _SESSION_STATES[session_id] = _blank_unified_state()
-    return _SESSION_STATES[session_id]
+    return _SESSION_STATES.get_or_create(session_id)
 
 
 def reset_unified_state(state: Dict[str, Any]) -> None:
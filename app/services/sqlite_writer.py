@@ -0,0 +1,217 @@
+"""
+SQLite produkcijski način: WAL, nastavljeni PRAGMA-ji in ena pisalna nit.
+
+Vsa pisanja v isto bazo gredo skozi eno nit (SQLiteWriter), ki iz vrste
+pobere vse čakajoče operacije in jih potrdi v eni transakciji (group commit).
+Vsaka operacija teče v svojem SAVEPOINT-u, zato napaka ene ne razveljavi
+ostalih v isti skupini. Bralci uporabljajo svoje povezave in zaradi WAL ne
+čakajo na pisalca.
+"""
+
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Optional
+
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024)))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_WRITER_BATCH_MAX = int(os.getenv("SQLITE_WRITER_BATCH_MAX", "128"))
+
+_STOP = object()
+
+
+def apply_pragmas(conn: sqlite3.Connection) -> None:
+    """Nastavi PRAGMA-je za WAL način na posamezni povezavi."""
+    conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+    # negativna vrednost = velikost v KiB
+    conn.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+
+
+def enable_wal(db_path: str) -> str:
+    """Preklopi bazo v WAL (nastavitev je trajna v datoteki) in vrne journal_mode."""
+    conn = sqlite3.connect(db_path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
+    try:
+        row = conn.execute("PRAGMA journal_mode = WAL").fetchone()
+        return str(row[0]).lower() if row else ""
+    finally:
+        conn.close()
+
+
+class SQLiteWriter:
+    """Ena pisalna nit za eno SQLite datoteko z group commit."""
+
+    def __init__(
+        self,
+        db_path: str,
+        batch_max: int = SQLITE_WRITER_BATCH_MAX,
+        connect: Optional[Callable[[], sqlite3.Connection]] = None,
+    ) -> None:
+        self.db_path = db_path
+        self.batch_max = max(1, batch_max)
+        # connect: povezava brez samodejnih transakcij (npr. baza v pomnilniku, app/services/storage.py)
+        self._connect = connect
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._closed = False
+        self._lock = threading.Lock()
+        self.stats = {"writes": 0, "batches": 0, "errors": 0, "max_batch": 0}
+        self._thread = threading.Thread(
+            target=self._run, name=f"sqlite-writer:{os.path.basename(db_path)}", daemon=True
+        )
+        self._thread.start()
+
+    # --- API -------------------------------------------------------------
+    def submit(self, fn: Callable[[sqlite3.Cursor], Any]) -> Future:
+        """Doda pisalno operacijo v vrsto. fn prejme cursor in vrne rezultat."""
+        future: Future = Future()
+        with self._lock:
+            if self._closed:
+                future.set_exception(RuntimeError("SQLite writer je zaustavljen."))
+                return future
+            self._queue.put((fn, future))
+        return future
+
+    def execute(self, fn: Callable[[sqlite3.Cursor], Any], timeout: Optional[float] = None) -> Any:
+        """Izvede operacijo preko pisalne niti in počaka na potrditev."""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("Gnezdeno pisanje iz pisalne niti ni dovoljeno.")
+        return self.submit(fn).result(timeout)
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Izprazni vrsto (vse čakajoče operacije se potrdijo) in ustavi nit."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    # --- internals -------------------------------------------------------
+    def _run(self) -> None:
+        if self._connect is not None:
+            conn = self._connect()
+        else:
+            conn = sqlite3.connect(
+                self.db_path,
+                timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+                isolation_level=None,  # transakcije vodimo ročno (BEGIN/COMMIT)
+                check_same_thread=False,
+            )
+        conn.row_factory = sqlite3.Row
+        apply_pragmas(conn)
+        try:
+            stop = False
+            while not stop:
+                item = self._queue.get()
+                if item is _STOP:
+                    break
+                batch = [item]
+                while len(batch) < self.batch_max:
+                    try:
+                        nxt = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if nxt is _STOP:
+                        stop = True
+                        break
+                    batch.append(nxt)
+                self._commit_batch(conn, batch)
+        finally:
+            conn.close()
+
+    def _commit_batch(self, conn: sqlite3.Connection, batch: list) -> None:
+        outcomes: list[tuple[Future, Any, Optional[BaseException]]] = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+        except Exception as exc:
+            self.stats["errors"] += len(batch)
+            for _, future in batch:
+                if future.set_running_or_notify_cancel():
+                    future.set_exception(exc)
+            return
+
+        for fn, future in batch:
+            if not future.set_running_or_notify_cancel():
+                continue
+            conn.execute("SAVEPOINT writer_job")
+            cur = conn.cursor()
+            try:
+                value = fn(cur)
+                conn.execute("RELEASE SAVEPOINT writer_job")
+                outcomes.append((future, value, None))
+            except BaseException as exc:  # napaka ene operacije ne sme podreti skupine
+                conn.execute("ROLLBACK TO SAVEPOINT writer_job")
+                conn.execute("RELEASE SAVEPOINT writer_job")
+                outcomes.append((future, None, exc))
+            finally:
+                cur.close()
+
+        try:
+            conn.execute("COMMIT")
+        except Exception as exc:
+            try:
+                conn.execute("ROLLBACK")
+            except Exception:
+                pass
+            self.stats["errors"] += len(outcomes)
+            for future, _, _ in outcomes:
+                future.set_exception(exc)
+            return
+
+        self.stats["batches"] += 1
+        self.stats["max_batch"] = max(self.stats["max_batch"], len(outcomes))
+        for future, value, error in outcomes:
+            if error is not None:
+                self.stats["errors"] += 1
+                future.set_exception(error)
+            else:
+                self.stats["writes"] += 1
+                future.set_result(value)
+
+
+_WRITERS: dict[str, SQLiteWriter] = {}
+_WRITERS_LOCK = threading.Lock()
+
+
+def get_writer(db_path: str, connect: Optional[Callable[[], sqlite3.Connection]] = None) -> SQLiteWriter:
+    """Vrne (in po potrebi zažene) pisalno nit za dano datoteko baze.
+
+    S connect je db_path le ključ (npr. "memory:<ime>"), povezavo odpre connect.
+    """
+    key = db_path if connect is not None else os.path.abspath(db_path)
+    with _WRITERS_LOCK:
+        writer = _WRITERS.get(key)
+        if writer is None or writer._closed:
+            writer = SQLiteWriter(key, connect=connect)
+            _WRITERS[key] = writer
+        return writer
+
+
+def close_writer(key: str) -> None:
+    """Izprazni in ustavi pisalno nit za dani ključ (npr. ob zaprtju baze v pomnilniku)."""
+    with _WRITERS_LOCK:
+        writer = _WRITERS.pop(key, None)
+    if writer is not None:
+        writer.close()
+
+
+def shutdown_writers() -> None:
+    """Izprazni in ustavi vse pisalne niti (ob zaustavitvi procesa)."""
+    with _WRITERS_LOCK:
+        writers = list(_WRITERS.values())
+        _WRITERS.clear()
+    for writer in writers:
+        writer.close()
+
+
+atexit.register(shutdown_writers)
@@ -0,0 +1,164 @@
+"""
+Hramba baze za ReservationService (izbira na instanco).
+
+- SQLiteFileStorage: datoteka (privzeto data/reservations.db),
+- SQLiteMemoryStorage: baza v pomnilniku (`file:<ime>?mode=memory&cache=shared`);
+  vse povezave z istim imenom vidijo isto bazo, sidrna povezava jo drži živo
+  do close() (ta ustavi tudi pisalno nit in vrsto pogovorov baze; close()
+  poimenovane baze jo zavrže za vse instance z istim imenom),
+- PostgresStorage: DATABASE_URL.
+
+Izbira brez eksplicitnega argumenta (storage_from_env):
+RESERVATIONS_STORAGE, nato DATABASE_URL, nato privzeta datoteka. Vrednosti za
+RESERVATIONS_STORAGE:
+    memory                  nova prazna baza v pomnilniku za vsako instanco
+    memory://<ime>          poimenovana skupna baza v pomnilniku (npr. na pytest worker)
+    sqlite:///<pot>         SQLite datoteka
+    postgres://... | postgresql://...
+
+Pri bazi v pomnilniku (deljeni predpomnilnik) SQLite ne čaka na zaklepe
+(busy_timeout ne velja), zato gredo pisanja skozi pisalno nit (kot v WAL
+načinu), bralci pa berejo z read_uncommitted in jih pisanje ne blokira.
+"""
+
+import abc
+import itertools
+import os
+import sqlite3
+import threading
+import uuid
+from typing import Any, Optional
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+from app.services.conversation_log import close_conversation_log
+from app.services.occupancy_index import drop_index
+from app.services.sqlite_writer import SQLITE_BUSY_TIMEOUT_MS, close_writer
+
+
+class Storage(abc.ABC):
+    dialect = "sqlite"
+    # pisanja vedno skozi pisalno nit (ne glede na SQLITE_WAL_MODE)
+    needs_writer = False
+
+    @property
+    @abc.abstractmethod
+    def key(self) -> str:
+        """Ključ za skupne objekte na bazo (indeks, pisalna nit, vrsta pogovorov)."""
+
+    @abc.abstractmethod
+    def connect(self, shared: bool = False, **kwargs: Any) -> Any:
+        """Nova povezava na bazo."""
+
+    def close(self) -> None:
+        """Sprosti vire hrambe (datoteke in Postgres nimajo česa zapreti)."""
+
+
+class SQLiteFileStorage(Storage):
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    @property
+    def key(self) -> str:
+        return os.path.abspath(self.path)
+
+    def connect(self, shared: bool = False, **kwargs: Any) -> sqlite3.Connection:
+        # povezavo enote dela lahko uporabi tudi asyncio.to_thread znotraj iste poteze
+        kwargs.setdefault("check_same_thread", not shared)
+        conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000, **kwargs)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def __repr__(self) -> str:
+        return f"SQLiteFileStorage({self.path!r})"
+
+
+# poimenovane baze v pomnilniku: ime -> sidrna povezava (živi do close() ali konca procesa)
+_MEMORY_ANCHORS: dict[str, sqlite3.Connection] = {}
+_MEMORY_LOCK = threading.Lock()
+_MEMORY_SEQ = itertools.count(1)
+
+
+class SQLiteMemoryStorage(Storage):
+    needs_writer = True
+
+    def __init__(self, name: Optional[str] = None) -> None:
+        # neimenovana baza je zasebna instanci in izgine ob close()
+        self.name = name or f"anon-{os.getpid()}-{next(_MEMORY_SEQ)}-{uuid.uuid4().hex[:8]}"
+        self.path: Optional[str] = None
+        self._uri = f"file:{self.name}?mode=memory&cache=shared"
+        if name:
+            with _MEMORY_LOCK:
+                if name not in _MEMORY_ANCHORS:
+                    _MEMORY_ANCHORS[name] = self._open(check_same_thread=False)
+            self._anchor = _MEMORY_ANCHORS[name]
+        else:
+            self._anchor = self._open(check_same_thread=False)
+
+    @property
+    def key(self) -> str:
+        return f"memory:{self.name}"
+
+    def _open(self, **kwargs: Any) -> sqlite3.Connection:
+        return sqlite3.connect(self._uri, uri=True, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000, **kwargs)
+
+    def connect(self, shared: bool = False, **kwargs: Any) -> sqlite3.Connection:
+        kwargs.setdefault("check_same_thread", not shared)
+        conn = self._open(**kwargs)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA read_uncommitted = 1")
+        return conn
+
+    def close(self) -> None:
+        """Izprazni vrsto pogovorov in pisalno nit, nato zapre sidro (baza izgine)."""
+        close_conversation_log(self.key)
+        close_writer(self.key)
+        drop_index(self.key)
+        with _MEMORY_LOCK:
+            if _MEMORY_ANCHORS.get(self.name) is self._anchor:
+                del _MEMORY_ANCHORS[self.name]
+        self._anchor.close()
+
+    def __repr__(self) -> str:
+        return f"SQLiteMemoryStorage({self.name!r})"
+
+
+class PostgresStorage(Storage):
+    dialect = "postgres"
+
+    def __init__(self, url: str) -> None:
+        self.url = url
+
+    @property
+    def key(self) -> str:
+        return self.url
+
+    def connect(self, shared: bool = False, **kwargs: Any) -> Any:
+        return psycopg2.connect(self.url, cursor_factory=RealDictCursor)
+
+    def __repr__(self) -> str:
+        return "PostgresStorage(***)"
+
+
+def storage_from_url(url: str) -> Storage:
+    """Niz iz RESERVATIONS_STORAGE -> hramba (ValueError za neznano shemo)."""
+    if url == "memory":
+        return SQLiteMemoryStorage()
+    if url.startswith("memory://"):
+        return SQLiteMemoryStorage(url[len("memory://"):] or None)
+    if url.startswith("sqlite:///"):
+        return SQLiteFileStorage(url[len("sqlite:///"):])
+    if url.startswith(("postgres://", "postgresql://")):
+        return PostgresStorage(url)
+    raise ValueError(f"Neznana hramba: {url}")
+
+
+def storage_from_env(default_path: str, database_url: Optional[str] = None) -> Storage:
+    """Privzeta hramba; okolje se prebere ob vsaki instanci (ne ob uvozu)."""
+    configured = os.getenv("RESERVATIONS_STORAGE", "").strip()
+    if configured:
+        return storage_from_url(configured)
+    if database_url:
+        return PostgresStorage(database_url)
+    return SQLiteFileStorage(default_path)
@@ -0,0 +1,171 @@
+"""
+Enota dela (unit of work) za eno potezo klepeta.
+
+Med eno potezo booking flow pokliče več metod ReservationService (pravila,
+razpoložljivost, proste sobe, vpis, branje rezervacije ...). Brez enote dela
+vsak klic odpre in zapre svojo povezavo. Znotraj `with unit_of_work():`:
+
+- vsi klici storitve nad isto bazo uporabijo eno povezavo (close() je prazen),
+- pisanja tečejo v skupni transakciji, vsako v svojem SAVEPOINT-u (napaka ene
+  operacije, npr. konflikt pri vpisu, ne razveljavi ostalih); potrdi se enkrat
+  ob izhodu, ob izjemi pa se vse razveljavi,
+- prebrane rezervacije se hranijo v posnetku (cache) do prvega pisanja.
+
+Transakcija z zaklepi ostane odprta do konca poteze, zato naj bo vpis
+zadnji korak poteze (booking flow po vpisu ne kliče več LLM-a). Učinki
+navzven (e-pošta o rezervaciji) gredo v on_commit in se izvedejo šele po
+potrditvi; ob razveljavitvi se zavržejo.
+
+Enota dela se veže na bazo prve storitve, ki jo uporabi; druge baze je ne
+vidijo. V SQLite WAL načinu gredo pisanja še naprej skozi pisalno nit (ta
+jih potrdi takoj), enota dela pa deli branja.
+
+Routerja /v2/chat in /v3/chat odpreta enoto dela za vsak sinhroni klic toka
+v niti (asyncio.to_thread(run_in_unit_of_work, ...)), ne čez await LLM
+klicev: na Postgresu prvo branje odpre transakcijo in povezava bi sicer
+sekunde čakala "idle in transaction".
+"""
+
+import sqlite3
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator, Optional
+
+
+class _SharedConnection:
+    """Povezava enote dela: commit() in close() ne naredita nič (to stori enota dela)."""
+
+    def __init__(self, conn: Any) -> None:
+        self._raw = conn
+
+    def commit(self) -> None:
+        return None
+
+    def close(self) -> None:
+        return None
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._raw, name)
+
+
+class UnitOfWork:
+    def __init__(self) -> None:
+        self.key: Optional[str] = None
+        self.cache: dict[Any, Any] = {}
+        self.stats = {"connections": 0, "writes": 0}
+        self._connect: Optional[Callable[[], Any]] = None
+        self._raw: Any = None
+        self._shared: Optional[_SharedConnection] = None
+        self._on_rollback: list[Callable[[], None]] = []
+        self._on_commit: list[Callable[[], None]] = []
+
+    def bind(self, key: str, connect: Callable[[], Any]) -> bool:
+        """Veže enoto dela na bazo (prva storitev zmaga); vrne, ali velja za to bazo."""
+        if self.key is None:
+            self.key = key
+            self._connect = connect
+        return self.key == key
+
+    def connection(self) -> _SharedConnection:
+        if self._shared is None:
+            self._raw = self._connect()
+            self._shared = _SharedConnection(self._raw)
+            self.stats["connections"] += 1
+        return self._shared
+
+    def write(self, fn: Callable[[Any], Any]) -> Any:
+        """Izvede pisanje v skupni transakciji (brez potrditve)."""
+        self.connection()
+        if isinstance(self._raw, sqlite3.Connection) and not self._raw.in_transaction:
+            # brez BEGIN bi RELEASE zunanjega savepointa takoj potrdil
+            self._raw.execute("BEGIN")
+        cur = self._raw.cursor()
+        try:
+            cur.execute("SAVEPOINT unit_of_work")
+            try:
+                result = fn(cur)
+            except BaseException:
+                cur.execute("ROLLBACK TO SAVEPOINT unit_of_work")
+                cur.execute("RELEASE SAVEPOINT unit_of_work")
+                raise
+            cur.execute("RELEASE SAVEPOINT unit_of_work")
+        finally:
+            cur.close()
+            self.cache.clear()
+        self.stats["writes"] += 1
+        return result
+
+    def on_rollback(self, callback: Callable[[], None]) -> None:
+        """Povratni klic ob razveljavitvi (npr. razveljavi indeks v pomnilniku)."""
+        if callback not in self._on_rollback:
+            self._on_rollback.append(callback)
+
+    def on_commit(self, callback: Callable[[], None]) -> None:
+        """Povratni klic po potrditvi poteze.
+
+        Brez nepotrjenih pisanj (npr. v WAL načinu jih pisalna nit potrdi takoj)
+        se izvede takoj.
+        """
+        if self.stats["writes"] == 0:
+            callback()
+            return
+        self._on_commit.append(callback)
+
+    def commit(self) -> None:
+        if self._raw is not None:
+            self._raw.commit()
+        callbacks, self._on_commit = self._on_commit, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as exc:  # potrjenega ne razveljavimo zaradi povratnega klica
+                print(f"[UOW] on_commit ni uspel: {exc}")
+
+    def rollback(self) -> None:
+        self._on_commit = []
+        if self._raw is not None:
+            try:
+                self._raw.rollback()
+            finally:
+                for callback in self._on_rollback:
+                    callback()
+
+    def close(self) -> None:
+        if self._raw is not None:
+            self._raw.close()
+        self._raw = None
+        self._shared = None
+        self.cache.clear()
+
+
+_CURRENT: ContextVar[Optional[UnitOfWork]] = ContextVar("reservation_unit_of_work", default=None)
+
+
+def current_unit_of_work() -> Optional[UnitOfWork]:
+    return _CURRENT.get()
+
+
+@contextmanager
+def unit_of_work() -> Iterator[UnitOfWork]:
+    """Odpre enoto dela za trenutni kontekst (gnezdeni klici uporabijo zunanjo)."""
+    outer = _CURRENT.get()
+    if outer is not None:
+        yield outer
+        return
+    uow = UnitOfWork()
+    token = _CURRENT.set(uow)
+    try:
+        yield uow
+        uow.commit()
+    except BaseException:
+        uow.rollback()
+        raise
+    finally:
+        uow.close()
+        _CURRENT.reset(token)
+
+
+def run_in_unit_of_work(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Izvede fn v svoji enoti dela (za asyncio.to_thread: povezava se vrne ob izhodu)."""
+    with unit_of_work():
+        return fn(*args, **kwargs)
@@ -4,11 +4,11 @@ import hmac
 import hashlib
 from typing import Optional
 
-from fastapi import APIRouter, Header, HTTPException, Request
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
 from pydantic import BaseModel
 
 from app.services.email_service import send_admin_notification
-from app.services.reservation_service import ReservationService
+from app.services.reservation_service import ReservationService, get_reservation_service
 
 router = APIRouter(prefix="/api/webhook", tags=["webhook"])
 
@@ -54,6 +54,7 @@ async def receive_wordpress_reservation(
     data: WordPressReservation,
     x_webhook_signature: str = Header(None),
     x_webhook_secret: str = Header(None),
+    service: ReservationService = Depends(get_reservation_service),
 ):
     """Prejme rezervacijo iz WordPress vtičnika in jo shrani kot pending."""
     # rate limit per IP
@@ -76,7 +77,6 @@ async def receive_wordpress_reservation(
         if not provided or not hmac.compare_digest(provided, expected_sig):
             raise HTTPException(status_code=401, detail="Invalid webhook signature")
 
-    service = ReservationService()
     res_id = service.create_reservation(
         date=data.arrive or data.date,
         people=data.people or data.adults or 0,
@@ -13,17 +13,21 @@ from fastapi import FastAPI, Request
 from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 
 from app.core.config import Settings
 from app.rag.chroma_service import get_chroma_health
 from app.rag.knowledge_base import get_knowledge_base_health
 from app2026.chat.router import router as chat_v2_router
+from app2026.chat.state import restore_sessions, snapshot_sessions
 from app2026.chat_v3.router import router as chat_v3_router
 from app.services.reservation_router import router as reservation_router
 from app.services.admin_router import router as admin_router
 from app.services.webhook_router import router as webhook_router
 from app.services.imap_poll_service import start_imap_poller
 from app.services.scheduler_service import start_scheduler
+from app.services.reservation_service import get_reservation_service
+from app.services.conversation_log import shutdown_conversation_logs
 
 settings = Settings()
 app = FastAPI(title=settings.project_name)
@@ -38,11 +42,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip za večje JSON odgovore (admin seznami, izvozi); majhni odgovori ostanejo nestisnjeni
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 # Mount static files (za widget.js, css, slike...)
 app.mount("/static", StaticFiles(directory=BASE_DIR / "static"), name="static")
 
 @app.on_event("startup")
 def startup_tasks() -> None:
+    # shema, CSV uvoz in indeks zasedenosti se pripravijo enkrat, pred prvim zahtevkom
+    get_reservation_service().warm_up()
+    # seje klepeta iz posnetka prejšnjega procesa (gostje sredi rezervacije nadaljujejo)
+    print(f"[startup][sessions] {restore_sessions()}")
     start_imap_poller()
     start_scheduler()
     kb_health = get_knowledge_base_health()
@@ -55,6 +66,12 @@ def startup_tasks() -> None:
             "[startup][chroma] Chroma ni pripravljen; uporabljam fallback (knowledge.jsonl + BM25 + embeddings)."
         )
 
+@app.on_event("shutdown")
+def shutdown_tasks() -> None:
+    print(f"[shutdown][sessions] {snapshot_sessions()}")
+    # zapiši odložene pogovore pred izhodom
+    shutdown_conversation_logs()
+
 @app.get("/health")
 def health_check() -> dict[str, str]:
     return {"status": "ok"}
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Benchmark števcev rezervacij za admin ploščo na sintetični bazi.
+
+Primerja:
+- prej: dvakrat read_reservations(limit=1000) in štetje v Pythonu
+  (get_reservations + get_stats, kot pred uvedbo reservation_stats),
+- SQL: ena agregatna poizvedba (COUNT FILTER) brez predpomnilnika,
+- predpomnjeno: reservation_stats() med dvema pisanjema.
+
+Zagon:
+    PYTHONPATH=. python scripts/bench_admin_stats.py [--rows 100000] [--repeat 20]
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app.services.reservation_service import ReservationService  # noqa: E402
+
+
+def seed(db_path: str, rows: int) -> None:
+    rng = random.Random(7)
+    now = datetime.now()
+    batch = []
+    for i in range(rows):
+        created = now - timedelta(minutes=rng.randint(0, 60 * 24 * 730))
+        day = created + timedelta(days=rng.randint(1, 120))
+        kind = "room" if i % 3 == 0 else "table"
+        batch.append(
+            (
+                day.strftime("%d.%m.%Y"),
+                2 if kind == "room" else None,
+                1 if kind == "room" else None,
+                rng.randint(1, 8),
+                kind,
+                None if kind == "room" else "13:00",
+                rng.choice(["pending", "processing", "confirmed", "rejected"]),
+                created.isoformat(),
+                "bench",
+            )
+        )
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO reservations (date, nights, rooms, people, reservation_type, time, status, created_at, source) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        batch,
+    )
+    conn.commit()
+    conn.close()
+
+
+def python_counts(service: ReservationService) -> dict:
+    """Stari način: dve branji po 1000 vrstic in štetje v Pythonu."""
+    all_res = service.read_reservations(limit=1000)
+    today_prefix = datetime.now().strftime("%Y-%m-%d")
+    pending = len([r for r in all_res if r.get("status") == "pending"])
+    today = len([r for r in all_res if str(r.get("created_at", "")).startswith(today_prefix)])
+    res_list = service.read_reservations(limit=1000)
+    week_ago = datetime.now() - timedelta(days=7)
+    week = 0
+    for r in res_list:
+        try:
+            if datetime.fromisoformat(str(r.get("created_at", ""))) >= week_ago:
+                week += 1
+        except Exception:
+            pass
+    return {"pending": pending, "today": today, "week": week}
+
+
+def timed(fn, repeat: int) -> list[float]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    db_path = str(Path(tempfile.mkdtemp(prefix="bench-stats-")) / "reservations.db")
+    service = ReservationService(db_path=db_path)
+    seed(db_path, args.rows)
+
+    def uncached() -> dict:
+        service._stats_cache = None
+        return service.reservation_stats()
+
+    print(f"rezervacij: {args.rows}")
+    for label, fn in (
+        ("prej (2x1000 vrstic)", lambda: python_counts(service)),
+        ("SQL agregat", uncached),
+        ("predpomnjeno", service.reservation_stats),
+    ):
+        samples = timed(fn, args.repeat)
+        print(f"{label:<22} p50={statistics.median(samples):8.2f}ms max={max(samples):8.2f}ms")
+    print(f"števci: {service.reservation_stats()}")
+
+
+if __name__ == "__main__":
+    main()
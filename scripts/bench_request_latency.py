@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Regresijski benchmark latence: nova ReservationService na zahtevek vs skupna instanca.
+
+Meri:
+- webhook: POST /api/webhook/reservation (TestClient, odvisnost get_reservation_service
+  zamenjana z novo instanco na zahtevek oz. skupno instanco),
+- v3 log: beleženje enega pogovora, kot ga izvede /v3/chat po odgovoru LLM,
+- konstrukcija: sam strošek pridobitve storitve (brez pisanja).
+
+Baza je začasna SQLite datoteka; e-poštna obvestila so izklopljena.
+
+Zagon:
+    PYTHONPATH=. python scripts/bench_request_latency.py [--requests 200] [--wal]
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.services import webhook_router  # noqa: E402
+from app.services.reservation_service import ReservationService, get_reservation_service  # noqa: E402
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def _summary(label: str, samples: list[float]) -> str:
+    return (
+        f"{label:<26} p50={statistics.median(samples):7.2f}ms "
+        f"p95={_percentile(samples, 95):7.2f}ms max={max(samples):7.2f}ms"
+    )
+
+
+def bench_webhook(db_path: str, shared: bool, requests: int, wal: bool) -> list[float]:
+    app = FastAPI()
+    app.include_router(webhook_router.router)
+    shared_service = ReservationService(db_path=db_path, sqlite_wal=wal)
+    if shared:
+        app.dependency_overrides[get_reservation_service] = lambda: shared_service
+    else:
+        app.dependency_overrides[get_reservation_service] = lambda: ReservationService(db_path=db_path, sqlite_wal=wal)
+    client = TestClient(app)
+    payload = {
+        "source": "wordpress_table",
+        "name": "Bench",
+        "email": "bench@example.com",
+        "date": "14.11.2026",
+        "time": "13:00",
+        "people": 4,
+    }
+    samples = []
+    for _ in range(requests):
+        webhook_router.rate_limit_log.clear()
+        start = time.perf_counter()
+        response = client.post("/api/webhook/reservation", json=payload)
+        samples.append((time.perf_counter() - start) * 1000)
+        response.raise_for_status()
+    return samples
+
+
+def bench_v3_log(db_path: str, shared: bool, requests: int, wal: bool) -> list[float]:
+    shared_service = ReservationService(db_path=db_path, sqlite_wal=wal)
+    samples = []
+    for i in range(requests):
+        start = time.perf_counter()
+        service = shared_service if shared else ReservationService(db_path=db_path, sqlite_wal=wal)
+        service.log_conversation(session_id=f"bench-{i % 20}", user_message="Kdaj ste odprti?", bot_response="Ob vikendih.")
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def bench_construct(db_path: str, shared: bool, requests: int, wal: bool) -> list[float]:
+    shared_service = ReservationService(db_path=db_path, sqlite_wal=wal)
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        _ = shared_service if shared else ReservationService(db_path=db_path, sqlite_wal=wal)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--wal", action="store_true", help="SQLite v WAL načinu (SQLITE_WAL_MODE)")
+    args = parser.parse_args()
+
+    # brez odhodnih e-mailov med meritvijo
+    webhook_router.send_admin_notification = lambda *_args, **_kwargs: None
+
+    for shared in (False, True):
+        mode = "skupna" if shared else "na zahtevek"
+        db_path = str(Path(tempfile.mkdtemp(prefix="bench-latency-")) / "reservations.db")
+        print(_summary(f"konstrukcija ({mode})", bench_construct(db_path, shared, args.requests, args.wal)))
+        print(_summary(f"webhook ({mode})", bench_webhook(db_path, shared, args.requests, args.wal)))
+        print(_summary(f"v3 log ({mode})", bench_v3_log(db_path, shared, args.requests, args.wal)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Benchmark sočasnega pisanja/branja v SQLite: privzeti journal vs WAL + pisalna nit.
+
+Simulira izbruh pisanj (log_conversation iz več niti: chat, IMAP, scheduler,
+webhook, admin) in hkrati meri latenco branja (get_conversations).
+
+Zagon:
+    PYTHONPATH=. python scripts/bench_sqlite_concurrency.py [--writers 16] [--writes 200] [--readers 4]
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app.services.reservation_service import ReservationService  # noqa: E402
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def run(mode: str, writers: int, writes: int, readers: int) -> dict:
+    tmp = tempfile.mkdtemp(prefix=f"bench-{mode}-")
+    service = ReservationService(db_path=str(Path(tmp) / "reservations.db"), sqlite_wal=(mode == "wal"))
+    errors: list[str] = []
+    read_latencies: list[float] = []
+    done = threading.Event()
+
+    def _writer(idx: int) -> None:
+        for i in range(writes):
+            try:
+                service.log_conversation(
+                    session_id=f"bench-{idx}",
+                    user_message=f"sporočilo {i}",
+                    bot_response="odgovor " * 20,
+                    intent="bench",
+                )
+            except Exception as exc:  # "database is locked"
+                errors.append(str(exc))
+
+    def _reader() -> None:
+        while not done.is_set():
+            start = time.perf_counter()
+            try:
+                service.get_conversations(limit=50)
+            except Exception as exc:
+                errors.append(f"read: {exc}")
+                continue
+            read_latencies.append((time.perf_counter() - start) * 1000)
+
+    reader_threads = [threading.Thread(target=_reader) for _ in range(readers)]
+    writer_threads = [threading.Thread(target=_writer, args=(i,)) for i in range(writers)]
+    for t in reader_threads:
+        t.start()
+    start = time.perf_counter()
+    for t in writer_threads:
+        t.start()
+    for t in writer_threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    for t in reader_threads:
+        t.join()
+
+    total = writers * writes
+    ok = total - len([e for e in errors if not e.startswith("read:")])
+    return {
+        "mode": mode,
+        "writes_ok": ok,
+        "writes_failed": total - ok,
+        "writes_per_sec": round(ok / elapsed, 1) if elapsed else 0.0,
+        "reads": len(read_latencies),
+        "read_p50_ms": round(statistics.median(read_latencies), 2) if read_latencies else 0.0,
+        "read_p95_ms": round(_percentile(read_latencies, 95), 2),
+        "read_max_ms": round(max(read_latencies), 2) if read_latencies else 0.0,
+        "sample_error": errors[0] if errors else "",
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--writers", type=int, default=16)
+    parser.add_argument("--writes", type=int, default=200)
+    parser.add_argument("--readers", type=int, default=4)
+    args = parser.parse_args()
+
+    for mode in ("default", "wal"):
+        result = run(mode, args.writers, args.writes, args.readers)
+        print(
+            f"[{result['mode']:>7}] pisanja: {result['writes_ok']} ok / {result['writes_failed']} napak | "
+            f"{result['writes_per_sec']} w/s | branja: {result['reads']} "
+            f"p50={result['read_p50_ms']}ms p95={result['read_p95_ms']}ms max={result['read_max_ms']}ms"
+        )
+        if result["sample_error"]:
+            print(f"          primer napake: {result['sample_error']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Število povezav in SQL poizvedb na eno potezo rezervacije (z in brez unit_of_work).
+
+Poteza ponovi klice, ki jih booking flow naredi ob potrditvi sobe:
+validate_room_rules, check_room_availability, available_rooms,
+create_reservation(claim=True) in get_reservation. Stavki se štejejo s
+sqlite3 set_trace_callback na vsaki odprti povezavi.
+
+Zagon:
+    PYTHONPATH=. python scripts/bench_turn_queries.py [--turns 50]
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app.services.occupancy_ledger import ReservationConflict  # noqa: E402
+from app.services.reservation_service import ReservationService  # noqa: E402
+from app.services.unit_of_work import unit_of_work  # noqa: E402
+
+
+_QUERY_VERBS = {"SELECT", "INSERT", "UPDATE", "DELETE"}
+
+
+class Counter:
+    def __init__(self) -> None:
+        self.connections = 0
+        self.statements = 0
+        self.queries = 0
+
+    def instrument(self, service: ReservationService) -> None:
+        connect = service._connect
+
+        def counting_connect(*args, **kwargs):
+            conn = connect(*args, **kwargs)
+            self.connections += 1
+            conn.set_trace_callback(self._trace)
+            return conn
+
+        service._connect = counting_connect
+
+    def _trace(self, statement: str) -> None:
+        self.statements += 1
+        # poizvedbe brez BEGIN/SAVEPOINT/COMMIT
+        if statement.lstrip().split(" ", 1)[0].upper() in _QUERY_VERBS:
+            self.queries += 1
+
+
+def booking_turn(service: ReservationService, arrival: str, guest: int) -> None:
+    service.validate_room_rules(arrival, 3)
+    service.check_room_availability(arrival, 3, 2)
+    service.available_rooms(arrival, 3)
+    try:
+        res_id = service.create_reservation(
+            date=arrival, people=2, reservation_type="room", nights=3, rooms=1,
+            name=f"Gost {guest}", email="gost@example.com", claim=True,
+        )
+    except ReservationConflict:
+        return
+    service.get_reservation(res_id)
+    service.get_reservation(res_id)
+
+
+def arrivals(count: int) -> list[str]:
+    """Sobote v prihodnosti (sobe so ob sobotah odprte, 3 noči zadostijo poletnemu minimumu)."""
+    day = datetime.now() + timedelta(days=30)
+    day += timedelta(days=(5 - day.weekday()) % 7)
+    return [(day + timedelta(weeks=i)).strftime("%d.%m.%Y") for i in range(count)]
+
+
+def run(turns: int, use_uow: bool) -> tuple[Counter, list[float]]:
+    db_path = str(Path(tempfile.mkdtemp(prefix="bench-turn-")) / "reservations.db")
+    service = ReservationService(db_path=db_path)
+    service.warm_up()
+    counter = Counter()
+    counter.instrument(service)
+    samples = []
+    for guest, arrival in enumerate(arrivals(turns)):
+        start = time.perf_counter()
+        if use_uow:
+            with unit_of_work():
+                booking_turn(service, arrival, guest)
+        else:
+            booking_turn(service, arrival, guest)
+        samples.append((time.perf_counter() - start) * 1000)
+    return counter, samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=50)
+    args = parser.parse_args()
+
+    for label, use_uow in (("brez unit_of_work", False), ("unit_of_work", True)):
+        counter, samples = run(args.turns, use_uow)
+        print(
+            f"{label:<18} povezav/potezo={counter.connections / args.turns:4.1f} "
+            f"poizvedb/potezo={counter.queries / args.turns:5.1f} "
+            f"stavkov/potezo={counter.statements / args.turns:5.1f} "
+            f"p50={statistics.median(samples):6.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Obremenitveni test asinhronega /v2/chat: N hkratnih sej, LLM s simulirano zakasnitvijo.
+
+Vsaka seja pošlje --turns sporočil, ki gredo skozi LLM zaznavo namena in
+LLM odgovor (2 klica na potezo). Namesto OpenAI se uporabi odjemalec, ki
+odgovor vrne po --llm-latency-ms (brez omrežja, brez ključa). Izpiše
+prepustnost, p50/p95 in največ hkratnih klicev LLM (mora biti <=
+LLM_MAX_CONCURRENCY).
+
+Za primerjavo: sinhroni endpoint v privzetem threadpoolu (40 niti) zmore
+največ 40 / (2 * zakasnitev) potez na sekundo.
+
+Zagon:
+    PYTHONPATH=.:2026 python scripts/load_test_v2_async.py [--sessions 200] [--llm-latency-ms 500]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "2026"))
+
+import httpx  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+
+from app.core import llm_client  # noqa: E402
+from app.rag import knowledge_base  # noqa: E402
+from app2026.chat import intent as intent_mod  # noqa: E402
+from app2026.chat import router as v2_router  # noqa: E402
+
+THREADPOOL_SIZE = 40
+MESSAGE = "Pripovedujte zgodbo"
+
+
+class FakeLLM:
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.active = 0
+        self.peak = 0
+        self.calls = 0
+        self.responses = SimpleNamespace(create=self.create)
+
+    async def create(self, model: str, input: list, max_output_tokens: int) -> SimpleNamespace:
+        self.calls += 1
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.active -= 1
+        prompt = str(input[-1].get("content", ""))
+        return SimpleNamespace(output_text="fallback" if prompt.startswith("Odgovori SAMO") else "Družina Kovačnik.")
+
+
+async def run(sessions: int, turns: int, fake: FakeLLM) -> list[float]:
+    app = FastAPI()
+    app.include_router(v2_router.router)
+    samples: list[float] = []
+
+    async def guest(index: int, http: httpx.AsyncClient) -> None:
+        for turn in range(turns):
+            start = time.perf_counter()
+            res = await http.post("/v2/chat", json={"message": f"{MESSAGE} {turn}", "session_id": f"load-{index}"})
+            res.raise_for_status()
+            samples.append((time.perf_counter() - start) * 1000)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://load", timeout=None) as http:
+        await asyncio.gather(*(guest(i, http) for i in range(sessions)))
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--llm-latency-ms", type=float, default=500)
+    parser.add_argument("--llm-concurrency", type=int, default=llm_client._settings.llm_max_concurrency)
+    args = parser.parse_args()
+
+    fake = FakeLLM(args.llm_latency_ms / 1000)
+    llm_client._settings.llm_max_concurrency = args.llm_concurrency
+    intent_mod.INTENT_LLM_ENABLED = True
+    intent_mod.get_async_llm_client = lambda: fake
+    knowledge_base.get_async_llm_client = lambda: fake
+
+    start = time.perf_counter()
+    samples = asyncio.run(run(args.sessions, args.turns, fake))
+    elapsed = time.perf_counter() - start
+
+    total = args.sessions * args.turns
+    ceiling = THREADPOOL_SIZE / (2 * fake.latency)
+    samples.sort()
+    print(f"seje={args.sessions} potez={total} llm_klicev={fake.calls} zakasnitev_llm={args.llm_latency_ms:.0f}ms")
+    print(
+        f"prepustnost={total / elapsed:7.1f} potez/s  p50={statistics.median(samples):7.1f}ms "
+        f"p95={samples[int(len(samples) * 0.95) - 1]:7.1f}ms  trajanje={elapsed:5.1f}s"
+    )
+    print(f"največ hkratnih LLM klicev={fake.peak} (meja {args.llm_concurrency})")
+    print(f"sinhroni endpoint ({THREADPOOL_SIZE} niti) bi zmogel največ {ceiling:7.1f} potez/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,11 @@
 """
 Pytest bootstrap: doda projektni root v sys.path.
+
+Vsak pytest proces (tudi vsak pytest-xdist worker) dobi svojo bazo v
+pomnilniku namesto skupne data/reservations.db. Test, ki potrebuje povsem
+svojo prazno bazo, uporabi fiksturo `reservation_service`.
 """
+import os
 import sys
 from pathlib import Path
 import pytest
@@ -15,11 +20,14 @@ try:
 except ModuleNotFoundError:
     import types
 
-    psycopg2_stub = types.SimpleNamespace()
+    psycopg2_stub = types.SimpleNamespace(IntegrityError=type("IntegrityError", (Exception,), {}))
     psycopg2_extras_stub = types.SimpleNamespace(RealDictCursor=None)
     sys.modules["psycopg2"] = psycopg2_stub
     sys.modules["psycopg2.extras"] = psycopg2_extras_stub
 
+# nastavi se pred uvozom aplikacije; ReservationService okolje prebere ob vsaki instanci
+os.environ.setdefault("RESERVATIONS_STORAGE", f"memory://tests-{os.environ.get('PYTEST_XDIST_WORKER', 'main')}")
+
 
 def pytest_addoption(parser: pytest.Parser) -> None:
     parser.addoption(
@@ -28,3 +36,14 @@ def pytest_addoption(parser: pytest.Parser) -> None:
         default="http://localhost:8000",
         help="Base URL for live HTTP API tests (e.g. https://...railway.app)",
     )
+
+
+@pytest.fixture
+def reservation_service():
+    """ReservationService nad zasebno prazno bazo v pomnilniku (izgine po testu)."""
+    from app.services.reservation_service import ReservationService
+    from app.services.storage import SQLiteMemoryStorage
+
+    service = ReservationService(storage=SQLiteMemoryStorage())
+    yield service
+    service.storage.close()
@@ -1,4 +1,5 @@
 import sys
+import time
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from types import ModuleType
@@ -127,6 +128,467 @@ def test_v2_session_timeout_resets_state():
     assert refreshed.data == {}
 
 
+def test_v2_session_history_keeps_last_twenty_messages():
+    session = chat_state.get_session("history-cap")
+    for i in range(25):
+        session.history.append({"role": "user", "content": str(i)})
+    assert len(session.history) == chat_state.HISTORY_MAX_MESSAGES
+    assert [item["content"] for item in session.recent_history(2)] == ["23", "24"]
+    with pytest.raises(AttributeError):
+        session.extra = 1
+
+
+def test_session_store_evicts_lru_idle_and_over_budget():
+    from app.services.session.store import SessionStore
+
+    store = SessionStore("test-lru", factory=lambda sid: {"sid": sid}, max_sessions=2, sweep_interval=3600)
+    store.get_or_create("a")
+    store.get_or_create("b")
+    store.get_or_create("a")
+    store.get_or_create("c")
+    assert "b" not in store and "a" in store and "c" in store
+
+    store.idle_ttl = 0.01
+    time.sleep(0.02)
+    assert store.sweep() == 2
+    assert len(store) == 0
+
+    store.idle_ttl = 3600
+    store.memory_budget = 100
+    for sid in ("x", "y", "z"):
+        store.get_or_create(sid)["blob"] = "x" * 40
+    store.sweep()
+    metrics = store.metrics()
+    assert list(store._items) == ["z"]
+    assert metrics["live_sessions"] == 1
+    assert (metrics["evicted_lru"], metrics["evicted_ttl"], metrics["evicted_memory"]) == (2, 2, 1)
+    assert metrics["evictions"] == 5
+    store.close()
+
+
+def test_shared_session_backend_across_workers(tmp_path):
+    from app.services.session.backend import SQLSessionBackend
+    from app.services.storage import SQLiteFileStorage
+
+    backend = SQLSessionBackend(SQLiteFileStorage(str(tmp_path / "sessions.db")))
+    worker_a = chat_state.SessionRepository(chat_state._new_session_store("test-worker-a"), backend)
+    worker_b = chat_state.SessionRepository(chat_state._new_session_store("test-worker-b"), backend)
+
+    session = worker_a.get("shared-1")
+    session.step = "awaiting_email"
+    session.data["reservation"] = {"type": "room", "people": 2}
+    session.history.append({"role": "user", "content": "Rad bi sobo"})
+    assert worker_a.save(session)
+
+    other = worker_b.get("shared-1")
+    assert other.step == "awaiting_email"
+    assert other.data["reservation"] == {"type": "room", "people": 2}
+    assert list(other.history) == [{"role": "user", "content": "Rad bi sobo"}]
+    other.step = "awaiting_confirmation"
+    assert worker_b.save(other)
+
+    # nespremenjena seja se ne bere znova, spremenjena pa
+    blob_loads = backend.stats["blob_loads"]
+    assert worker_b.get("shared-1") is other
+    assert backend.stats["blob_loads"] == blob_loads
+    # worker A ima zastarelo verzijo: zapis se zavrne, naslednje branje vrne novo stanje
+    session.step = "stale"
+    assert worker_a.save(session) is False
+    assert worker_a.get("shared-1").step == "awaiting_confirmation"
+    assert backend.stats["conflicts"] == 1
+
+    worker_a.reset("shared-1")
+    assert worker_b.get("shared-1").step is None
+    worker_a.store.close()
+    worker_b.store.close()
+
+
+def test_session_conflict_aborts_pending_reservation(tmp_path):
+    from app.services.session.backend import SQLSessionBackend
+    from app.services.storage import SQLiteFileStorage
+
+    backend = SQLSessionBackend(SQLiteFileStorage(str(tmp_path / "sessions.db")))
+    worker_a = chat_state.SessionRepository(chat_state._new_session_store("test-conflict-a"), backend)
+    worker_b = chat_state.SessionRepository(chat_state._new_session_store("test-conflict-b"), backend)
+
+    session = worker_a.get("shared-2")
+    session.active_flow = "reservation"
+    session.step = "awaiting_confirmation"
+    session.data["reservation"] = {"step": "awaiting_confirmation", "type": "room"}
+    assert worker_a.save(session)
+
+    # oba workerja dobita "da"; B vpiše rezervacijo in ponastavi flow, A zapiše prvi
+    first = worker_a.get("shared-2")
+    second = worker_b.get("shared-2")
+    first.history.append({"role": "user", "content": "da"})
+    assert worker_a.save(first)
+    second.active_flow = None
+    second.step = None
+    second.data["reservation"] = {"step": None}
+    assert worker_b.save(second) is False
+
+    # zapisana seja ne čaka več na potrditev (drugi "da" ne rezervira znova)
+    for worker in (worker_a, worker_b):
+        current = worker.get("shared-2")
+        assert (current.active_flow, current.step) == (None, None)
+        assert "reservation" not in current.data
+        assert list(current.history) == [{"role": "user", "content": "da"}]
+    worker_a.store.close()
+    worker_b.store.close()
+
+
+def test_session_snapshot_restores_in_progress_bookings(tmp_path):
+    path = str(tmp_path / "sessions.snapshot.gz")
+    older = chat_state.get_session("snap-older")
+    older.touch()
+    older.step = "awaiting_confirmation"
+    stale = chat_state.get_session("snap-stale")
+    stale.last_activity = datetime.now(timezone.utc) - timedelta(minutes=31)
+    booking = chat_state.get_session("snap-booking")
+    booking.touch()
+    booking.step = "awaiting_email"
+    booking.data["reservation"] = {"step": "awaiting_email", "type": "room"}
+    booking.history.append({"role": "user", "content": "Rad bi sobo"})
+
+    written = chat_state.snapshot_sessions(path)
+    assert written["written"] >= 2
+    for sid in ("snap-older", "snap-booking", "snap-stale"):
+        chat_state.reset_session(sid)
+
+    # najnovejše seje so prve; omejitev odreže starejše
+    stats = chat_state.restore_sessions(path, max_sessions=1)
+    assert stats["restored"] == 1 and stats["truncated"] is True
+    assert stats["ms"] >= 0
+    assert "snap-older" not in chat_state._SESSIONS
+    assert "snap-stale" not in chat_state._SESSIONS
+    restored = chat_state.get_session("snap-booking")
+    assert restored is not booking
+    assert restored.step == "awaiting_email"
+    assert restored.data["reservation"]["type"] == "room"
+    assert list(restored.history) == [{"role": "user", "content": "Rad bi sobo"}]
+    # posnetek se porabi enkrat
+    assert chat_state.restore_sessions(path)["restored"] == 0
+
+
+def test_session_snapshot_is_per_process_and_single_worker(tmp_path, monkeypatch):
+    import os
+
+    path = str(tmp_path / "sessions.snapshot.gz")
+    chat_state.get_session("snap-worker").touch()
+    # dva procesa hkrati: vsak piše v svojo začasno datoteko
+    assert chat_state.snapshot_sessions(path)["written"] >= 1
+    assert chat_state.snapshot_sessions(path)["written"] >= 1
+    assert os.listdir(tmp_path) == ["sessions.snapshot.gz"]
+
+    # drug worker je posnetek porabil med branjem in brisanjem
+    real_remove = os.remove
+
+    def remove_twice(target):
+        real_remove(target)
+        real_remove(target)
+
+    monkeypatch.setattr(chat_state.os, "remove", remove_twice)
+    assert chat_state.restore_sessions(path)["restored"] >= 1
+    monkeypatch.setattr(chat_state.os, "remove", real_remove)
+
+    monkeypatch.setattr(chat_state, "WEB_CONCURRENCY", 2)
+    assert chat_state.snapshot_sessions(path) == {"written": 0, "skipped": "multiple workers"}
+    assert not os.path.exists(path)
+
+
+def test_v2_duplicate_requests_share_one_turn(client, monkeypatch):
+    import asyncio
+    import httpx
+
+    calls = []
+    active = []
+    overlap = []
+
+    async def slow_pipeline(message, session, brand):
+        active.append(message)
+        overlap.append(len(active))
+        await asyncio.sleep(0.2)
+        active.remove(message)
+        calls.append(message)
+        return f"odgovor {len(calls)}"
+
+    monkeypatch.setattr(v2_router, "_decision_pipeline", slow_pipeline)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=client.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            body = {"message": "Rad bi sobo", "session_id": "dedup-1"}
+            first, retry, other = await asyncio.gather(
+                http.post("/v2/chat", json=body),
+                http.post("/v2/chat", json=body),
+                http.post("/v2/chat", json={"message": "Za 2 osebi", "session_id": "dedup-1"}),
+            )
+            tagged = {"message": "Hvala", "session_id": "dedup-1", "message_id": "m-1"}
+            replay_a = await http.post("/v2/chat", json=tagged)
+            replay_b = await http.post("/v2/chat", json=tagged)
+        return first, retry, other, replay_a, replay_b
+
+    first, retry, other, replay_a, replay_b = asyncio.run(scenario())
+    assert first.json() == retry.json()
+    assert other.json()["reply"] != first.json()["reply"]
+    assert replay_a.json() == replay_b.json()
+    # podvojen zahtevek ne sproži druge poteze, poteze iste seje se ne prekrivajo
+    assert sorted(calls) == ["Hvala", "Rad bi sobo", "Za 2 osebi"]
+    assert max(overlap) == 1
+
+
+def test_turn_survives_cancelled_first_request():
+    import asyncio
+
+    from app.services.session.turns import TurnCoalescer
+
+    coalescer = TurnCoalescer()
+    calls = []
+
+    async def turn():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return "odgovor"
+
+    async def scenario():
+        first = asyncio.create_task(coalescer.run("s-cancel", "k", turn))
+        await asyncio.sleep(0.01)
+        retry = asyncio.create_task(coalescer.run("s-cancel", "k", turn))
+        await asyncio.sleep(0.01)
+        # odjemalec prvega zahtevka se odklopi
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await retry
+
+    assert asyncio.run(scenario()) == "odgovor"
+    assert len(calls) == 1
+    assert coalescer.stats["coalesced"] == 1
+
+
+def test_v2_llm_intent_is_async_and_bounded(monkeypatch):
+    import asyncio
+    from types import SimpleNamespace
+
+    from app.core import llm_client
+    from app2026.chat import intent as intent_mod
+
+    active = []
+    peak = []
+
+    async def create(**_kwargs):
+        active.append(1)
+        peak.append(len(active))
+        await asyncio.sleep(0.05)
+        active.pop()
+        return SimpleNamespace(output_text="reservation")
+
+    fake = SimpleNamespace(responses=SimpleNamespace(create=create))
+    monkeypatch.setattr(intent_mod, "get_async_llm_client", lambda: fake)
+    monkeypatch.setattr(llm_client._settings, "llm_max_concurrency", 2)
+
+    async def scenario():
+        return await asyncio.gather(*(intent_mod._detect_intent_llm(f"sporočilo {i}") for i in range(6)))
+
+    assert asyncio.run(scenario()) == ["reservation"] * 6
+    assert max(peak) == 2
+
+
+def test_v3_interpreter_keeps_event_loop_responsive(monkeypatch):
+    import asyncio
+    import json
+    from types import SimpleNamespace
+
+    from app2026.chat_v3 import interpreter
+
+    cancelled = []
+
+    async def create(**_kwargs):
+        try:
+            await asyncio.sleep(0.3)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+        payload = {
+            "intent": "BOOKING_ROOM",
+            "entities": {},
+            "confidence": 0.95,
+            "continue_flow": False,
+            "needs_clarification": False,
+            "clarification_question": None,
+        }
+        return SimpleNamespace(output_text=json.dumps(payload))
+
+    fake = SimpleNamespace(responses=SimpleNamespace(create=create))
+    monkeypatch.setattr(interpreter, "get_async_llm_client", lambda: fake)
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        task = asyncio.create_task(interpreter.interpret_async("Rad bi sobo", [], {}, timeout=2))
+        ticks, worst_lag = 0, 0.0
+        while not task.done():
+            before = loop.time()
+            await asyncio.sleep(0.01)
+            worst_lag = max(worst_lag, loop.time() - before - 0.01)
+            ticks += 1
+        result = task.result()
+
+        timed_out = await interpreter.interpret_async("Rad bi sobo", [], {}, timeout=0.05)
+
+        pending = asyncio.create_task(interpreter.interpret_async("Rad bi sobo", [], {}, timeout=2))
+        await asyncio.sleep(0.05)
+        pending.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await pending
+        return result, ticks, worst_lag, timed_out
+
+    result, ticks, worst_lag, timed_out = asyncio.run(scenario())
+    assert result.intent == "BOOKING_ROOM"
+    # med interpretacijo (~300 ms) je loop obdelal ostale naloge
+    assert ticks >= 10
+    assert worst_lag < 0.1
+    assert timed_out.intent == "UNCLEAR"
+    # prekoračen čas in preklic prekineta tudi sam LLM zahtevek
+    assert len(cancelled) == 2
+
+
+def test_unit_of_work_is_not_held_across_llm_calls(client, monkeypatch):
+    import asyncio
+    from app.services.unit_of_work import current_unit_of_work
+    from app2026.chat_v3.handlers import booking as booking_handler
+    from app2026.chat_v3.schemas import InterpretResult
+
+    seen = {}
+
+    async def detect_reservation(_message, _brand):
+        seen["llm"] = current_unit_of_work()
+        return "reservation"
+
+    def start(session, message, brand):
+        seen["flow"] = current_unit_of_work()
+        return "Za kateri datum?"
+
+    monkeypatch.setattr(v2_router.intent_mod, "detect_intent", detect_reservation)
+    monkeypatch.setattr(v2_router.reservation_flow, "start", start)
+    res = client.post("/v2/chat", json={"message": "Rad bi rezerviral", "session_id": "uow-scope"})
+    assert res.json()["reply"] == "Za kateri datum?"
+    # povezava poteze je zasedena le med sinhronim tokom, ne med LLM klicem
+    assert seen["llm"] is None and seen["flow"] is not None
+
+    seen.clear()
+    session = chat_state.get_session("uow-scope-v3")
+    result = InterpretResult(intent="BOOKING_ROOM", entities={}, confidence=1.0)
+    assert asyncio.run(booking_handler.execute(result, "sobo prosim", session, None)) == {"reply": "Za kateri datum?"}
+    assert seen["flow"] is not None
+
+
+def test_v3_session_io_does_not_block_event_loop(monkeypatch):
+    import asyncio
+    import threading
+
+    from app2026.chat_v3 import router as v3_router
+
+    loop_threads = []
+
+    def slow_get_session(session_id):
+        # skupna hramba: poizvedba v bazi
+        time.sleep(0.3)
+        loop_threads.append(threading.current_thread() is threading.main_thread())
+        raise LookupError(session_id)
+
+    monkeypatch.setattr(v3_router, "get_session", slow_get_session)
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        task = asyncio.create_task(v3_router.handle_message("živjo", "v3-io", None))
+        ticks = 0
+        while not task.done():
+            before = loop.time()
+            await asyncio.sleep(0.01)
+            assert loop.time() - before < 0.1
+            ticks += 1
+        with pytest.raises(LookupError):
+            task.result()
+        return ticks
+
+    assert asyncio.run(scenario()) >= 10
+    assert loop_threads == [False]
+
+
+def test_v3_shadow_runs_off_request_path_on_snapshot(client, monkeypatch):
+    import asyncio
+    import threading
+
+    from app2026.chat_v3.shadow import ShadowEvaluator
+
+    release = threading.Event()
+    seen = []
+
+    async def evaluate(job):
+        await asyncio.to_thread(release.wait, 5)
+        seen.append((job.session.step, dict(job.session.data)))
+
+    evaluator = ShadowEvaluator(evaluate, workers=1, queue_max=2)
+    monkeypatch.setattr(v2_router, "shadow_evaluator", evaluator)
+    monkeypatch.setattr(v2_router._settings, "v3_shadow_mode", True)
+
+    start = time.perf_counter()
+    for i in range(6):
+        res = client.post("/v2/chat", json={"message": "živjo", "session_id": f"shadow-{i}"})
+        assert res.status_code == 200
+    # odgovori ne čakajo na shadow oceno (ta je blokirana)
+    assert time.perf_counter() - start < 4
+    # ena ocena teče, dve čakata v vrsti, ostale so zavržene
+    assert evaluator.stats["submitted"] == 3
+    assert evaluator.stats["dropped"] == 3
+
+    session = chat_state.get_session("shadow-2")
+    session.step = "po oddaji"
+    release.set()
+    evaluator.close()
+    assert evaluator.stats["evaluated"] == 3
+    assert all(step != "po oddaji" for step, _ in seen)
+
+    sampled = ShadowEvaluator(evaluate, sample_rate=0.0)
+    assert sampled.submit("živjo", session, None, "Pozdravljeni") is False
+    assert sampled.stats["sampled_out"] == 1
+
+
+def test_v3_shadow_counts_under_load_and_close_has_one_deadline():
+    import asyncio
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+
+    from app2026.chat_v3.shadow import ShadowEvaluator
+
+    async def evaluate(job):
+        return None
+
+    evaluator = ShadowEvaluator(evaluate, workers=4, queue_max=10_000)
+    # števce hkrati povečujejo niti zahtevkov in ozadne niti
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda i: evaluator.submit(f"m{i}", None, None, "ok"), range(4000)))
+    evaluator.close()
+    metrics = evaluator.metrics()
+    assert metrics["submitted"] + metrics["dropped"] == 4000
+    assert metrics["evaluated"] == metrics["submitted"]
+
+    release = threading.Event()
+
+    async def blocked(job):
+        await asyncio.to_thread(release.wait, 5)
+
+    stuck = ShadowEvaluator(blocked, workers=3, queue_max=3)
+    for i in range(3):
+        stuck.submit(f"m{i}", None, None, "ok")
+    time.sleep(0.1)
+    start = time.perf_counter()
+    stuck.close(timeout=0.3)
+    # en skupni rok za vse niti, ne timeout za vsako posebej
+    assert time.perf_counter() - start < 0.6
+    release.set()
+
+
 def test_v2_kids_ages_requires_numbers(client):
     sid = "kids-ages-validation"
     client.post("/v2/chat", json={"message": "Rad bi rezerviral sobo", "session_id": sid})
@@ -148,11 +610,11 @@ def test_v2_kids_ages_requires_numbers(client):
 
 def test_v2_terminal_allows_short_info_then_resumes(client, monkeypatch):
     original_detect = v2_router.intent_mod.detect_intent
-    monkeypatch.setattr(
-        v2_router.intent_mod,
-        "detect_intent",
-        lambda m, b: "info" if "parking" in m.lower() else original_detect(m, b),
-    )
+
+    async def detect_parking_as_info(m, b):
+        return "info" if "parking" in m.lower() else await original_detect(m, b)
+
+    monkeypatch.setattr(v2_router.intent_mod, "detect_intent", detect_parking_as_info)
     monkeypatch.setattr(v2_router.info_flow, "handle", lambda _m, _b: "Imamo parkirišče.")
 
     sid = "terminal-info-resume"
@@ -171,7 +633,10 @@ def test_v2_terminal_allows_short_info_then_resumes(client, monkeypatch):
 
 def test_v2_awaiting_email_accepts_email_without_info_detour(client, monkeypatch):
     # Force intent detector towards info to prove terminal guard still treats raw email as input.
-    monkeypatch.setattr(v2_router.intent_mod, "detect_intent", lambda _m, _b: "info")
+    async def detect_info(_m, _b):
+        return "info"
+
+    monkeypatch.setattr(v2_router.intent_mod, "detect_intent", detect_info)
 
     sid = "awaiting-email-direct-input"
     session = chat_state.get_session(sid)
@@ -201,7 +666,10 @@ def test_v2_awaiting_email_accepts_email_without_info_detour(client, monkeypatch
 
 def test_v2_awaiting_dinner_da_does_not_detour_to_help(client, monkeypatch):
     # Force a noisy intent to prove terminal guard still consumes valid dinner answer.
-    monkeypatch.setattr(v2_router.intent_mod, "detect_intent", lambda _m, _b: "help")
+    async def detect_help(_m, _b):
+        return "help"
+
+    monkeypatch.setattr(v2_router.intent_mod, "detect_intent", detect_help)
 
     sid = "awaiting-dinner-direct-input"
     session = chat_state.get_session(sid)
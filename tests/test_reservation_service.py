@@ -236,3 +236,1334 @@ class TestAvailability:
         for room in rooms:
             room_upper = room.upper().replace("Ž", "Z")
             assert room_upper in valid_rooms or room in valid_rooms
+
+
+class TestSQLiteWalMode:
+    """Testi za WAL način z eno pisalno nitjo."""
+
+    def test_wal_pragmas_enabled(self, tmp_path):
+        from app.services.reservation_service import ReservationService
+        service = ReservationService(db_path=str(tmp_path / "r.db"), sqlite_wal=True)
+
+        conn = service._conn()
+        try:
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal"
+            assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+        finally:
+            conn.close()
+
+    def test_concurrent_writes_are_not_lost(self, tmp_path):
+        import threading
+        from app.services.reservation_service import ReservationService
+        service = ReservationService(db_path=str(tmp_path / "r.db"), sqlite_wal=True)
+
+        def worker(idx: int) -> None:
+            for i in range(25):
+                service.log_conversation(f"s{idx}", f"msg {i}", "odgovor")
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(service.get_conversations(limit=1000)) == 200
+
+    def test_writes_return_ids(self, tmp_path):
+        from app.services.reservation_service import ReservationService
+        service = ReservationService(db_path=str(tmp_path / "r.db"), sqlite_wal=True)
+
+        res_id = service.create_reservation(
+            date=get_future_date(40), people=2, reservation_type="room", nights=3, source="test"
+        )
+        assert service.get_reservation(res_id)["people"] == 2
+        assert service.update_status(res_id, "confirmed") is True
+        assert service.get_reservation(res_id)["status"] == "confirmed"
+
+    def test_failed_job_does_not_abort_group(self, tmp_path):
+        from app.services.sqlite_writer import SQLiteWriter
+        import sqlite3
+
+        db_path = str(tmp_path / "w.db")
+        sqlite3.connect(db_path).execute("CREATE TABLE t (v INTEGER NOT NULL)").connection.close()
+        writer = SQLiteWriter(db_path)
+        try:
+            ok = writer.submit(lambda cur: cur.execute("INSERT INTO t (v) VALUES (1)"))
+            bad = writer.submit(lambda cur: cur.execute("INSERT INTO t (v) VALUES (NULL)"))
+            ok2 = writer.submit(lambda cur: cur.execute("INSERT INTO t (v) VALUES (2)"))
+            ok.result(5)
+            ok2.result(5)
+            with pytest.raises(sqlite3.IntegrityError):
+                bad.result(5)
+        finally:
+            writer.close()
+        rows = sqlite3.connect(db_path).execute("SELECT v FROM t ORDER BY v").fetchall()
+        assert rows == [(1,), (2,)]
+
+
+class TestOccupancyIndex:
+    """Testi za indeks zasedenosti v pomnilniku."""
+
+    def test_index_follows_writes(self, reservation_service):
+        from app.services.reservation_service import ROOMS
+
+        arrival = get_future_weekday(2, 3)  # sreda
+        res_id = reservation_service.create_reservation(
+            date=arrival, people=8, reservation_type="room", nights=3, source="test"
+        )
+        assert reservation_service._room_occupancy()[arrival] == 2
+        assert len(reservation_service.available_rooms(arrival, 3)) == len(ROOMS) - 2
+        assert reservation_service.check_room_availability(arrival, 3, 4)[0] is True
+        assert reservation_service.check_room_availability(arrival, 3, 8)[0] is False
+
+        reservation_service.update_reservation(res_id, location="ALJAŽ", rooms=1)
+        assert reservation_service.available_rooms(arrival, 3) == [r["id"] for r in ROOMS if r["id"] != "ALJAZ"]
+
+        reservation_service.update_status(res_id, "cancelled")
+        assert reservation_service._room_occupancy() == {}
+        assert len(reservation_service.available_rooms(arrival, 3)) == len(ROOMS)
+
+    def test_table_seats_follow_writes(self, reservation_service):
+        saturday = get_future_saturday(3)
+        res_id = reservation_service.create_reservation(
+            date=saturday, people=12, reservation_type="table", time="13:00",
+            location="Jedilnica Pri peči", source="test",
+        )
+        assert reservation_service._table_room_occupancy() == {(saturday, "13:00", "Jedilnica Pri peči"): 12}
+        reservation_service.update_reservation(res_id, time="14:00")
+        assert reservation_service._table_room_occupancy() == {(saturday, "14:00", "Jedilnica Pri peči"): 12}
+        reservation_service.delete_all_reservations()
+        assert reservation_service._table_room_occupancy() == {}
+
+    def test_incremental_index_matches_full_reload(self, reservation_service):
+        import random
+
+        rng = random.Random(7)
+        base = datetime.now() + timedelta(days=20)
+        ids = []
+        for _ in range(60):
+            arrival = (base + timedelta(days=rng.randint(0, 30))).strftime("%d.%m.%Y")
+            ids.append(reservation_service.create_reservation(
+                date=arrival, people=rng.randint(1, 10), reservation_type="room",
+                nights=rng.randint(2, 5), location=rng.choice([None, "ANA", "JULIJA"]), source="test",
+            ))
+            if rng.random() < 0.3:
+                reservation_service.update_status(rng.choice(ids), rng.choice(["cancelled", "confirmed"]))
+
+        incremental = (reservation_service._room_occupancy(), reservation_service._room_calendar())
+        reservation_service._index.invalidate()
+        assert (reservation_service._room_occupancy(), reservation_service._room_calendar()) == incremental
+
+
+class TestAvailabilityPlanner:
+    """Testi za planer razpoložljivosti (drseče okno nad indeksom)."""
+
+    def test_room_alternative_skips_full_window(self, reservation_service):
+        wednesday = datetime.strptime(get_future_weekday(2, 3), "%d.%m.%Y")
+        reservation_service.create_reservation(
+            date=wednesday.strftime("%d.%m.%Y"), people=12, reservation_type="room", nights=3, source="test"
+        )
+        ok, alternative = reservation_service.check_room_availability(wednesday.strftime("%d.%m.%Y"), 3, 2)
+        assert ok is False
+        # prva možnost je sobota (sreda + 3), ko so vse sobe spet proste
+        assert alternative == (wednesday + timedelta(days=3)).strftime("%d.%m.%Y")
+
+    def test_concrete_rooms_for_window(self, reservation_service):
+        wednesday = datetime.strptime(get_future_weekday(2, 3), "%d.%m.%Y")
+        reservation_service.create_reservation(
+            date=wednesday.strftime("%d.%m.%Y"), people=2, reservation_type="room", nights=2,
+            location="JULIJA", source="test",
+        )
+        planner = reservation_service.planner()
+        start = wednesday.toordinal()
+        assert planner.rooms_for_window(start, 2, 2, preferred=["JULIJA", "ANA"]) == ["ANA", "ALJAZ"]
+        assert planner.rooms_for_window(start, 2, 3) is None
+        assert planner.earliest_room_assignment(start, 2, 3) == (start + 2, ["ALJAZ", "JULIJA", "ANA"])
+
+    def test_next_table_slots_skip_full_slot(self, reservation_service):
+        saturday = get_future_saturday(3)
+        for location, people in (("Jedilnica Pri peči", 15), ("Jedilnica Pri vrtu", 35)):
+            reservation_service.create_reservation(
+                date=saturday, people=people, reservation_type="table", time="12:00",
+                location=location, source="test",
+            )
+        assert reservation_service.suggest_table_slots(saturday, 4, limit=2) == [
+            f"{saturday} ob 12:30 (Jedilnica Pri peči)",
+            f"{saturday} ob 13:00 (Jedilnica Pri peči)",
+        ]
+
+
+class TestAvailabilityApi:
+    """Testi za mesečni API razpoložljivosti (/reservations/availability)."""
+
+    @pytest.fixture
+    def client(self, reservation_service, monkeypatch):
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from app.services import reservation_router
+
+        monkeypatch.setattr(reservation_router, "reservation_service", reservation_service)
+        app = FastAPI()
+        app.include_router(reservation_router.router)
+        return TestClient(app), reservation_service
+
+    def test_month_calendar_and_etag(self, client):
+        http, service = client
+        wednesday = datetime.strptime(get_future_weekday(2, 3), "%d.%m.%Y")
+        month = wednesday.strftime("%Y-%m")
+
+        first = http.get("/reservations/availability", params={"start": month})
+        assert first.status_code == 200
+        body = first.json()
+        day = next(d for d in body["rooms"]["days"] if d["date"] == wednesday.strftime("%Y-%m-%d"))
+        assert day["free_rooms"] == 3 and day["arrival_allowed"] is True
+        assert all(slot["time"] <= "15:00" for slot in body["tables"]["slots"])
+
+        etag = first.headers["etag"]
+        cached = http.get("/reservations/availability", params={"start": month}, headers={"If-None-Match": etag})
+        assert cached.status_code == 304
+
+        service.create_reservation(
+            date=wednesday.strftime("%d.%m.%Y"), people=2, reservation_type="room", nights=2,
+            location="ANA", source="test",
+        )
+        fresh = http.get("/reservations/availability", params={"start": month}, headers={"If-None-Match": etag})
+        assert fresh.status_code == 200
+        day = next(d for d in fresh.json()["rooms"]["days"] if d["date"] == wednesday.strftime("%Y-%m-%d"))
+        assert day["free_rooms"] == 2 and "ANA" not in day["free_room_ids"]
+
+    def test_invalid_range(self, client):
+        http, _ = client
+        assert http.get("/reservations/availability", params={"months": 12}).status_code == 400
+        assert http.get("/reservations/availability", params={"start": "2026-13"}).status_code == 400
+
+
+class TestStayDateColumns:
+    """Testi za ISO stolpca start_date/end_date in filtriranje po obdobju."""
+
+    def test_columns_follow_writes(self, reservation_service):
+        res_id = reservation_service.create_reservation(
+            date="5.6.2030", people=2, reservation_type="room", nights=3, source="test"
+        )
+        row = reservation_service.get_reservation(res_id)
+        assert (row["start_date"], row["end_date"]) == ("2030-06-05", "2030-06-07")
+
+        reservation_service.update_reservation(res_id, nights=5)
+        row = reservation_service.get_reservation(res_id)
+        assert (row["start_date"], row["end_date"]) == ("2030-06-05", "2030-06-09")
+
+    def test_overlap_filter_in_sql(self, reservation_service):
+        inside = reservation_service.create_reservation(
+            date="28.06.2030", people=2, reservation_type="room", nights=4, source="test"
+        )
+        reservation_service.create_reservation(
+            date="10.07.2030", people=2, reservation_type="room", nights=3, source="test"
+        )
+        table = reservation_service.create_reservation(
+            date="1.7.2030", people=4, reservation_type="table", time="13:00", source="test"
+        )
+        undated = reservation_service.create_reservation(
+            date="po dogovoru", people=2, reservation_type="room", nights=2, source="test"
+        )
+
+        found = reservation_service.read_reservations(date_from="2030-07-01", date_to="2030-07-05")
+        assert {r["id"] for r in found} == {inside, table}
+        found = reservation_service.read_reservations(
+            date_from="2030-07-01", date_to="2030-07-05", include_undated=True
+        )
+        assert {r["id"] for r in found} == {inside, table, undated}
+
+    def test_backfill_existing_rows(self, tmp_path):
+        import sqlite3
+        from app.services.reservation_service import ReservationService
+
+        db_path = str(tmp_path / "r.db")
+        service = ReservationService(db_path=db_path)
+        res_id = service.create_reservation(date="07.08.2030", people=2, reservation_type="room", nights=2, source="test")
+        conn = sqlite3.connect(db_path)
+        # simuliramo bazo pred migracijo 3
+        conn.execute("UPDATE reservations SET start_date = NULL, end_date = NULL")
+        conn.execute("DELETE FROM schema_version WHERE version >= 3")
+        conn.commit()
+        conn.close()
+
+        service = ReservationService(db_path=db_path)
+        row = service.get_reservation(res_id)
+        assert (row["start_date"], row["end_date"]) == ("2030-08-07", "2030-08-08")
+
+
+class TestMigrations:
+    """Testi za verzionirane migracije sheme."""
+
+    def test_fresh_db_gets_all_versions_and_indexes(self, tmp_path):
+        import sqlite3
+        from app.services.migrations import LATEST_VERSION, run_migrations
+        from app.services.reservation_service import ReservationService
+
+        db_path = str(tmp_path / "r.db")
+        service = ReservationService(db_path=db_path)
+        conn = sqlite3.connect(db_path)
+        versions = [row[0] for row in conn.execute("SELECT version FROM schema_version ORDER BY version")]
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        conn.close()
+
+        assert versions == list(range(1, LATEST_VERSION + 1))
+        assert {"idx_conversations_session_created", "idx_reservation_messages_message_id",
+                "idx_report_log_type_sent", "idx_reservations_type_status_start",
+                "idx_chat_sessions_updated"} <= indexes
+        assert run_migrations(service._conn, postgres=False, key=db_path) == []
+
+    def test_legacy_db_is_upgraded(self, tmp_path):
+        import sqlite3
+        from app.services.reservation_service import ReservationService
+
+        db_path = str(tmp_path / "legacy.db")
+        conn = sqlite3.connect(db_path)
+        conn.execute(
+            "CREATE TABLE reservations (id INTEGER PRIMARY KEY AUTOINCREMENT, date TEXT NOT NULL, nights INTEGER, "
+            "people INTEGER NOT NULL, reservation_type TEXT NOT NULL, time TEXT, location TEXT, name TEXT, "
+            "phone TEXT, email TEXT, note TEXT, created_at TEXT NOT NULL, source TEXT NOT NULL)"
+        )
+        conn.execute(
+            "INSERT INTO reservations (date, nights, people, reservation_type, created_at, source) "
+            "VALUES ('03.09.2030', 2, 2, 'room', '2030-01-01T00:00:00', 'import')"
+        )
+        conn.commit()
+        conn.close()
+
+        service = ReservationService(db_path=db_path)
+        row = service.read_reservations(limit=1)[0]
+        assert row["status"] == "pending"
+        assert (row["start_date"], row["end_date"]) == ("2030-09-03", "2030-09-04")
+
+
+class TestSharedService:
+    """Testi za skupno instanco storitve."""
+
+    def test_shared_instance_is_reused(self):
+        from app.services import admin_router, reservation_router
+        from app.services.reservation_service import get_reservation_service
+
+        service = get_reservation_service()
+        assert get_reservation_service() is service
+        assert admin_router.service is service
+        assert reservation_router.reservation_service is service
+
+
+class TestStorage:
+    """Testi za izbiro hrambe (RESERVATIONS_STORAGE / DATABASE_URL)."""
+
+    def test_storage_from_url(self, tmp_path):
+        from app.services.storage import (
+            PostgresStorage, SQLiteFileStorage, SQLiteMemoryStorage, storage_from_url,
+        )
+
+        anonymous = storage_from_url("memory")
+        assert isinstance(anonymous, SQLiteMemoryStorage) and anonymous.needs_writer
+        other = storage_from_url("memory")
+        assert other.key != anonymous.key
+        named = storage_from_url("memory://skupna")
+        assert named.key == "memory:skupna"
+        for storage in (anonymous, other, named):
+            storage.close()
+
+        path = str(tmp_path / "r.db")
+        file_storage = storage_from_url(f"sqlite:///{path}")
+        assert isinstance(file_storage, SQLiteFileStorage) and file_storage.path == path
+
+        for url in ("postgres://u:geslo@db/app", "postgresql://u:geslo@db/app"):
+            storage = storage_from_url(url)
+            assert isinstance(storage, PostgresStorage)
+            assert (storage.dialect, storage.key) == ("postgres", url)
+            assert "geslo" not in repr(storage)
+
+        with pytest.raises(ValueError):
+            storage_from_url("mysql://db/app")
+
+    def test_storage_from_env(self, tmp_path, monkeypatch):
+        from app.services.storage import PostgresStorage, SQLiteFileStorage, storage_from_env
+
+        default = str(tmp_path / "r.db")
+        monkeypatch.delenv("RESERVATIONS_STORAGE")
+        assert isinstance(storage_from_env(default), SQLiteFileStorage)
+        assert storage_from_env(default, "postgres://db/app").url == "postgres://db/app"
+        assert isinstance(storage_from_env(default, "postgres://db/app"), PostgresStorage)
+        # RESERVATIONS_STORAGE ima prednost pred DATABASE_URL
+        monkeypatch.setenv("RESERVATIONS_STORAGE", f"sqlite:///{default}")
+        assert storage_from_env("drugo.db", "postgres://db/app").path == default
+
+    def test_memory_databases_are_isolated(self):
+        from app.services.reservation_service import ReservationService
+        from app.services.storage import storage_from_url
+
+        first = ReservationService(storage=storage_from_url("memory"))
+        second = ReservationService(storage=storage_from_url("memory"))
+        first.create_reservation(date="12.06.2030", people=2, reservation_type="room", nights=3, source="test")
+        assert len(first.read_reservations(limit=10)) == 1
+        assert second.read_reservations(limit=10) == []
+        assert second.check_room_availability("12.06.2030", 3, 12)[0] is True
+
+        first.storage.close()
+        second.storage.close()
+
+        # isto ime pomeni isto bazo tudi za novo instanco
+        name = f"memory://skupna-{id(first)}"
+        ReservationService(storage=storage_from_url(name)).create_reservation(
+            date="12.06.2030", people=2, reservation_type="room", nights=3, source="test"
+        )
+        shared = ReservationService(storage=storage_from_url(name))
+        assert len(shared.read_reservations(limit=10)) == 1
+        shared.storage.close()
+
+    def test_memory_storage_close_releases_resources(self):
+        import sqlite3
+        import threading
+        from app.services import conversation_log, occupancy_index, sqlite_writer
+        from app.services.reservation_service import ReservationService
+        from app.services.storage import _MEMORY_ANCHORS, SQLiteMemoryStorage, Storage
+
+        with pytest.raises(TypeError):
+            Storage()
+
+        before = {t.name for t in threading.enumerate()}
+        storage = SQLiteMemoryStorage()
+        service = ReservationService(storage=storage)
+        service.log_conversation("s1", "Kdaj ste odprti?", "Ob vikendih.", defer=True)
+        writer = service._writer
+        assert storage.key in sqlite_writer._WRITERS
+
+        storage.close()
+        assert storage.key not in sqlite_writer._WRITERS
+        assert storage.key not in occupancy_index._INDEXES
+        assert storage.key not in conversation_log._LOGS
+        assert not writer._thread.is_alive()
+        assert {t.name for t in threading.enumerate()} <= before
+        with pytest.raises(sqlite3.ProgrammingError):
+            storage._anchor.execute("SELECT 1")
+        # brez sidra baze ni več: nova povezava z istim imenom vidi prazno bazo
+        fresh = storage.connect()
+        assert fresh.execute("SELECT name FROM sqlite_master").fetchall() == []
+        fresh.close()
+
+        named = SQLiteMemoryStorage(f"zapri-{id(storage)}")
+        named.close()
+        assert named.name not in _MEMORY_ANCHORS
+
+    def test_postgres_url_is_passed_to_psycopg2(self, monkeypatch):
+        from app.services import storage as storage_module
+
+        calls = []
+        monkeypatch.setattr(
+            storage_module.psycopg2, "connect", lambda url, **kwargs: calls.append((url, kwargs)) or "conn",
+            raising=False,
+        )
+        storage = storage_module.storage_from_url("postgresql://u:geslo@db:5432/app")
+        assert storage.connect() == "conn"
+        assert calls == [("postgresql://u:geslo@db:5432/app", {"cursor_factory": storage_module.RealDictCursor})]
+
+
+class TestConversationLogQueue:
+    """Testi za odloženo beleženje pogovorov."""
+
+    def test_deferred_rows_are_flushed_in_batches(self, tmp_path):
+        from app.services.reservation_service import ReservationService
+        service = ReservationService(db_path=str(tmp_path / "r.db"))
+
+        for i in range(30):
+            assert service.log_conversation(f"s{i % 3}", f"vprašanje {i}", "odgovor", defer=True) is None
+        log = service.conversation_log()
+        log.close()
+
+        assert len(service.get_conversations(limit=100)) == 30
+        assert log.stats["flushed"] == 30
+        assert log.stats["flushes"] < 30
+
+    def test_spill_and_replay_when_db_fails(self, tmp_path):
+        from app.services.conversation_log import ConversationLogQueue
+
+        stored: list[tuple] = []
+        failing = {"on": True}
+
+        def insert_rows(rows):
+            if failing["on"]:
+                raise RuntimeError("baza ni dosegljiva")
+            stored.extend(rows)
+
+        spill = tmp_path / "spill.jsonl"
+        log = ConversationLogQueue(insert_rows, str(spill), batch_rows=5, flush_ms=20)
+        row = ("s1", "vprašanje", "odgovor", None, False, None, "2030-01-01 10:00:00")
+        log.enqueue(row)
+        import time
+        deadline = time.time() + 5
+        while not spill.exists() and time.time() < deadline:
+            time.sleep(0.01)
+        assert spill.exists()
+
+        failing["on"] = False
+        log.enqueue(row)
+        log.close()
+        assert stored == [row, row]
+        assert not spill.exists()
+        assert log.stats["replayed"] == 1
+
+    def test_failed_replay_keeps_only_remaining_rows(self, tmp_path):
+        import json
+        from app.services.conversation_log import ConversationLogQueue
+
+        spill = tmp_path / "spill.jsonl"
+        rows = [(f"s{i}", f"vprašanje {i}", "odgovor", None, False, None, "2030-01-01 10:00:00") for i in range(5)]
+        spill.write_text("".join(json.dumps(list(row)) + "\n" for row in rows), encoding="utf-8")
+        stored: list[tuple] = []
+
+        def insert_rows(batch):
+            if len(stored) >= 2:
+                raise RuntimeError("baza ni dosegljiva")
+            stored.extend(batch)
+
+        log = ConversationLogQueue(insert_rows, str(spill), batch_rows=2, flush_ms=20)
+        log.close()
+        # prvi paket je zapisan, v datoteki ostanejo le preostale vrstice
+        assert stored == rows[:2]
+        assert [tuple(json.loads(line)) for line in spill.read_text(encoding="utf-8").splitlines()] == rows[2:]
+
+        stored.clear()
+        log = ConversationLogQueue(stored.extend, str(spill), batch_rows=2, flush_ms=20)
+        log.close()
+        assert stored == rows[2:]
+        assert not spill.exists()
+
+    def test_spill_does_not_wait_for_replay_inserts(self, tmp_path):
+        import json
+        import threading
+        from app.services.conversation_log import ConversationLogQueue
+
+        spill = tmp_path / "spill.jsonl"
+        rows = [(f"s{i}", f"vprašanje {i}", "odgovor", None, False, None, "2030-01-01 10:00:00") for i in range(4)]
+        spill.write_text("".join(json.dumps(list(row)) + "\n" for row in rows), encoding="utf-8")
+        inserting, release = threading.Event(), threading.Event()
+        stored: list[tuple] = []
+
+        def slow_insert(batch):
+            inserting.set()
+            release.wait(5)
+            stored.extend(batch)
+
+        log = ConversationLogQueue(slow_insert, str(spill), batch_rows=2, flush_ms=20)
+        assert inserting.wait(5)
+        late = ("s9", "pozno", "odgovor", None, False, None, "2030-01-01 11:00:00")
+        spiller = threading.Thread(target=log._spill, args=([late],))
+        spiller.start()
+        spiller.join(1)
+        # prelivanje iz niti zahtevka ne čaka na zapis v bazo
+        assert not spiller.is_alive()
+        release.set()
+        log.close()
+        assert stored == rows
+        assert [tuple(json.loads(line)) for line in spill.read_text(encoding="utf-8").splitlines()] == [late]
+
+    def test_poison_rows_move_to_quarantine(self, tmp_path, monkeypatch):
+        import json
+        from app.services import conversation_log
+        from app.services.conversation_log import ConversationLogQueue
+
+        monkeypatch.setattr(conversation_log, "CONV_LOG_REPLAY_ATTEMPTS", 2)
+        spill = tmp_path / "spill.jsonl"
+        rows = [(f"s{i}", f"vprašanje {i}", "odgovor", None, False, None, "2030-01-01 10:00:00") for i in range(5)]
+        rows[1] = ("s1", None, "odgovor", None, False, None, "2030-01-01 10:00:00")
+        spill.write_text("".join(json.dumps(list(row)) + "\n" for row in rows), encoding="utf-8")
+        stored: list[tuple] = []
+
+        def insert_rows(batch):
+            if any(row[1] is None for row in batch):
+                raise ValueError("user_message ne sme biti NULL")
+            stored.extend(batch)
+
+        log = ConversationLogQueue(insert_rows, str(spill), batch_rows=2, flush_ms=20)
+        log.close()
+        # prvi neuspeh: paket in vse za njim ostanejo v datoteki
+        assert stored == [] and len(spill.read_text(encoding="utf-8").splitlines()) == 5
+
+        log._replay_spill()
+        assert stored == [rows[0], rows[2], rows[3], rows[4]]
+        assert not spill.exists()
+        quarantine = tmp_path / "spill.jsonl.quarantine"
+        assert [tuple(json.loads(line)) for line in quarantine.read_text(encoding="utf-8").splitlines()] == [rows[1]]
+        assert log.stats["quarantined"] == 1
+
+
+class TestAnalyticsRollups:
+    """Testi za inkrementalne povzetke pogovorov (admin plošča)."""
+
+    def test_dashboard_stats_from_rollups(self, reservation_service, monkeypatch):
+        from app.services import analytics_rollup
+
+        monkeypatch.setattr(analytics_rollup, "ANALYTICS_ROLLUP_BATCH", 3)
+        for _ in range(3):
+            reservation_service.log_conversation("s1", "Kdaj ste odprti?", "Ob vikendih.", intent="info")
+        reservation_service.log_conversation("s2", "Kdaj ste odprti?", "Ne vem.", intent="info", needs_followup=True)
+        reservation_service.log_conversation("s2", "Bi rezerviral sobo.", "Da.", intent="reservation_room")
+        reservation_service.log_conversation("s2", "ok", "Super.", intent="reservation_completed")
+        reservation_service.log_conversation("s3", "041 123 4567", "Hvala.", intent="reservation_room")
+
+        assert reservation_service.get_top_questions(limit=5) == [{"user_message": "Kdaj ste odprti?", "count": 4}]
+        assert reservation_service.get_lost_intents(limit=5) == [{"user_message": "Kdaj ste odprti?", "count": 1}]
+        funnel = reservation_service.get_funnel_stats(days=7)
+        assert (funnel["total_sessions"], funnel["reservation_started"], funnel["reservation_completed"]) == (3, 2, 1)
+        assert reservation_service.get_usage_stats() == {"today": 3, "month": 3, "year": 3}
+        assert {"intent": "info", "count": 4} in reservation_service.get_intent_stats(days=7)
+
+        # nove vrstice se prištejejo ob zapisu, obstoječe se ne štejejo dvakrat
+        reservation_service.log_conversation("s4", "Kdaj ste odprti?", "Ob vikendih.", intent="info")
+        reservation_service.insert_conversations(
+            [("s5", "Kdaj ste odprti?", "Ob vikendih.", "info", False, None, "2030-01-01 10:00:00")]
+        )
+        assert reservation_service.refresh_analytics() == 0
+        assert reservation_service.get_top_questions(limit=1)[0]["count"] == 6
+
+    def test_late_commit_with_lower_id_is_not_skipped(self, tmp_path):
+        import sqlite3
+        from app.services.reservation_service import ReservationService
+
+        db_path = str(tmp_path / "r.db")
+        service = ReservationService(db_path=db_path)
+        for _ in range(3):
+            service.log_conversation("s1", "Kdaj ste odprti?", "Ob vikendih.", intent="info")
+        # vrstica z nižjim id, potrjena za višjimi (npr. sočasen zapis v Postgresu)
+        conn = sqlite3.connect(db_path)
+        conn.execute("DELETE FROM conversations WHERE id = 2")
+        conn.execute(
+            "INSERT INTO conversations (id, session_id, user_message, bot_response, intent, created_at) "
+            "VALUES (2, 's2', 'Kje ste?', 'Na Pohorju.', 'info', '2030-01-01 10:00:00')"
+        )
+        conn.commit()
+        conn.close()
+
+        # branje plošče ne piše povzetkov
+        assert [row["user_message"] for row in service.get_top_questions(limit=5)] == ["Kdaj ste odprti?"]
+        assert service.refresh_analytics() == 1
+        assert service.refresh_analytics() == 0
+        assert {row["user_message"] for row in service.get_top_questions(limit=5)} == {"Kdaj ste odprti?", "Kje ste?"}
+
+    def test_delete_all_conversations_resets_rollups(self, reservation_service):
+        reservation_service.log_conversation("s1", "Kdaj ste odprti?", "Ob vikendih.")
+        assert reservation_service.get_usage_stats()["today"] == 1
+        reservation_service.log_conversation("s2", "Kje ste?", "Na Pohorju.")
+        reservation_service.delete_all_conversations()
+
+        assert reservation_service.get_top_questions() == []
+        assert reservation_service.get_usage_stats() == {"today": 0, "month": 0, "year": 0}
+
+
+class TestReservationStats:
+    """Testi za SQL števce rezervacij na admin plošči."""
+
+    def test_counts_and_invalidation_on_write(self, tmp_path):
+        import sqlite3
+        from app.services.reservation_service import ReservationService
+
+        db_path = str(tmp_path / "r.db")
+        service = ReservationService(db_path=db_path)
+        first = service.create_reservation(
+            date=get_future_date(40), people=2, reservation_type="room", source="test", nights=2, rooms=1
+        )
+        service.create_reservation(
+            date=get_future_saturday(3), people=4, reservation_type="table", source="test", time="13:00"
+        )
+        conn = sqlite3.connect(db_path)
+        conn.execute(
+            "INSERT INTO reservations (date, people, reservation_type, status, created_at, source) "
+            "VALUES ('01.01.2020', 2, 'table', 'rejected', '2020-01-01T10:00:00', 'import')"
+        )
+        conn.commit()
+        conn.close()
+
+        stats = service.reservation_stats()
+        assert (stats["pending"], stats["rejected"], stats["room"], stats["table"]) == (2, 1, 1, 2)
+        assert (stats["today"], stats["week"], stats["month"]) == (2, 2, 2)
+
+        service.update_status(first, "confirmed")
+        stats = service.reservation_stats()
+        assert (stats["pending"], stats["confirmed"]) == (1, 1)
+
+    def test_cache_expires_for_external_writes(self, tmp_path, monkeypatch):
+        import sqlite3
+        from app.services import reservation_service as module
+
+        db_path = str(tmp_path / "r.db")
+        service = module.ReservationService(db_path=db_path)
+        assert service.reservation_stats()["pending"] == 0
+        conn = sqlite3.connect(db_path)
+        conn.execute(
+            "INSERT INTO reservations (date, people, reservation_type, status, created_at, source) "
+            "VALUES ('01.01.2031', 2, 'table', 'pending', '2030-01-01T10:00:00', 'import')"
+        )
+        conn.commit()
+        conn.close()
+
+        assert service.reservation_stats()["pending"] == 0
+        monkeypatch.setattr(module, "ADMIN_STATS_TTL", 0)
+        service._stats_cache = None
+        assert service.reservation_stats()["pending"] == 1
+
+
+class TestKeysetPagination:
+    """Testi za keyset strani in izbiro polj admin seznamov."""
+
+    def test_pages_cover_all_rows_with_tied_timestamps(self, tmp_path):
+        import sqlite3
+        from app.services.pagination import next_cursor
+        from app.services.reservation_service import ReservationService
+
+        db_path = str(tmp_path / "r.db")
+        service = ReservationService(db_path=db_path)
+        conn = sqlite3.connect(db_path)
+        conn.executemany(
+            "INSERT INTO conversations (session_id, user_message, bot_response, created_at) VALUES (?, ?, ?, ?)",
+            [(f"s{i}", f"v{i}", "x" * 500, f"2030-01-0{1 + i // 3} 10:00:00") for i in range(7)],
+        )
+        conn.commit()
+        conn.close()
+
+        seen, cursor = [], None
+        while True:
+            page = service.get_conversations(limit=3, cursor=cursor, fields=["id", "created_at", "user_message"])
+            seen.extend(row["user_message"] for row in page)
+            assert all(set(row) == {"id", "created_at", "user_message"} for row in page)
+            cursor = next_cursor(page, 3)
+            if cursor is None:
+                break
+        assert seen == ["v6", "v5", "v4", "v3", "v2", "v1", "v0"]
+
+    def test_api_cursor_and_fields(self, reservation_service, monkeypatch):
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from app.services import reservation_router
+
+        service = reservation_service
+        monkeypatch.setattr(reservation_router, "reservation_service", service)
+        for _ in range(3):
+            service.create_reservation(
+                date=get_future_saturday(3), people=2, reservation_type="table", source="test", time="13:00"
+            )
+        app = FastAPI()
+        app.include_router(reservation_router.router)
+        http = TestClient(app)
+
+        first = http.get("/reservations", params={"limit": 2, "fields": "status"})
+        assert first.status_code == 200
+        assert [set(row) for row in first.json()] == [{"id", "created_at", "status"}] * 2
+        second = http.get("/reservations", params={"limit": 2, "cursor": first.headers["x-next-cursor"]})
+        assert len(second.json()) == 1 and "x-next-cursor" not in second.headers
+
+        assert http.get("/reservations", params={"fields": "password"}).status_code == 400
+        assert http.get("/reservations", params={"cursor": "???"}).status_code == 400
+
+
+class TestStreamingExport:
+    """Testi za pretočne izvoze (CSV / NDJSON / gzip)."""
+
+    @pytest.fixture
+    def client(self, tmp_path, monkeypatch):
+        import sqlite3
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from app.services import admin_router
+        from app.services.reservation_service import ReservationService
+
+        db_path = str(tmp_path / "r.db")
+        service = ReservationService(db_path=db_path)
+        conn = sqlite3.connect(db_path)
+        conn.executemany(
+            "INSERT INTO reservations (date, people, reservation_type, status, note, created_at, source) "
+            "VALUES (?, 2, 'table', ?, ?, '2030-01-01T10:00:00', 'import')",
+            [("01.02.2031", "confirmed" if i % 2 else "pending", f"opomba, {i}") for i in range(1500)],
+        )
+        conn.commit()
+        conn.close()
+        monkeypatch.setattr(admin_router, "service", service)
+        app = FastAPI()
+        app.include_router(admin_router.router)
+        return TestClient(app), service
+
+    def test_csv_export_has_no_row_cap(self, client):
+        import csv
+        import io
+        http, _ = client
+        response = http.get("/api/admin/export", params={"status": "confirmed"})
+        assert response.status_code == 200
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        assert len(rows) == 750
+        assert rows[0]["note"] == "opomba, 1"
+
+    def test_ndjson_gzip_export(self, client):
+        import gzip
+        import json
+        http, service = client
+        service.log_conversation("s1", "Kdaj ste odprti?", "Ob vikendih.")
+        response = http.get("/api/admin/export/conversations", params={"format": "ndjson", "gzip": True})
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/gzip"
+        lines = gzip.decompress(response.content).decode("utf-8").splitlines()
+        assert [json.loads(line)["user_message"] for line in lines] == ["Kdaj ste odprti?"]
+
+        assert http.get("/api/admin/export/users").status_code == 404
+        assert http.get("/api/admin/export/conversations", params={"format": "xml"}).status_code == 400
+
+    def test_export_survives_thread_switches(self, client):
+        from concurrent.futures import ThreadPoolExecutor
+        http, service = client
+
+        # StreamingResponse kliče next() iz poljubne niti bazena
+        rows = service.iter_query("SELECT id FROM reservations ORDER BY id", chunk_rows=10)
+        with ThreadPoolExecutor(max_workers=1) as first, ThreadPoolExecutor(max_workers=1) as second:
+            head = first.submit(next, rows).result()
+            tail = second.submit(list, rows).result()
+        assert [head["id"]] + [row["id"] for row in tail] == list(range(1, 1501))
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            responses = list(pool.map(lambda _: http.get("/api/admin/export"), range(8)))
+        assert [r.status_code for r in responses] == [200] * 8
+        assert {len(r.text.splitlines()) for r in responses} == {1501}
+
+    def test_backup_csv_streams_all_rows(self, client, tmp_path):
+        http, service = client
+        service.backup_dir = str(tmp_path)
+        with open(service.create_backup_csv(), encoding="utf-8") as handle:
+            assert sum(1 for _ in handle) == 1501
+
+
+class _SQLitePostgres:
+    """Postgres povezava za teste kopij: SQL in COPY ... CSV se izvedeta nad SQLite datoteko.
+
+    xmin dopolnjevanih tabel posnemata sprožilca: vsak INSERT/UPDATE dobi
+    naslednjo številko iz _pg_clock (kot id transakcije, ki je vrstico zapisala).
+    """
+
+    def __init__(self, path):
+        import sqlite3
+        from app.services.backup_service import PG_APPEND_TABLES
+
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("CREATE TABLE IF NOT EXISTS _pg_clock (xid INTEGER NOT NULL)")
+        if self.conn.execute("SELECT COUNT(*) FROM _pg_clock").fetchone()[0] == 0:
+            self.conn.execute("INSERT INTO _pg_clock VALUES (3)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS _pg_xmin (tbl TEXT, row_id INTEGER, xid INTEGER, PRIMARY KEY (tbl, row_id))")
+        existing = {row[0] for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        for table in set(PG_APPEND_TABLES) & existing:
+            for event in ("INSERT", "UPDATE"):
+                self.conn.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS _pg_xmin_{table}_{event.lower()} AFTER {event} ON {table} BEGIN "
+                    f"INSERT OR REPLACE INTO _pg_xmin VALUES ('{table}', NEW.id, (SELECT xid FROM _pg_clock)); "
+                    "UPDATE _pg_clock SET xid = xid + 1; END"
+                )
+        self.conn.commit()
+
+    def set_session(self, **kwargs):
+        pass
+
+    def cursor(self):
+        return _SQLitePostgresCursor(self.conn.cursor())
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        self.conn.close()
+
+
+class _SQLitePostgresCursor:
+    def __init__(self, cur):
+        self.cur = cur
+        self.description = None
+        self._rows = []
+
+    def execute(self, sql, params=()):
+        import re
+
+        if sql.startswith("TRUNCATE "):
+            for table in sql[len("TRUNCATE "):].split(", "):
+                self.cur.execute(f"DELETE FROM {table}")
+            return
+        if "pg_get_serial_sequence" in sql:
+            self._rows = [{"seq": None}]  # SQLite AUTOINCREMENT sledi MAX(id) sam
+            return
+        self._rows = None
+        sql = sql.replace("txid_snapshot_xmin(txid_current_snapshot()) % 4294967296", "(SELECT xid FROM _pg_clock)")
+        sql = re.sub(r"CREATE TEMP TABLE (\w+) \(LIKE (\w+)\)", r"CREATE TEMP TABLE \1 AS SELECT * FROM \2 WHERE 0", sql)
+        self.cur.execute(re.sub(r"%s", "?", sql), params)
+        self.description = self.cur.description
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows is not None else self.cur.fetchone()
+
+    def copy_expert(self, sql, handle):
+        import csv
+        import io
+        import re
+
+        out = re.match(r"COPY \((.*)\) TO STDOUT WITH CSV HEADER$", sql, re.S)
+        if out:
+            query = re.sub(
+                r"FROM (\w+) WHERE age\(xmin\) <= age\('(\d+)'::xid\)",
+                r"FROM \1 WHERE id IN (SELECT row_id FROM _pg_xmin WHERE tbl = '\1' AND xid >= \2)",
+                out.group(1),
+            )
+            self.cur.execute(query)
+
+            def field(value):
+                return "" if value is None else '"' + str(value).replace('"', '""') + '"'
+
+            lines = [",".join(col[0] for col in self.cur.description)]
+            lines += [",".join(field(value) for value in row) for row in self.cur.fetchall()]
+            handle.write(("\n".join(lines) + "\n").encode("utf-8"))
+            return
+        table, columns = re.match(r"COPY (\w+) \((.*)\) FROM STDIN WITH CSV HEADER$", sql).groups()
+        rows = list(csv.reader(io.StringIO(handle.read().decode("utf-8"))))[1:]
+        marks = ", ".join("?" * len(columns.split(", ")))
+        self.cur.executemany(
+            f"INSERT INTO {table} ({columns}) VALUES ({marks})",
+            [[value if value != "" else None for value in row] for row in rows],
+        )
+
+
+class TestBackupService:
+    """Testi za stisnjene kopije baze (SQLite in Postgres prek SQLite povezave)."""
+
+    def test_backup_verify_restore(self, tmp_path):
+        import sqlite3
+        from app.services.backup_service import BackupManager
+        from app.services.reservation_service import ReservationService
+
+        service = ReservationService(db_path=str(tmp_path / "r.db"), sqlite_wal=True)
+        service.create_reservation(
+            date=get_future_saturday(3), people=4, reservation_type="table", source="test", time="13:00"
+        )
+        manager = BackupManager(service, backup_dir=str(tmp_path / "backups"), compression="gzip")
+        manifest = manager.run()
+        assert manifest["kind"] == "sqlite" and manifest["rotated"] == []
+        assert [m["name"] for m in manager.list_backups()] == [manifest["name"]]
+        assert manager.verify(manifest["name"]) == []
+
+        target = manager.restore(manifest["name"], target=str(tmp_path / "restored.db"))
+        conn = sqlite3.connect(target)
+        assert conn.execute("SELECT COUNT(*) FROM reservations").fetchone()[0] == 1
+        conn.close()
+
+        fname = next(iter(manifest["files"]))
+        with open(tmp_path / "backups" / manifest["name"] / fname, "ab") as handle:
+            handle.write(b"x")
+        assert manager.verify(manifest["name"])
+
+    def test_postgres_restore_keeps_occupancy_ledger(self, tmp_path, monkeypatch):
+        import sqlite3
+        from types import SimpleNamespace
+        import psycopg2
+        from app.services import migrations
+        from app.services.backup_service import BackupManager
+        from app.services.occupancy_ledger import ReservationConflict
+        from app.services.reservation_service import ROOMS, ReservationService
+
+        source = str(tmp_path / "source.db")
+        service = ReservationService(db_path=source)
+        for i in range(len(ROOMS)):
+            service.create_reservation(
+                date="12.06.2030", people=2, reservation_type="room", nights=3, name=f"G{i}", claim=True
+            )
+        pg = SimpleNamespace(use_postgres=True, _conn=lambda: _SQLitePostgres(source))
+        manager = BackupManager(pg, backup_dir=str(tmp_path / "backups"), compression="gzip")
+        manifest = manager.backup()
+        assert manifest["kind"] == "pg-full"
+        assert "room_night_claims.csv.gz" in manifest["files"]
+
+        target = str(tmp_path / "target.db")
+        real_run_migrations = migrations.run_migrations
+        monkeypatch.setattr(
+            migrations,
+            "run_migrations",
+            lambda factory, postgres, key: real_run_migrations(lambda: sqlite3.connect(target), False, target),
+        )
+        monkeypatch.setattr(psycopg2, "connect", lambda url, **kwargs: _SQLitePostgres(target))
+        manager.restore(manifest["name"], target_url="postgresql://restore")
+
+        # migracije so že izvedene, zato nova instanca knjige ne gradi znova
+        restored = ReservationService(db_path=target)
+        assert len(restored.read_reservations(limit=50)) == len(ROOMS)
+        with pytest.raises(ReservationConflict):
+            restored.create_reservation(
+                date="13.06.2030", people=2, reservation_type="room", nights=1, name="Dvojno", claim=True
+            )
+
+    def test_postgres_incremental_keeps_late_commits(self, tmp_path, monkeypatch):
+        import sqlite3
+        from types import SimpleNamespace
+        import psycopg2
+        from app.services import migrations
+        from app.services.backup_service import BackupManager
+        from app.services.reservation_service import ReservationService
+
+        source = str(tmp_path / "source.db")
+        ReservationService(db_path=source)
+        _SQLitePostgres(source).close()  # namesti posnemanje xmin pred prvimi vrsticami
+        pg = SimpleNamespace(use_postgres=True, _conn=lambda: _SQLitePostgres(source))
+        manager = BackupManager(pg, backup_dir=str(tmp_path / "backups"), compression="gzip")
+
+        def insert(conn, row_id):
+            conn.execute(
+                "INSERT INTO conversations (id, session_id, user_message, bot_response, created_at) "
+                "VALUES (?, 's1', ?, 'odgovor', '2030-01-01 10:00:00')",
+                (row_id, f"vprašanje {row_id}"),
+            )
+
+        conn = sqlite3.connect(source)
+        for row_id in (1, 2, 4):
+            insert(conn, row_id)
+        conn.execute(
+            "INSERT INTO chat_sessions (namespace, session_id, version, data, updated_at) "
+            "VALUES ('v2', 'gost', 3, '{\"step\": \"awaiting_email\"}', 1.0)"
+        )
+        conn.commit()
+        full = manager.backup()
+        # id 3 je dobila transakcija, ki se potrdi šele po posnetku polne kopije
+        insert(conn, 3)
+        insert(conn, 5)
+        conn.execute("UPDATE conversations SET followup_email = 'gost@example.com' WHERE id = 1")
+        conn.commit()
+        conn.close()
+        incremental = manager.backup()
+        assert (full["kind"], incremental["kind"]) == ("pg-full", "pg-incremental")
+        assert incremental["previous"] == full["name"]
+
+        target = str(tmp_path / "target.db")
+        real_run_migrations = migrations.run_migrations
+        monkeypatch.setattr(
+            migrations,
+            "run_migrations",
+            lambda factory, postgres, key: real_run_migrations(lambda: sqlite3.connect(target), False, target),
+        )
+        monkeypatch.setattr(psycopg2, "connect", lambda url, **kwargs: _SQLitePostgres(target))
+        manager.restore(incremental["name"], target_url="postgresql://restore")
+
+        conn = sqlite3.connect(target)
+        rows = conn.execute("SELECT id, followup_email FROM conversations ORDER BY id").fetchall()
+        sessions = conn.execute("SELECT session_id, version FROM chat_sessions").fetchall()
+        conn.close()
+        assert rows == [(1, "gost@example.com"), (2, None), (3, None), (4, None), (5, None)]
+        # seja z rezervacijo v teku je v obnovljeni bazi
+        assert sessions == [("gost", 3)]
+
+    def test_postgres_backup_covers_every_migrated_table(self, tmp_path):
+        import sqlite3
+        from app.services.backup_service import PG_APPEND_TABLES, PG_FULL_TABLES
+        from app.services.migrations import run_migrations
+
+        db_path = str(tmp_path / "r.db")
+        run_migrations(lambda: sqlite3.connect(db_path), False, db_path)
+        conn = sqlite3.connect(db_path)
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        conn.close()
+        # FTS5 indeksi iskanja obstajajo le na SQLite in se zgradijo iz tabel
+        migrated = {t for t in tables if t != "sqlite_sequence" and "_fts" not in t}
+        assert set(PG_FULL_TABLES + PG_APPEND_TABLES) == migrated
+
+    def test_rotation_keeps_recent_backups(self, tmp_path):
+        from datetime import datetime, timedelta
+        from app.services.backup_service import BackupManager
+        from app.services.reservation_service import ReservationService
+
+        service = ReservationService(db_path=str(tmp_path / "r.db"))
+        manager = BackupManager(service, backup_dir=str(tmp_path / "backups"), compression="gzip", retention_days=7)
+        first = manager.backup()
+        second = manager.backup()
+
+        assert manager.rotate(now=datetime.now() + timedelta(days=3)) == []
+        # vse kopije so prestare: ostane le najnovejša
+        assert manager.rotate(now=datetime.now() + timedelta(days=30)) == [first["name"]]
+        assert [m["name"] for m in manager.list_backups()] == [second["name"]]
+
+
+class TestConversationArchive:
+    """Testi za arhiviranje starih pogovorov."""
+
+    def test_old_rows_move_to_archive_and_session_lookup_falls_back(self, tmp_path):
+        import sqlite3
+        from app.services.reservation_service import ReservationService
+
+        db_path = str(tmp_path / "r.db")
+        service = ReservationService(db_path=db_path)
+        conn = sqlite3.connect(db_path)
+        conn.executemany(
+            "INSERT INTO conversations (session_id, user_message, bot_response, created_at) VALUES (?, ?, ?, ?)",
+            [("star", f"Staro vprašanje {i}", "odgovor", f"2020-01-0{i + 1} 10:00:00") for i in range(5)],
+        )
+        conn.commit()
+        conn.close()
+        service.log_conversation("star", "Novo vprašanje", "odgovor")
+        service.log_conversation("nov", "Kdaj ste odprti?", "Ob vikendih.")
+
+        assert service.archive_conversations(older_than_days=30, batch=2) == 5
+        assert service.archive_conversations(older_than_days=30) == 0
+        assert len(service.get_conversations(limit=100)) == 2
+
+        session = service.get_conversations_by_session("star")
+        assert [row["user_message"] for row in session] == [
+            *(f"Staro vprašanje {i}" for i in range(5)),
+            "Novo vprašanje",
+        ]
+        assert len(service.get_conversations_by_session("star", limit=3)) == 3
+        # povzetki obdržijo arhivirane pogovore
+        assert {row["user_message"] for row in service.get_top_questions(limit=10)} >= {"Staro vprašanje 0"}
+
+    def test_unrolled_rows_are_not_archived(self, tmp_path, monkeypatch):
+        import sqlite3
+        from app.services.reservation_service import ReservationService
+
+        db_path = str(tmp_path / "r.db")
+        service = ReservationService(db_path=db_path)
+        conn = sqlite3.connect(db_path)
+        conn.execute(
+            "INSERT INTO conversations (session_id, user_message, bot_response, created_at) "
+            "VALUES ('s', 'Staro vprašanje', 'odgovor', '2020-01-01 10:00:00')"
+        )
+        conn.commit()
+        conn.close()
+        monkeypatch.setattr(service, "refresh_analytics", lambda: 0)
+
+        assert service.archive_conversations(older_than_days=30) == 0
+
+
+class TestFullTextSearch:
+    """Testi za polnotekstovno iskanje (FTS5)."""
+
+    def test_search_is_diacritic_insensitive_with_snippets(self, tmp_path):
+        import sqlite3
+        from app.services.reservation_service import ReservationService
+
+        db_path = str(tmp_path / "r.db")
+        service = ReservationService(db_path=db_path)
+        service.log_conversation("s1", "Ali imate štruklje?", "Da, ob nedeljah pečemo štruklje.")
+        service.log_conversation("s2", "Kdaj ste odprti?", "Ob vikendih.")
+        conn = sqlite3.connect(db_path)
+        conn.execute(
+            "INSERT INTO conversations (session_id, user_message, bot_response, created_at) "
+            "VALUES ('star', 'Struklji za s seboj?', 'Žal ne.', '2020-01-01 10:00:00')"
+        )
+        conn.commit()
+        conn.close()
+        service.archive_conversations(older_than_days=30)
+
+        results = service.search("struklj")
+        assert [(row["source"], row["session_id"]) for row in results] == [
+            ("conversations", "s1"),
+            ("conversations_archive", "star"),
+        ]
+        assert "«štruklje»" in results[0]["snippet"]
+        assert service.search("struklj", date_from="2026-01-01", date_to="2099-12-31")[0]["session_id"] == "s1"
+        assert service.search("odprti vikend")[0]["session_id"] == "s2"
+        assert service.search("***") == []
+
+    def test_search_folds_dj_like_other_diacritics(self, reservation_service):
+        reservation_service.log_conversation("s1", "Sem Đurđa Čeh, imate prosto?", "Pozdravljeni, gospa Đurđa.")
+        for query in ("Ceh", "Đurđa", "durda", "ĐURĐA"):
+            assert [row["session_id"] for row in reservation_service.search(query)] == ["s1"], query
+        assert "«Đurđa»" in reservation_service.search("durda")[0]["snippet"]
+
+    def test_messages_scope_and_api_pagination(self, reservation_service, monkeypatch):
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from app.services import admin_router
+
+        for i in range(3):
+            reservation_service.add_reservation_message(
+                reservation_id=1, direction="inbound", subject=f"Vprašanje {i}", body="Prosimo za račun.",
+                from_email="gost@example.com", to_email="info@example.com",
+            )
+        monkeypatch.setattr(admin_router, "service", reservation_service)
+        app = FastAPI()
+        app.include_router(admin_router.router)
+        http = TestClient(app)
+
+        first = http.get("/api/admin/search", params={"q": "racun", "scope": "messages", "limit": 2}).json()
+        assert len(first["results"]) == 2 and first["next_cursor"]
+        second = http.get(
+            "/api/admin/search", params={"q": "racun", "scope": "messages", "limit": 2, "cursor": first["next_cursor"]}
+        ).json()
+        assert len(second["results"]) == 1 and second["next_cursor"] is None
+        assert http.get("/api/admin/search", params={"q": "racun", "scope": "vse"}).status_code == 400
+
+
+class TestOccupancyLedger:
+    """Atomičen vpis rezervacije in zahtevkov v knjigo zasedenosti."""
+
+    @pytest.mark.parametrize("wal", [False, True])
+    def test_concurrent_room_claims_never_overbook(self, tmp_path, wal):
+        import threading
+        from app.services.occupancy_ledger import ReservationConflict
+        from app.services.reservation_service import ROOMS, ReservationService
+
+        service = ReservationService(db_path=str(tmp_path / "r.db"), sqlite_wal=wal)
+        barrier = threading.Barrier(12)
+        created, conflicts = [], []
+
+        def book(i: int) -> None:
+            barrier.wait()
+            try:
+                created.append(
+                    service.create_reservation(
+                        date="12.06.2030", people=2, reservation_type="room", nights=3, rooms=1,
+                        name=f"Gost {i}", claim=True,
+                    )
+                )
+            except ReservationConflict as conflict:
+                conflicts.append(conflict)
+
+        threads = [threading.Thread(target=book, args=(i,)) for i in range(12)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(created) == len(ROOMS)
+        assert len(conflicts) == 12 - len(ROOMS)
+        assert all(c.kind == "room" and c.alternative for c in conflicts)
+        assert len(service.read_reservations(limit=50)) == len(ROOMS)
+        ok, _ = service.check_room_availability("12.06.2030", 3, 2)
+        assert ok is False
+
+        # preklic sprosti noči za naslednjega gosta
+        service.update_status(created[0], "cancelled")
+        service.create_reservation(
+            date="13.06.2030", people=2, reservation_type="room", nights=1, name="Naslednji", claim=True
+        )
+
+    def test_concurrent_table_claims_respect_capacity(self, reservation_service):
+        import threading
+        from app.services.occupancy_ledger import ReservationConflict
+        from app.services.reservation_service import TOTAL_TABLE_CAPACITY
+
+        barrier = threading.Barrier(10)
+        created, conflicts = [], []
+
+        def book(i: int) -> None:
+            barrier.wait()
+            try:
+                created.append(
+                    reservation_service.create_reservation(
+                        date="15.06.2030", time="13:00", people=10, reservation_type="table",
+                        location="Jedilnica Pri vrtu", name=f"Miza {i}", claim=True,
+                    )
+                )
+            except ReservationConflict as conflict:
+                conflicts.append(conflict)
+
+        threads = [threading.Thread(target=book, args=(i,)) for i in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        rows = reservation_service.read_reservations(limit=50)
+        seats = {}
+        for row in rows:
+            seats[row["location"]] = seats.get(row["location"], 0) + row["people"]
+        assert seats == {"Jedilnica Pri vrtu": 30, "Jedilnica Pri peči": 10}
+        assert sum(seats.values()) <= TOTAL_TABLE_CAPACITY
+        assert len(created) == 4 and len(conflicts) == 6
+        assert all(c.kind == "table" and c.suggestions for c in conflicts)
+
+    def test_admin_writes_bypass_and_rebuild(self, reservation_service):
+        from app.services.occupancy_ledger import ReservationConflict
+        from app.services.reservation_service import ROOMS
+
+        for i in range(len(ROOMS) + 1):
+            # admin vnos preveč ne sproži napake (kot doslej)
+            reservation_service.create_reservation(
+                date="12.06.2030", people=2, reservation_type="room", nights=2, source="admin", name=f"A{i}"
+            )
+        assert reservation_service.rebuild_claims() == len(ROOMS) + 1
+        with pytest.raises(ReservationConflict):
+            reservation_service.create_reservation(
+                date="13.06.2030", people=2, reservation_type="room", nights=1, name="Klepet", claim=True
+            )
+        reservation_service.delete_all_reservations()
+        reservation_service.create_reservation(
+            date="13.06.2030", people=2, reservation_type="room", nights=1, name="Klepet", claim=True
+        )
+
+
+class TestUnitOfWork:
+    """Ena povezava in ena transakcija na potezo klepeta."""
+
+    def test_turn_shares_one_connection_and_commits_once(self, tmp_path):
+        from app.services.occupancy_ledger import ReservationConflict
+        from app.services.reservation_service import ROOMS, ReservationService
+        from app.services.unit_of_work import unit_of_work
+
+        service = ReservationService(db_path=str(tmp_path / "r.db"))
+        outside = ReservationService(db_path=str(tmp_path / "r.db"))
+        with unit_of_work() as uow:
+            ok, _ = service.check_room_availability("12.06.2030", 3, 2)
+            assert ok
+            ids = [
+                service.create_reservation(
+                    date="12.06.2030", people=2, reservation_type="room", nights=3, name=f"G{i}", claim=True
+                )
+                for i in range(len(ROOMS))
+            ]
+            # konflikt razveljavi le svoj savepoint
+            with pytest.raises(ReservationConflict):
+                service.create_reservation(
+                    date="12.06.2030", people=2, reservation_type="room", nights=3, name="Prepozno", claim=True
+                )
+            assert service.get_reservation(ids[0])["name"] == "G0"
+            assert service.get_reservation(ids[0]) is not None
+            # drugi bralci še ne vidijo nepotrjene poteze
+            conn = outside._connect()
+            assert conn.execute("SELECT COUNT(*) FROM reservations").fetchone()[0] == 0
+            conn.close()
+        assert uow.stats == {"connections": 1, "writes": len(ROOMS)}
+        assert len(outside.read_reservations(limit=10)) == len(ROOMS)
+
+    def test_failed_turn_rolls_back_writes_and_index(self, tmp_path):
+        from app.services.reservation_service import ReservationService
+        from app.services.unit_of_work import unit_of_work
+
+        service = ReservationService(db_path=str(tmp_path / "r.db"))
+        with pytest.raises(RuntimeError):
+            with unit_of_work():
+                service.create_reservation(
+                    date="12.06.2030", people=2, reservation_type="room", nights=3, name="G", claim=True
+                )
+                raise RuntimeError("napaka v potezi")
+        assert service.read_reservations(limit=10) == []
+        assert service.check_room_availability("12.06.2030", 3, 12)[0] is True
+
+    def test_on_commit_runs_after_commit_and_is_dropped_on_rollback(self, tmp_path):
+        from app.services.reservation_service import ReservationService
+        from app.services.unit_of_work import unit_of_work
+
+        service = ReservationService(db_path=str(tmp_path / "r.db"))
+        outside = ReservationService(db_path=str(tmp_path / "r.db"))
+        sent = []
+        with unit_of_work() as uow:
+            uow.on_commit(lambda: sent.append("brez pisanj"))
+            assert sent == ["brez pisanj"]
+            service.create_reservation(
+                date="12.06.2030", people=2, reservation_type="room", nights=3, name="G", claim=True
+            )
+            uow.on_commit(lambda: sent.append(len(outside.read_reservations(limit=10))))
+            assert sent == ["brez pisanj"]
+        # povratni klic vidi potrjeno rezervacijo
+        assert sent == ["brez pisanj", 1]
+
+        with pytest.raises(RuntimeError):
+            with unit_of_work() as uow:
+                service.create_reservation(
+                    date="20.06.2030", people=2, reservation_type="room", nights=3, name="H", claim=True
+                )
+                uow.on_commit(lambda: sent.append("razveljavljeno"))
+                raise RuntimeError("napaka v potezi")
+        assert sent == ["brez pisanj", 1]